@@ -1,10 +1,13 @@
 from flask import Flask
 from flask_cors import CORS
 from loguru import logger
-from config import config
 import os
+import time
 
 def create_app():
+    started = time.perf_counter()
+    from config import config
+    
     app = Flask(__name__, 
         static_folder='static',
         template_folder='templates',
@@ -22,23 +25,83 @@ def create_app():
     app.config["SECRET_KEY"] = str(config.flask_secret_key)
     app.config["DEBUG"] = config.flask_debug
     app.config["AUDIO_FOLDER"] = os.path.abspath(config.audio_folder)
+    app.config["STARTED_AT"] = started
+    app.config["SERVER_TIMING"] = config.server_timing
 
     # Register blueprints
     from .routes import bp as api_bp
     app.register_blueprint(api_bp)
     
     # Initialize services
-    from .services.chatbot_service import ChatbotFactory
+    from .services.lazy import LazyService
     from .services.tts_service import TTSServiceFactory
     
-    app.chatbot = ChatbotFactory.create_chatbot(
-        base_url=config.chatbot_base_url.unicode_string(),
-        api_key=str(config.chatbot_api_key),
-        model=config.chatbot_model
-    )
+    def load_chatbot(progress):
+        # torch, the embedding model and the FAISS index are only loaded here
+        progress("import")
+        from .services.chatbot_service import ChatbotFactory
+        progress("init")
+        return ChatbotFactory.create_chatbot(
+            base_url=config.chatbot_base_url.unicode_string(),
+            api_key=str(config.chatbot_api_key),
+            model=config.chatbot_model,
+            embedding_batch_size=config.embedding_batch_size,
+            build_index_on_start=config.knowledge_base_auto_build,
+            query_cache_size=config.chatbot_query_cache_size,
+            response_cache_backend=config.chatbot_response_cache,
+            response_cache_path=config.chatbot_response_cache_path,
+            response_cache_size=config.chatbot_response_cache_size,
+            response_cache_ttl=config.chatbot_response_cache_ttl,
+            start_watcher=False,
+            context_token_budget=config.chatbot_context_token_budget,
+            max_concurrency=config.chatbot_max_concurrency,
+            upstream_wait=config.admission_max_wait,
+            fast_answers_path=config.chatbot_fast_answers_path if config.chatbot_fast_answers else None,
+            fast_answer_min_similarity=config.chatbot_fast_answer_min_similarity
+        )
+    
+    # Pre-fork workers share the master's model and index copy-on-write, so
+    # everything must be loaded before the fork and no threads may be started yet
+    warmup = "eager" if config.prefork else config.service_warmup
+    app.chatbot = LazyService("chatbot", load_chatbot, ready_timeout=config.service_ready_timeout)
+    if warmup != "lazy":
+        # "eager" blocks until the chatbot is loaded, "background" warms it up on a thread
+        app.chatbot.start(background=warmup == "background")
+    if warmup == "eager":
+        app.chatbot.get()
     
     app.tts = TTSServiceFactory.create_tts_service(
         tts_type="bytedance"
     )
+
+    # Shed load before it reaches the upstream APIs: per-client token buckets and a bounded wait queue
+    from .services.admission import AdmissionController, RateLimiter
+    app.admission = AdmissionController(
+        max_active=config.admission_max_active,
+        max_queue=config.admission_max_queue,
+        max_wait=config.admission_max_wait
+    )
+    app.rate_limiter = RateLimiter(
+        rate=config.rate_limit_per_minute / 60,
+        burst=config.rate_limit_burst
+    ) if config.rate_limit_per_minute > 0 else None
+    app.config["RATE_LIMIT_TRUST_PROXY"] = config.rate_limit_trust_proxy
+
+    # Keep the audio folder within its quota and TTL in the background
+    from .services.audio_janitor import AudioJanitor
+    app.audio_janitor = AudioJanitor(app.tts.audio_cache, interval=config.audio_janitor_interval)
+    
+    if not config.prefork:
+        start_background_tasks(app)
     
+    logger.info(f"Application created in {time.perf_counter() - started:.2f}s (chatbot warm-up: {warmup})")
     return app
+
+def start_background_tasks(app):
+    """Start the per-process maintenance threads.
+
+    Called by ``create_app``, or by each worker after the fork in pre-fork mode.
+    """
+    app.audio_janitor.start()
+    # The knowledge base watcher starts once the chatbot is loaded, right away if it already is
+    app.chatbot.on_ready(lambda chatbot: chatbot.start_watcher())
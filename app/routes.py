@@ -1,28 +1,237 @@
 import os
-from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory
+import json
+import time
+import functools
+from collections import deque
+from flask import Blueprint, Response, g, request, jsonify, current_app, make_response, render_template, send_from_directory, stream_with_context
 from pydantic import BaseModel, Field
 from typing import Optional
 from loguru import logger
+from .services import metrics
+from .services.admission import Overloaded, retry_after_header
+from .services.lazy import ServiceNotReady
+from .services.segmentation import SentenceBuffer, is_speakable, strip_markdown
 
 class SpeakRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=500)
 
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=1000)
+    grade: Optional[str] = Field(None, max_length=20, description="Restrict retrieval to a grade, e.g. 一年级")
+    subject: Optional[str] = Field(None, max_length=20, description="Restrict retrieval to a subject, e.g. 数学")
 
 bp = Blueprint('api', __name__)
 
 @bp.route('/audio/<filename>')
 def audio(filename):
-    """Serve audio files"""
-    return send_from_directory(current_app.config.get('AUDIO_FOLDER'), filename)
+    """Serve audio files
+    
+    Replies still being synthesized, by this or any other worker sharing the
+    audio folder, are streamed as they are written, so playback can start
+    before the last chunk is ready. Finished files are content-addressed and
+    never change, so they are served with Range and ETag support and cached
+    by the browser indefinitely. A reply whose synthesis failed outright is
+    answered 500, like a failed synthesis at request time.
+    """
+    tts = current_app.tts
+    pending = tts.pending_audio(filename)
+    if pending is not None:
+        try:
+            return Response(pending.stream(), mimetype='audio/mpeg', headers={"Cache-Control": "no-store"})
+        except FileNotFoundError:
+            # Finished between the lookup and opening the file
+            logger.debug(f"Pending audio {filename} completed, serving committed file")
+    
+    filename = tts.resolve_audio(filename)
+    if tts.audio_failed(filename):
+        logger.error(f"Audio {filename} failed to synthesize")
+        return jsonify({"error": "Failed to generate audio"}), 500
+    # Lease the file until the response is closed so maintenance never deletes it mid-transfer
+    leases = tts.audio_cache.leases
+    leases.acquire(filename)
+    try:
+        response = send_from_directory(
+            current_app.config.get('AUDIO_FOLDER'),
+            filename,
+            mimetype='audio/mpeg',
+            conditional=True,
+            etag=True
+        )
+    except Exception:
+        leases.release(filename)
+        raise
+    response.call_on_close(lambda: leases.release(filename))
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+@bp.before_app_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    g.request_timings = metrics.begin_request()
+
+@bp.after_app_request
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    # The matched rule keeps the label set small, e.g. /audio/<filename>
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe_request(endpoint, request.method, response.status_code, elapsed)
+    if current_app.config.get("SERVER_TIMING"):
+        # Streamed responses only report the stages finished before the first byte
+        response.headers["Server-Timing"] = metrics.server_timing(g.request_timings, total=elapsed)
+    metrics.end_request()
+    return response
+
+@bp.errorhandler(ServiceNotReady)
+def service_not_ready(e):
+    logger.warning(str(e))
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+
+@bp.errorhandler(Overloaded)
+def overloaded(e):
+    logger.warning(f"Request rejected ({e.reason}): {str(e)}")
+    status = 429 if e.reason == "rate_limited" else 503
+    return jsonify({"error": str(e)}), status, {"Retry-After": retry_after_header(e.retry_after)}
+
+def _client_key() -> str:
+    if current_app.config.get("RATE_LIMIT_TRUST_PROXY") and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or "unknown"
+
+def admitted(view):
+    """Rate limit the client and hold an admission slot while the request is served.
+
+    Streamed responses keep their slot until the stream is closed. A view can
+    hand the slot over to background work it starts (see
+    :func:`_take_admission_release`), which then releases it when done.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        rate_limiter = getattr(current_app, "rate_limiter", None)
+        if rate_limiter is not None:
+            allowed, retry_after = rate_limiter.allow(_client_key())
+            if not allowed:
+                raise Overloaded("Too many requests, please slow down", "rate_limited", retry_after)
+        
+        admission = getattr(current_app, "admission", None)
+        if admission is None:
+            return view(*args, **kwargs)
+        admission.acquire()
+        g.admission_release = admission.release
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            release = g.pop("admission_release", None)
+            if release is not None:
+                release()
+            raise
+        release = g.pop("admission_release", None)
+        if release is None:
+            # Handed over to background work started by the view
+            return response
+        if response.is_streamed:
+            response.call_on_close(release)
+        else:
+            release()
+        return response
+    return wrapper
+
+def _take_admission_release():
+    """Take over this request's admission slot; the caller must call the result exactly once.
+
+    Returns None when the request holds no slot.
+    """
+    return g.pop("admission_release", None)
+
+@bp.route('/health', methods=['GET'])
+def health():
+    """Liveness check, answered as soon as the process accepts requests"""
+    return jsonify({"status": "ok"})
+
+@bp.route('/ready', methods=['GET'])
+def ready():
+    """Readiness check with initialization progress of each service"""
+    chatbot = current_app.chatbot
+    is_ready = chatbot.ready
+    body = {
+        "ready": is_ready,
+        "uptime": time.perf_counter() - current_app.config["STARTED_AT"],
+        "services": {"chatbot": chatbot.status()}
+    }
+    return jsonify(body), 200 if is_ready else 503
+
+@bp.route('/stats', methods=['GET'])
+def stats():
+    """Report service counters such as cache hits and misses"""
+    chatbot = current_app.chatbot
+    return jsonify({
+        "chatbot": chatbot.stats() if chatbot.ready else chatbot.status(),
+        "tts": current_app.tts.stats(),
+        "audio_janitor": current_app.audio_janitor.stats(),
+        "admission": {
+            **current_app.admission.stats(),
+            "rate_limit": current_app.rate_limiter.stats() if current_app.rate_limiter else None
+        }
+    })
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics of this worker process"""
+    chatbot = current_app.chatbot
+    tts = current_app.tts
+    caches = {"audio": tts.audio_cache.stats()}
+    if chatbot.ready:
+        chatbot_stats = chatbot.stats()
+        caches.update({
+            "question_index": chatbot_stats["question_index"],
+            "embedding": chatbot_stats["embedding_cache"],
+            "retrieval": chatbot_stats["retrieval_cache"],
+            "response": chatbot_stats["response_cache"]
+        })
+    body = metrics.REGISTRY.render() + "\n".join(metrics.render_cache_stats(caches)) + "\n"
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 @bp.route('/', methods=['GET'])
 @bp.route('/index', methods=['GET'])
 def index():
     return render_template('index.html')
 
+@metrics.timed("parse")
+def _parse_chat_request() -> Optional[ChatRequest]:
+    if request.method == 'POST':
+        data = request.get_json()
+        logger.debug(f"POST request data: {data}")
+        return ChatRequest(**data)
+    
+    # GET
+    message = request.args.get('message')
+    logger.debug(f"GET request params: {request.args}")
+    if not message:
+        logger.error("GET request missing 'message' parameter")
+        return None
+    return ChatRequest(
+        message=message,
+        grade=request.args.get('grade') or None,
+        subject=request.args.get('subject') or None
+    )
+
+def _fast_answer_audio(tts, answer, on_done=None) -> str:
+    # Pre-rendered audio is served as is; answers stored without audio are synthesized as usual
+    if answer.audio:
+        try:
+            return tts.store_reply_audio(answer.answer, answer.audio)
+        finally:
+            if on_done is not None:
+                on_done()
+    return tts.start_speak(answer.answer, on_done=on_done)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @bp.route('/chat', methods=['POST', 'GET'])
+@admitted
 def chat():
     """
     Chat with the AI assistant
@@ -51,28 +260,24 @@ def chat():
     try:
         logger.info(f"Incoming {request.method} request to /chat from {request.remote_addr}")
         logger.debug(f"Request headers: {dict(request.headers)}")
-        if request.method == 'POST':
-            data = request.get_json()
-            logger.debug(f"POST request data: {data}")
-            request_data = ChatRequest(**data)
-        else:  # GET
-            message = request.args.get('message')
-            logger.debug(f"GET request params: {request.args}")
-            if not message:
-                logger.error("GET request missing 'message' parameter")
-                return jsonify({"error": "message parameter is required"}), 400
-            request_data = ChatRequest(message=message)
+        request_data = _parse_chat_request()
+        if request_data is None:
+            return jsonify({"error": "message parameter is required"}), 400
         
         logger.info(f"Processing chat request with message: {request_data.message[:50]}...")
-        response = current_app.chatbot.chat(request_data.message)
+        chatbot = current_app.chatbot
+        fast_answer = chatbot.fast_answer(request_data.message, request_data.grade, request_data.subject)
+        if fast_answer is not None:
+            # Known question: pre-generated answer and audio, no LLM or TTS call
+            response = fast_answer.answer
+            audio_path = _fast_answer_audio(current_app.tts, fast_answer, on_done=_take_admission_release())
+        else:
+            response = chatbot.chat(request_data.message, request_data.grade, request_data.subject)
+            # Start generating audio for the response; /audio streams it while it is written.
+            # The admission slot stays held until synthesis finishes so TTS load is admitted too
+            audio_path = current_app.tts.start_speak(response, on_done=_take_admission_release())
         logger.info(f"Chatbot response: {response[:50]}...")
-        
-        # Generate audio for the response
-        audio_path = current_app.tts.speak(response)
-        logger.debug(f"Generated audio file at: {audio_path}")
-        if not os.path.exists(audio_path):
-            logger.error(f"Audio file not found: {audio_path}")
-            return jsonify({"error": "Failed to generate audio"}), 500
+        logger.debug(f"Generating audio file at: {audio_path}")
         audio_url = f"/audio/{os.path.basename(audio_path)}"
         logger.debug(f"Audio URL: {audio_url}")
         
@@ -81,11 +286,117 @@ def chat():
             "audio_url": audio_url
         })
     
+    except (ServiceNotReady, Overloaded):
+        raise
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         return jsonify({"error": str(e)}), 400
 
+@bp.route('/chat/stream', methods=['POST', 'GET'])
+@admitted
+def chat_stream():
+    """
+    Chat with the AI assistant, streaming text and audio as they become ready
+    ---
+    tags:
+      - Chat
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            $ref: '#/components/schemas/ChatRequest'
+    responses:
+      200:
+        description: Server-sent events stream
+        content:
+          text/event-stream:
+            schema:
+              type: string
+              description: >
+                "text" events carry a response delta, "audio" events carry the
+                URL of the next audio segment in order, "done" carries the full
+                response and "error" reports a failure mid-stream
+      400:
+        description: Invalid request
+    """
+    try:
+        logger.info(f"Incoming {request.method} request to /chat/stream from {request.remote_addr}")
+        logger.debug(f"Request headers: {dict(request.headers)}")
+        request_data = _parse_chat_request()
+        if request_data is None:
+            return jsonify({"error": "message parameter is required"}), 400
+    except Exception as e:
+        logger.error(f"Chat stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    
+    # Wait for the chatbot before the stream starts so a cold worker answers 503, not a broken stream
+    chatbot = current_app.chatbot.get()
+    tts = current_app.tts
+    
+    def generate():
+        sentences = SentenceBuffer()
+        pending = deque()
+        response_parts = []
+        segment_index = 0
+        
+        def drain(block: bool):
+            # Audio segments are emitted strictly in sentence order
+            nonlocal segment_index
+            while pending and (block or pending[0].done()):
+                future = pending.popleft()
+                try:
+                    audio_path = future.result()
+                except Exception as e:
+                    logger.error(f"TTS segment {segment_index} failed: {str(e)}")
+                    segment_index += 1
+                    continue
+                yield _sse("audio", {
+                    "index": segment_index,
+                    "audio_url": f"/audio/{os.path.basename(audio_path)}"
+                })
+                segment_index += 1
+        
+        try:
+            logger.info(f"Processing chat stream with message: {request_data.message[:50]}...")
+            fast_answer = chatbot.fast_answer(request_data.message, request_data.grade, request_data.subject)
+            if fast_answer is not None:
+                yield _sse("text", {"delta": fast_answer.answer})
+                audio_path = _fast_answer_audio(tts, fast_answer)
+                yield _sse("audio", {"index": 0, "audio_url": f"/audio/{os.path.basename(audio_path)}"})
+                yield _sse("done", {"response": fast_answer.answer})
+                return
+            
+            for delta in chatbot.chat_stream(request_data.message, request_data.grade, request_data.subject):
+                response_parts.append(delta)
+                yield _sse("text", {"delta": delta})
+                for sentence in sentences.feed(delta):
+                    # Markdown-only or punctuation-only sentences have nothing to synthesize
+                    if is_speakable(strip_markdown(sentence)):
+                        pending.append(tts.submit_segment(sentence))
+                yield from drain(block=False)
+            
+            tail = sentences.flush()
+            if tail and is_speakable(strip_markdown(tail)):
+                pending.append(tts.submit_segment(tail))
+            yield from drain(block=True)
+            
+            response = "".join(response_parts)
+            logger.info(f"Chatbot stream response: {response[:50]}...")
+            yield _sse("done", {"response": response})
+        
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield _sse("error", {"error": str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @bp.route('/speak', methods=['POST', 'GET'])
+@admitted
 def speak():
     """
     Convert text to speech
@@ -143,7 +454,7 @@ def speak():
             request_data = SpeakRequest(text=text)
             logger.info(f"GET request received with text: {text[:50]}... (length: {len(text)})")
         
-        audio_path = current_app.tts.speak(request_data.text)
+        audio_path = current_app.tts.start_speak(request_data.text, on_done=_take_admission_release())
         logger.info(f"TTS request processed: {request_data.text[:50]}...")
         return jsonify({
             "status": "success",
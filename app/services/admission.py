@@ -0,0 +1,283 @@
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional, Tuple
+from loguru import logger
+from .metrics import REGISTRY
+
+ADMISSION_REJECTED = REGISTRY.counter(
+    "chatbot_admission_rejected_total", "Requests rejected before processing", ("reason",)
+)
+ADMISSION_ACTIVE = REGISTRY.gauge("chatbot_admission_active", "Requests currently being processed")
+ADMISSION_QUEUED = REGISTRY.gauge("chatbot_admission_queued", "Requests waiting for a processing slot")
+UPSTREAM_ACTIVE = REGISTRY.gauge("chatbot_upstream_active", "Upstream API calls in flight", ("upstream",))
+
+class Overloaded(RuntimeError):
+    """Raised when a request cannot be admitted or an upstream slot is not free in time"""
+
+    def __init__(self, message: str, reason: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token bucket per client key.
+
+    Each client may burst ``burst`` requests and is then refilled at
+    ``rate`` requests per second. Only the ``max_clients`` most recently
+    seen clients are tracked; a client evicted from the table starts again
+    with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def allow(self, key: str) -> Tuple[bool, float]:
+        """Take one token for ``key``; returns whether it was available and the seconds until it is"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            else:
+                self.limited += 1
+                ADMISSION_REJECTED.inc(reason="rate_limited")
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1.0 - tokens) / self.rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate_per_minute": self.rate * 60,
+                "burst": self.burst,
+                "clients": len(self._buckets),
+                "limited": self.limited
+            }
+
+class AdmissionController:
+    """Caps requests processed at once, with a bounded FIFO wait queue.
+
+    A request that finds all ``max_active`` slots busy waits in line for
+    at most ``max_wait`` seconds; when ``max_queue`` requests are already
+    waiting it is rejected immediately, so bursts get a fast 503 instead
+    of piling up on the upstream APIs.
+    """
+
+    def __init__(self, max_active: int, max_queue: int, max_wait: float):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._queue = 0
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self._condition = threading.Condition()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.peak_queue = 0
+
+    def acquire(self):
+        with self._condition:
+            ticket = self._enter()
+            if ticket is None:
+                return
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while not self._try_admit(ticket):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject_timeout()
+                    self._condition.wait(remaining)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    async def acquire_async(self, poll_interval: float = 0.01):
+        """Like :meth:`acquire` for asyncio handlers; waiting polls instead of blocking a thread"""
+        with self._condition:
+            ticket = self._enter()
+            if ticket is None:
+                return
+        deadline = time.monotonic() + self.max_wait
+        try:
+            while True:
+                with self._condition:
+                    if self._try_admit(ticket):
+                        return
+                    if time.monotonic() >= deadline:
+                        self._reject_timeout()
+                await asyncio.sleep(poll_interval)
+        except BaseException:
+            with self._condition:
+                self._abandon(ticket)
+            raise
+
+    def _enter(self) -> Optional[int]:
+        # Admits right away when a slot is free and nobody is waiting; otherwise returns a place in line
+        if self._active < self.max_active and self._queue == 0:
+            self._admit()
+            return None
+        if self._queue >= self.max_queue:
+            self.rejected_queue_full += 1
+            ADMISSION_REJECTED.inc(reason="queue_full")
+            raise Overloaded("Server is busy, please retry shortly", "queue_full")
+
+        # Tickets keep waiters in arrival order
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._queue += 1
+        self.peak_queue = max(self.peak_queue, self._queue)
+        ADMISSION_QUEUED.set(self._queue)
+        return ticket
+
+    def _try_admit(self, ticket: int) -> bool:
+        if not (ticket == self._serving and self._active < self.max_active):
+            return False
+        self._dequeue()
+        self._advance()
+        self._admit()
+        # The next in line may also fit
+        self._condition.notify_all()
+        return True
+
+    def _reject_timeout(self):
+        self.rejected_timeout += 1
+        ADMISSION_REJECTED.inc(reason="queue_timeout")
+        raise Overloaded("Server is busy, please retry shortly", "queue_timeout")
+
+    def _dequeue(self):
+        self._queue -= 1
+        ADMISSION_QUEUED.set(self._queue)
+
+    def _abandon(self, ticket: int):
+        self._dequeue()
+        self._skip(ticket)
+
+    def _admit(self):
+        self._active += 1
+        self.admitted += 1
+        ADMISSION_ACTIVE.set(self._active)
+
+    def _advance(self):
+        self._serving += 1
+        while self._serving in self._abandoned:
+            self._abandoned.remove(self._serving)
+            self._serving += 1
+
+    def _skip(self, ticket: int):
+        # A waiter that gives up must not block the ones behind it
+        if ticket == self._serving:
+            self._advance()
+        else:
+            self._abandoned.add(ticket)
+        self._condition.notify_all()
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            ADMISSION_ACTIVE.set(self._active)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "active": self._active,
+                "max_active": self.max_active,
+                "queued": self._queue,
+                "max_queue": self.max_queue,
+                "peak_queued": self.peak_queue,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout
+            }
+
+class UpstreamLimiter:
+    """Global cap on concurrent calls to one upstream API"""
+
+    def __init__(self, name: str, limit: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self.peak_active = 0
+        self.timeouts = 0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self._entered(self._semaphore.acquire(timeout=self.timeout))
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self) -> AsyncIterator[None]:
+        """Same cap as :meth:`slot`, shared with threaded callers, for asyncio code"""
+        acquired = self._semaphore.acquire(blocking=False)
+        if not acquired:
+            waiter = asyncio.ensure_future(asyncio.to_thread(self._semaphore.acquire, timeout=self.timeout))
+            try:
+                acquired = await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # The thread may still get the slot after the caller is gone; hand it back then
+                waiter.add_done_callback(lambda f: f.result() and self._semaphore.release())
+                raise
+        self._entered(acquired)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _entered(self, acquired: bool):
+        if not acquired:
+            with self._lock:
+                self.timeouts += 1
+            ADMISSION_REJECTED.inc(reason=f"{self.name}_busy")
+            logger.warning(f"No free {self.name} slot after {self.timeout}s")
+            raise Overloaded(f"{self.name} is busy, please retry shortly", f"{self.name}_busy")
+        with self._lock:
+            self._active += 1
+            self.peak_active = max(self.peak_active, self._active)
+        UPSTREAM_ACTIVE.inc(upstream=self.name)
+
+    def _release(self):
+        with self._lock:
+            self._active -= 1
+        UPSTREAM_ACTIVE.dec(upstream=self.name)
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "peak_active": self.peak_active,
+                "timeouts": self.timeouts
+            }
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
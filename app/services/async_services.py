@@ -0,0 +1,211 @@
+import json
+import time
+import asyncio
+from typing import AsyncIterator, Optional
+from loguru import logger
+from .chatbot_service import Chatbot
+from .metrics import UPSTREAM_BYTES, observe_stage, span
+from .single_flight import AsyncSingleFlight
+from .tts_service import TTSService
+
+def create_http_client(
+    pool_size: int = 100,
+    keepalive_connections: int = 20,
+    keepalive_expiry: float = 30.0,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 60.0
+):
+    """Create the pooled HTTP client shared by the async services.
+
+    One client per process keeps connections to the LLM and TTS APIs alive
+    across requests instead of paying a TCP/TLS handshake per call.
+    """
+    import httpx
+
+    logger.debug(
+        f"Creating async HTTP client (pool_size={pool_size}, "
+        f"keepalive={keepalive_connections}, expiry={keepalive_expiry}s)"
+    )
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+    )
+
+class AsyncChatbot:
+    """Asyncio front-end for a :class:`Chatbot`.
+
+    Retrieval stays in the wrapped chatbot and runs in a worker thread; only
+    the LLM call goes through the shared async client, so a request waiting
+    on the model no longer holds a thread.
+    """
+
+    def __init__(self, chatbot: Chatbot, client):
+        self.chatbot = chatbot
+        self.client = client
+
+    async def fast_answer(self, message: str, grade: Optional[str] = None, subject: Optional[str] = None):
+        return await asyncio.to_thread(self.chatbot.fast_answer, message, grade, subject)
+
+    async def chat(self, message: str, grade: Optional[str] = None, subject: Optional[str] = None) -> str:
+        try:
+            url, headers, payload = await asyncio.to_thread(self.chatbot._build_request, message, grade, subject)
+            cache_key = self.chatbot._response_cache_key(payload)
+            cached = await asyncio.to_thread(self.chatbot._get_cached_response, cache_key)
+            if cached is not None:
+                return cached
+
+            logger.debug(f"Sending async chat request to {url}")
+            # Shares the LLM concurrency cap and throttling handling with the threaded path
+            async with self.chatbot.llm_limiter.async_slot():
+                with span("llm"):
+                    response = await self.client.post(url, json=payload, headers=headers)
+                    self.chatbot._raise_for_status(response)
+            UPSTREAM_BYTES.inc(len(response.content), upstream="llm")
+
+            data = response.json()
+            self.chatbot.prompt_usage.record_usage(data.get("usage"))
+            content = data["choices"][0]["message"]["content"]
+            await asyncio.to_thread(self.chatbot._cache_response, cache_key, content)
+            return content
+
+        except Exception as e:
+            logger.error(f"Async chatbot request failed: {str(e)}")
+            raise
+
+    async def chat_stream(
+        self,
+        message: str,
+        grade: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        try:
+            url, headers, payload = await asyncio.to_thread(self.chatbot._build_request, message, grade, subject)
+            cache_key = self.chatbot._response_cache_key(payload)
+            cached = await asyncio.to_thread(self.chatbot._get_cached_response, cache_key)
+            if cached is not None:
+                yield cached
+                return
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+            parts = []
+
+            logger.debug(f"Sending async streaming chat request to {url}")
+            started = time.perf_counter()
+            first_token = True
+            async with self.chatbot.llm_limiter.async_slot():
+                with span("llm"):
+                    async with self.client.stream("POST", url, json=payload, headers=headers) as response:
+                        self.chatbot._raise_for_status(response)
+
+                        async for line in response.aiter_lines():
+                            UPSTREAM_BYTES.inc(len(line.encode("utf-8")) + 1, upstream="llm")
+                            if not line or not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+
+                            chunk = json.loads(data)
+                            self.chatbot.prompt_usage.record_usage(chunk.get("usage"))
+                            choices = chunk.get("choices") or [{}]
+                            delta = choices[0].get("delta", {}).get("content")
+                            if delta:
+                                if first_token:
+                                    first_token = False
+                                    observe_stage("llm_first_token", time.perf_counter() - started)
+                                logger.trace(f"Received chat delta: {delta}")
+                                parts.append(delta)
+                                yield delta
+
+            await asyncio.to_thread(self.chatbot._cache_response, cache_key, "".join(parts))
+
+        except Exception as e:
+            logger.error(f"Async chatbot streaming request failed: {str(e)}")
+            raise
+
+class AsyncTTSService:
+    """Asyncio front-end for a :class:`TTSService`.
+
+    Shares the wrapped service's audio cache, request format and file
+    layout, so audio produced here is served by the same ``/audio`` route.
+    Chunk requests share the wrapped service's upstream limiter, so the
+    threaded and asyncio paths together stay within ``max_workers``.
+    """
+
+    def __init__(self, tts: TTSService, client):
+        self.tts = tts
+        self.client = client
+        self._single_flight = AsyncSingleFlight()
+
+    def stats(self) -> dict:
+        return {**self.tts.stats(), "async_single_flight": self._single_flight.stats()}
+
+    async def speak(self, text: str) -> str:
+        try:
+            # Identical replies map to the same content-addressed audio file
+            reply_key = self.tts._cache_key("reply", text)
+            cached_path = self.tts.audio_cache.get(reply_key)
+            if cached_path:
+                logger.debug(f"TTS cache hit for reply: {cached_path}")
+                return cached_path
+
+            text_chunks = self.tts._split_text(text)
+            results = await asyncio.gather(
+                *(self._synthesize_chunk(chunk, i, len(text_chunks)) for i, chunk in enumerate(text_chunks)),
+                return_exceptions=True
+            )
+
+            def result_of(value):
+                def result():
+                    if isinstance(value, BaseException):
+                        raise value
+                    return value
+                return result
+
+            # Writing and cache eviction touch the disk, keep them off the event loop
+            return await asyncio.to_thread(
+                self.tts._write_reply, reply_key, [result_of(value) for value in results], len(text_chunks)
+            )
+
+        except Exception as e:
+            logger.error(f"Async TTS request failed: {str(e)}")
+            raise
+
+    async def _synthesize_chunk(self, chunk: str, index: int, total: int) -> Optional[bytes]:
+        chunk_key = self.tts._cache_key("chunk", chunk)
+        audio_data = await asyncio.to_thread(self.tts.audio_cache.read, chunk_key)
+        if audio_data:
+            logger.debug(f"TTS cache hit for chunk {index+1}/{total}")
+            return audio_data
+
+        async def fetch():
+            async with self.tts.upstream_limiter.async_slot():
+                audio_data = await self._fetch_chunk(chunk, index, total)
+            if audio_data:
+                await asyncio.to_thread(self.tts.audio_cache.put, chunk_key, audio_data)
+            return audio_data
+
+        return await self._single_flight.do(chunk_key, fetch)
+
+    async def _fetch_chunk(self, chunk: str, index: int, total: int) -> Optional[bytes]:
+        headers, request_json = self.tts._build_chunk_request(chunk)
+
+        logger.debug(f"Sending async TTS request for {chunk} {index+1}/{total}")
+        logger.trace(f"Request payload: {request_json}")
+
+        self.tts._api_calls += 1
+        with span("tts_chunk"):
+            response = await self.client.post(
+                str(self.tts.config.api_url),
+                json=request_json,
+                headers=headers,
+                timeout=self.tts.config.chunk_timeout
+            )
+        UPSTREAM_BYTES.inc(len(response.content), upstream="tts")
+
+        logger.debug(f"Received response with status: {response.status_code}")
+        return self.tts._decode_chunk_response(response.status_code, response.json())
@@ -0,0 +1,368 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+from loguru import logger
+
+AUDIO_FILENAME = re.compile(r"^[0-9a-f]{64}\.mp3$")
+
+class FileLeases:
+    """Reference counts of files in use, so maintenance can skip them"""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, filename: str):
+        with self._lock:
+            self._counts[filename] = self._counts.get(filename, 0) + 1
+
+    def release(self, filename: str):
+        with self._lock:
+            count = self._counts.get(filename, 0) - 1
+            if count > 0:
+                self._counts[filename] = count
+            else:
+                self._counts.pop(filename, None)
+
+    def is_leased(self, filename: str) -> bool:
+        with self._lock:
+            return filename in self._counts
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+class PendingAudio:
+    """An audio file that is still being written, readable while it grows.
+
+    The writer reports each appended block through :meth:`advance` and calls
+    :meth:`finish` once the file is committed (or abandoned). Readers get
+    the bytes written so far and then block until more arrive.
+    """
+
+    def __init__(self, temp_path: str):
+        self.temp_path = temp_path
+        self.written = 0
+        self.done = False
+        self.path: Optional[str] = None
+        self._condition = threading.Condition()
+
+    def advance(self, nbytes: int):
+        with self._condition:
+            self.written += nbytes
+            self._condition.notify_all()
+
+    def finish(self, path: Optional[str]):
+        with self._condition:
+            self.done = True
+            self.path = path
+            self._condition.notify_all()
+
+    def stream(self, block_size: int = 64 * 1024) -> Iterator[bytes]:
+        # Opened eagerly so a file that was already committed or removed
+        # raises FileNotFoundError here rather than inside the response
+        f = open(self.temp_path, "rb")
+
+        def blocks():
+            sent = 0
+            with f:
+                while True:
+                    data = f.read(block_size)
+                    if data:
+                        sent += len(data)
+                        yield data
+                        continue
+                    with self._condition:
+                        if self.done and sent >= self.written:
+                            return
+                        self._condition.wait_for(lambda: self.done or self.written > sent, timeout=1.0)
+
+        return blocks()
+
+class GrowingFile:
+    """An audio file another worker is still writing, followed by polling.
+
+    The writer renames the file into the cache (or removes it) when it is
+    done. The open handle keeps pointing at the same inode, so the reader
+    drains whatever is left and ends the stream. A writer that stops making
+    progress for ``idle_timeout`` seconds is assumed dead.
+    """
+
+    def __init__(self, path: str, idle_timeout: float, poll_interval: float = 0.05):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+
+    def _writing(self, f) -> bool:
+        try:
+            return os.stat(self.path).st_ino == os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def stream(self, block_size: int = 64 * 1024) -> Iterator[bytes]:
+        # Opened eagerly, like PendingAudio.stream
+        f = open(self.path, "rb")
+
+        def blocks():
+            last_progress = time.monotonic()
+            with f:
+                while True:
+                    data = f.read(block_size)
+                    if data:
+                        last_progress = time.monotonic()
+                        yield data
+                        continue
+                    if not self._writing(f):
+                        # Committed or abandoned: whatever is left is all there will be
+                        while data := f.read(block_size):
+                            yield data
+                        return
+                    if time.monotonic() - last_progress > self.idle_timeout:
+                        logger.warning(f"Gave up waiting for {self.path} after {self.idle_timeout}s without progress")
+                        return
+                    time.sleep(self.poll_interval)
+
+        return blocks()
+
+class AudioCache:
+    """Content-addressed store of synthesized audio with LRU eviction.
+
+    Entries live directly in the audio folder as ``<sha256>.mp3`` so the
+    ``/audio/<filename>`` route serves them without any extra lookup. The
+    in-memory index is rebuilt from file mtimes on start-up and is refreshed
+    from disk on lookup, so several workers can share one folder.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, max_age: float):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # filename -> (size, last access time), oldest first
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        # Files currently being served must survive eviction
+        self.leases = FileLeases()
+        os.makedirs(self.folder, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.abspath(os.path.join(self.folder, f"{key}.mp3"))
+
+    def temp_path_for(self, key: str) -> str:
+        return os.path.abspath(os.path.join(self.folder, f".{key}.{uuid.uuid4().hex}.tmp"))
+
+    def part_path_for(self, key: str) -> str:
+        # Well-known name of a file being written, so every worker sharing the folder can find it
+        return os.path.abspath(os.path.join(self.folder, f".{key}.part"))
+
+    def claim_part(self, key: str, stale_after: float) -> Optional[str]:
+        """Create the in-progress file for ``key``; None if another writer is already on it.
+
+        A part file that has not been written for ``stale_after`` seconds
+        belongs to a dead writer and is taken over.
+        """
+        path = self.part_path_for(key)
+        for _ in range(2):
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                # A new attempt supersedes an earlier failure
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._failure_path(f"{key}.mp3"))
+                return path
+            except FileExistsError:
+                pass
+            try:
+                if time.time() - os.stat(path).st_mtime <= stale_after:
+                    return None
+                os.remove(path)
+                logger.warning(f"Taking over stale audio part file {path}")
+            except FileNotFoundError:
+                pass
+        return None
+
+    def open_part(self, filename: str, idle_timeout: float) -> Optional[GrowingFile]:
+        if not AUDIO_FILENAME.match(filename):
+            return None
+        path = self.part_path_for(filename[:-len(".mp3")])
+        return GrowingFile(path, idle_timeout) if os.path.exists(path) else None
+
+    def _failure_path(self, filename: str) -> str:
+        return os.path.join(self.folder, f".{filename}.failed")
+
+    def mark_failed(self, key: str):
+        # A marker file, so every worker can tell a failed reply from an unknown one
+        with open(self._failure_path(f"{key}.mp3"), "w"):
+            pass
+
+    def failed(self, filename: str) -> bool:
+        if not AUDIO_FILENAME.match(filename) or os.path.exists(os.path.join(self.folder, filename)):
+            return False
+        return os.path.exists(self._failure_path(filename))
+
+    def _alias_path(self, filename: str) -> str:
+        return os.path.join(self.folder, f".{filename}.alias")
+
+    def set_alias(self, filename: str, target: str):
+        # A sidecar file, so every worker (and a restarted one) serves ``target`` for ``filename``
+        temp_path = f"{self._alias_path(filename)}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(target)
+        os.replace(temp_path, self._alias_path(filename))
+
+    def resolve(self, filename: str) -> str:
+        if not AUDIO_FILENAME.match(filename) or os.path.exists(os.path.join(self.folder, filename)):
+            return filename
+        try:
+            with open(self._alias_path(filename)) as f:
+                target = f.read().strip()
+        except FileNotFoundError:
+            return filename
+        return target if AUDIO_FILENAME.match(target) else filename
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        files = {}
+        for name in os.listdir(self.folder):
+            if name.startswith(".") or not name.endswith(".mp3"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                continue
+            files[name] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def _load(self):
+        for name, (size, mtime) in sorted(self._scan().items(), key=lambda item: item[1][1]):
+            self._entries[name] = (size, mtime)
+            self._total_bytes += size
+        logger.debug(f"Audio cache loaded {len(self._entries)} entries ({self._total_bytes} bytes)")
+
+    def refresh(self):
+        # Reconcile the index with files written or removed by other workers sharing the folder
+        on_disk = self._scan()
+        with self._lock:
+            merged = {
+                name: (size, max(mtime, self._entries[name][1]) if name in self._entries else mtime)
+                for name, (size, mtime) in on_disk.items()
+            }
+            self._entries = OrderedDict(sorted(merged.items(), key=lambda item: item[1][1]))
+            self._total_bytes = sum(size for size, _ in self._entries.values())
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        filename = os.path.basename(path)
+        now = time.time()
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                # Removed by another worker or by eviction
+                self._discard(filename)
+                self.misses += 1
+                return None
+
+            if filename not in self._entries:
+                # Written by another worker sharing the folder
+                self._total_bytes += size
+            self._entries[filename] = (size, now)
+            self._entries.move_to_end(filename)
+            self.hits += 1
+
+        try:
+            # Touch the file so the LRU order survives restarts
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            pass
+        return path
+
+    def read(self, key: str) -> Optional[bytes]:
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> str:
+        temp_path = self.temp_path_for(key)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return self.commit(key, temp_path)
+
+    def commit(self, key: str, temp_path: str) -> str:
+        path = self.path_for(key)
+        filename = os.path.basename(path)
+        # Atomic rename so readers never observe a partially written file
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._discard(filename)
+            self._entries[filename] = (size, time.time())
+            self._total_bytes += size
+        self.evict()
+        return path
+
+    def evict(self) -> Tuple[int, int]:
+        """Evict least recently used files over the size quota or past the TTL.
+
+        Files leased through :attr:`leases` (being served) are skipped. The
+        quota never evicts the last remaining file, but the TTL does.
+        Returns the number of files and bytes reclaimed.
+        """
+        now = time.time()
+        victims = []
+        with self._lock:
+            for filename, (size, last_access) in list(self._entries.items()):
+                expired = now - last_access > self.max_age
+                over_quota = self._total_bytes > self.max_bytes and len(self._entries) > 1
+                if not (expired or over_quota):
+                    break
+                if self.leases.is_leased(filename):
+                    continue
+                self._discard(filename)
+                victims.append((filename, size))
+            self.evictions += len(victims)
+            self.evicted_bytes += sum(size for _, size in victims)
+
+        # Unlinking can be slow on network filesystems; lookups must not wait on it
+        for filename, size in victims:
+            try:
+                os.remove(os.path.join(self.folder, filename))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted cached audio {filename} ({size} bytes)")
+        return len(victims), sum(size for _, size in victims)
+
+    def _discard(self, filename: str):
+        entry = self._entries.pop(filename, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes
+            }
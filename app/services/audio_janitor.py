@@ -0,0 +1,105 @@
+import os
+import time
+import threading
+from loguru import logger
+from .audio_cache import AudioCache
+
+class AudioJanitor:
+    """Background maintenance of the audio folder.
+
+    Commits already evict opportunistically, but only against the files this
+    process knows about. The janitor periodically rescans the folder (picking
+    up files written by other workers), enforces the size quota and TTL, and
+    removes temp files orphaned by crashed writers. Files leased by the
+    ``/audio`` route are never removed.
+    """
+
+    def __init__(self, cache: AudioCache, interval: float = 300.0, temp_max_age: float = 3600.0):
+        self.cache = cache
+        self.interval = interval
+        self.temp_max_age = temp_max_age
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.reclaimed_files = 0
+        self.reclaimed_bytes = 0
+        self.temp_files_removed = 0
+        self.last_run_seconds = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="audio-janitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Audio janitor started (interval={self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Audio janitor run failed: {str(e)}")
+
+    def run_once(self):
+        start = time.perf_counter()
+        self.cache.refresh()
+        files, reclaimed = self.cache.evict()
+        temp_files, temp_bytes = self._remove_stale_temp_files()
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.runs += 1
+            self.reclaimed_files += files + temp_files
+            self.reclaimed_bytes += reclaimed + temp_bytes
+            self.temp_files_removed += temp_files
+            self.last_run_seconds = elapsed
+        if files or temp_files:
+            logger.info(
+                f"Audio janitor reclaimed {files + temp_files} files "
+                f"({reclaimed + temp_bytes} bytes) in {elapsed:.2f}s"
+            )
+
+    def _remove_stale_temp_files(self):
+        # Writers rewrite their temp file continuously, so an old one belongs to a dead writer.
+        # Aliases of partly synthesized replies go once the file they point at is evicted;
+        # failure markers age out like temp files.
+        now = time.time()
+        files = reclaimed = 0
+        for name in os.listdir(self.cache.folder):
+            if not name.startswith(".") or not name.endswith((".tmp", ".part", ".alias", ".failed")):
+                continue
+            path = os.path.join(self.cache.folder, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith(".alias"):
+                    with open(path) as f:
+                        target = f.read().strip()
+                    if target and os.path.exists(os.path.join(self.cache.folder, target)):
+                        continue
+                elif now - stat.st_mtime <= self.temp_max_age:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            files += 1
+            reclaimed += stat.st_size
+            logger.debug(f"Removed stale audio temp file {name}")
+        return files, reclaimed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "reclaimed_files": self.reclaimed_files,
+                "reclaimed_bytes": self.reclaimed_bytes,
+                "temp_files_removed": self.temp_files_removed,
+                "last_run_seconds": self.last_run_seconds,
+                "leased_files": len(self.cache.leases)
+            }
@@ -1,13 +1,29 @@
+import os
+import json
+import math
+import time
+import unicodedata
 import requests
-from typing import Optional, List
+from typing import TYPE_CHECKING, Optional, List, Iterator, Literal, Tuple, Dict
 from loguru import logger
 from pydantic import BaseModel, HttpUrl
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from langchain_community.document_loaders import DirectoryLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from .admission import Overloaded, UpstreamLimiter
+from .cache import LRUCache
+from .file_lock import FileLock
+from .metrics import UPSTREAM_BYTES, observe_stage, span
+from .fast_answers import FastAnswer, open_fast_answer_store
+from .prompt_builder import PromptUsage, build_context, build_messages, estimate_tokens
+from .response_cache import create_response_cache, make_response_key
+from .knowledge_base import KnowledgeBaseIndexer, MetadataPartitions, create_embeddings
+from .knowledge_points import QuestionIndex, load_knowledge_points, question_from_content
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# 每次请求检索的知识片段数
+RETRIEVAL_K = 3
 
 class ChatbotConfig(BaseModel):
     base_url: HttpUrl
@@ -15,6 +31,22 @@ class ChatbotConfig(BaseModel):
     model: str = "deepseek-chat"
     knowledge_base_path: str = "data/knowledge_base"
     local_model_path: str = "models/text2vec-base-chinese"
+    embedding_batch_size: int = 32
+    build_index_on_start: bool = True
+    query_cache_size: int = 1024
+    question_match_threshold: float = 0.9
+    response_cache_backend: Literal["none", "memory", "sqlite"] = "none"
+    response_cache_path: str = "data/response_cache.sqlite3"
+    response_cache_size: int = 1024
+    response_cache_ttl: float = 24 * 3600
+    start_watcher: bool = True
+    watch_interval: float = 60.0
+    context_token_budget: int = 600
+    context_score_ratio: Optional[float] = 1.5
+    max_concurrency: int = 16
+    upstream_wait: float = 5.0
+    fast_answers_path: Optional[str] = None
+    fast_answer_min_similarity: float = 0.9
 
 class ChatbotResponse(BaseModel):
     response: str
@@ -22,37 +54,93 @@ class ChatbotResponse(BaseModel):
     success: bool
 
 class Chatbot:
-    def __init__(self, config: ChatbotConfig):
+    def __init__(self, config: ChatbotConfig, embeddings=None, session: Optional[requests.Session] = None):
+        # embeddings/session: 可注入已有的嵌入模型和HTTP会话（测试和离线工具使用），默认按配置创建
         logger.info("Starting chatbot initialization...")
         self.config = config
         
         logger.debug("Creating HTTP session...")
-        self.session = self._create_session()
+        self.session = session if session is not None else self._create_session()
         logger.debug("HTTP session created successfully")
         
+        logger.debug("Loading embedding model...")
+        if embeddings is None:
+            embeddings = create_embeddings(self.config.local_model_path, self.config.embedding_batch_size)
+        self.embeddings = embeddings
+        self.indexer = KnowledgeBaseIndexer(
+            knowledge_base_path=self.config.knowledge_base_path,
+            embeddings=self.embeddings,
+            embedding_model=self.config.local_model_path,
+            batch_size=self.config.embedding_batch_size
+        )
+        logger.debug("Embedding model loaded successfully")
+        
+        self.embedding_cache = LRUCache(maxsize=self.config.query_cache_size)
+        self.retrieval_cache = LRUCache(maxsize=self.config.query_cache_size)
+        self._partitions = None
+        self.prompt_usage = PromptUsage()
+        # 限制同时进行的大模型请求数，突发流量在这里排队或快速失败，而不是全部压到上游
+        self.llm_limiter = UpstreamLimiter("llm", self.config.max_concurrency, self.config.upstream_wait)
+        # 离线生成的知识点回答（见 data/knowledge_base/build_fast_answers.py）
+        self.fast_answers = open_fast_answer_store(self.config.fast_answers_path)
+        # 相同问题、相同上下文的回答直接复用，不再请求大模型
+        self.response_cache = create_response_cache(
+            backend=self.config.response_cache_backend,
+            maxsize=self.config.response_cache_size,
+            ttl=self.config.response_cache_ttl,
+            path=self.config.response_cache_path
+        )
+        
+        # 同一主机上的多个worker共享索引目录：构建时互斥，只有一个leader负责监视和重建
+        self._build_lock = FileLock(os.path.join(self.indexer.cache_dir, "build.lock"))
+        self._leader_lock = FileLock(os.path.join(self.indexer.cache_dir, "watcher.lock"))
+        self._watcher_started = False
+        
         logger.debug("Initializing knowledge base...")
         self.vector_store = self._init_knowledge_base()
         logger.debug("Knowledge base initialized successfully")
         
+        # 预fork模式下由worker在fork之后启动监视线程（见 gunicorn.conf.py）
+        if self.config.start_watcher:
+            self.start_watcher()
+        logger.info("Chatbot initialized successfully")
+        
+    def start_watcher(self):
+        if self._watcher_started:
+            return
+        self._watcher_started = True
         logger.debug("Starting knowledge base watcher...")
         self._start_knowledge_base_watcher()
-        logger.info("Chatbot initialized successfully")
         
     def _start_knowledge_base_watcher(self):
         logger.trace("Setting up knowledge base watcher thread")
         import threading
         import time
-        import os
         
         def watcher():
             last_modified = self._get_knowledge_base_last_modified()
+            last_generation = self.indexer.generation()
             while True:
-                time.sleep(60)  # 每分钟检查一次
-                current_modified = self._get_knowledge_base_last_modified()
-                if current_modified > last_modified:
+                time.sleep(self.config.watch_interval)  # 默认每分钟检查一次
+                # 自动构建模式下由leader跟踪知识库文件并重建；其他worker和预构建模式只比较索引版本号
+                leader = self.config.build_index_on_start and self._leader_lock.acquire(blocking=False)
+                if leader:
+                    current_modified = self._get_knowledge_base_last_modified()
+                    changed = current_modified > last_modified
+                else:
+                    current_generation = self.indexer.generation()
+                    changed = current_generation != last_generation
+                if changed:
                     logger.info("Knowledge base files changed, reloading...")
-                    self.vector_store = self._init_knowledge_base()
-                    last_modified = current_modified
+                    try:
+                        # 构建完成后整体替换引用，查询过程中不会看到半更新的索引
+                        self.vector_store = self._reload_knowledge_base(build=leader)
+                        # 检索结果依赖索引内容，需要失效；查询向量只依赖模型，可以保留
+                        self.retrieval_cache.clear()
+                        last_modified = self._get_knowledge_base_last_modified()
+                        last_generation = self.indexer.generation()
+                    except Exception as e:
+                        logger.error(f"Failed to reload knowledge base: {str(e)}")
                     
         thread = threading.Thread(target=watcher, daemon=True)
         thread.start()
@@ -63,7 +151,10 @@ class Chatbot:
         from datetime import datetime
         
         max_mtime = 0
-        for root, _, files in os.walk(self.config.knowledge_base_path):
+        for root, dirs, files in os.walk(self.config.knowledge_base_path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]  # 忽略隐藏目录（如索引缓存）
+            # 删除文件只会改变目录的mtime
+            max_mtime = max(max_mtime, os.path.getmtime(root))
             for f in files:
                 if f.startswith("."):  # 忽略隐藏文件
                     continue
@@ -77,109 +168,118 @@ class Chatbot:
         logger.debug(f"Knowledge base path: {self.config.knowledge_base_path}")
         logger.debug(f"Local model path: {self.config.local_model_path}")
         import os
-        import pickle
-        from datetime import datetime, timedelta
         
-        cache_dir = os.path.join(self.config.knowledge_base_path, ".cache")
-        cache_file = os.path.join(cache_dir, "vector_store.pkl")
-        metadata_file = os.path.join(cache_dir, "metadata.json")
+        cache_dir = self.indexer.cache_dir
+        legacy_cache_file = os.path.join(cache_dir, "vector_store.pkl")
         
         # 创建缓存目录
         os.makedirs(cache_dir, exist_ok=True)
         logger.trace(f"Cache directory: {cache_dir}")
         
-        # 检查缓存是否有效
-        if os.path.exists(cache_file) and os.path.exists(metadata_file):
-            with open(metadata_file, "r") as f:
-                import json
-                metadata = json.load(f)
-                last_modified = datetime.fromisoformat(metadata["last_modified"])
-                
-                # 如果知识库文件未修改且缓存未过期（7天）
-                if (datetime.now() - last_modified) < timedelta(days=7):
-                    # 检查缓存版本是否匹配当前文件格式
-                    if metadata.get("file_format", "txt") == "md":
-                        with open(cache_file, "rb") as f:
-                            logger.info("Loading vector store from cache")
-                            return pickle.load(f)
-                    
-            # 如果文件格式不匹配，清除缓存
-            logger.info("Clearing outdated cache due to file format change")
-            os.remove(cache_file)
-            os.remove(metadata_file)
+        # 旧版本的pickle缓存不再使用
+        if os.path.exists(legacy_cache_file):
+            logger.info("Removing legacy pickle vector store cache")
+            os.remove(legacy_cache_file)
         
-        # 加载知识库文档
-        logger.debug("Loading knowledge base documents...")
-        try:
-            from langchain_community.document_loaders import TextLoader
-            loader = DirectoryLoader(
-                self.config.knowledge_base_path,
-                glob="**/*.md",
-                loader_cls=TextLoader,
-                show_progress=True
-            )
-            logger.debug(f"Loading documents from: {self.config.knowledge_base_path}")
-            documents = loader.load()
-            logger.debug(f"Loaded {len(documents)} documents")
-            for doc in documents:
-                logger.trace(f"Document metadata: {doc.metadata}")
-        except Exception as e:
-            logger.error(f"Failed to load documents: {str(e)}")
-            raise
+        return self._reload_knowledge_base()
         
-        # 分割文档
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
+    def _reload_knowledge_base(self, build: Optional[bool] = None):
+        # 题目精确匹配索引，命中时无需计算向量
+        self.question_index = QuestionIndex(
+            load_knowledge_points(self.config.knowledge_base_path),
+            min_similarity=self.config.question_match_threshold
         )
-        texts = text_splitter.split_documents(documents)
-        logger.debug(f"Split documents into {len(texts)} chunks")
+        # 生产环境只加载离线构建好的索引（见 data/knowledge_base/build_index.py）
+        if self.config.build_index_on_start if build is None else build:
+            # 同时启动的worker依次进入，后进入的发现索引已是最新，直接加载
+            with self._build_lock:
+                return self.indexer.sync()
+        return self.indexer.load()
+ 
+    @staticmethod
+    def _normalize_query(message: str) -> str:
+        # 统一全角/半角并合并空白，使同一问题的不同写法命中同一缓存项
+        return " ".join(unicodedata.normalize("NFKC", message).split()).lower()
         
-        # 创建向量存储
-        logger.debug("Creating vector store...")
-        import requests
+    def _retrieve(
+        self,
+        message: str,
+        k: int,
+        grade: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> List[Tuple["Document", float]]:
+        # 与知识库题目完全或几乎一致时直接返回该知识点，跳过向量检索
+        match = self.question_index.lookup(message, grade=grade, subject=subject)
+        if match is not None:
+            point, similarity = match
+            logger.debug(f"Question index hit for {point.key} (similarity {similarity:.2f})")
+            return [(point.to_document(), 0.0)]
         
-        # 创建带有重试机制的session
-        session = requests.Session()
-        retry_strategy = requests.adapters.HTTPAdapter(
-            max_retries=5,
-            pool_connections=10,
-            pool_maxsize=10,
-            pool_block=True
-        )
-        session.mount("https://", retry_strategy)
+        query = self._normalize_query(message)
+        vector_store = self.vector_store
+        cache_key = (query, k, grade, subject)
         
-        # 初始化HuggingFaceEmbeddings，使用本地模型
-        embeddings = HuggingFaceEmbeddings(
-            model_name=self.config.local_model_path,
-            cache_folder="models"
-        )
-        vector_store = FAISS.from_documents(texts, embeddings)
-        logger.debug("Vector store created successfully")
+        docs_and_scores = self.retrieval_cache.get(cache_key)
+        if docs_and_scores is not None:
+            logger.debug("Retrieval cache hit")
+            return docs_and_scores
         
-        # 保存缓存
-        with open(cache_file, "wb") as f:
-            pickle.dump(vector_store, f)
-            
-        # 保存元数据
-        with open(metadata_file, "w") as f:
-            import json
-            json.dump({
-                "last_modified": datetime.now().isoformat(),
-                "version": "1.0",
-                "file_format": "md"
-            }, f)
+        embedding = self._embed_query(query)
+        
+        # 指定年级或学科时只在对应分区内检索
+        with span("search"):
+            docs_and_scores = self._get_partitions(vector_store).search(embedding, k, grade=grade, subject=subject)
+        # 检索期间索引若被替换，结果已过时，不写入缓存
+        if vector_store is self.vector_store:
+            self.retrieval_cache.put(cache_key, docs_and_scores)
+        return docs_and_scores
+        
+    def _embed_query(self, query: str) -> List[float]:
+        embedding = self.embedding_cache.get(query)
+        if embedding is None:
+            with span("embed"):
+                embedding = self.embeddings.embed_query(query)
+            self.embedding_cache.put(query, embedding)
+        else:
+            logger.debug("Query embedding cache hit")
+        return embedding
+        
+    def _question_similarity(self, message: str, question: str) -> float:
+        # 问题与知识点题目的余弦相似度，两者的向量都经过查询向量缓存
+        a = self._embed_query(self._normalize_query(message))
+        b = self._embed_query(self._normalize_query(question))
+        norm = math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
+        return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+        
+    def _get_partitions(self, vector_store) -> MetadataPartitions:
+        # 分区与索引一一对应，索引替换后按需重建
+        partitions = self._partitions
+        if partitions is None or partitions.vector_store is not vector_store:
+            partitions = MetadataPartitions(vector_store)
+            self._partitions = partitions
+        return partitions
+        
+    def stats(self) -> dict:
+        return {
+            "question_index": self.question_index.stats(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "retrieval_cache": self.retrieval_cache.stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "prompt": self.prompt_usage.stats(),
+            "llm": self.llm_limiter.stats(),
+            "fast_answers": self.fast_answers.stats() if self.fast_answers else None
+        }
         
-        logger.info("Knowledge base initialized and cached successfully")
-        return vector_store
- 
     def _create_session(self):
         logger.trace("Creating HTTP session with retry strategy")
         session = requests.Session()
+        # 只重试没有到达上游的连接失败；限流和5xx直接返回给准入层，避免重试放大突发流量
         retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[500, 502, 503, 504]
+            total=2,
+            connect=2,
+            read=0,
+            status=0,
+            backoff_factor=0.5
         )
         adapter = HTTPAdapter(max_retries=retry_strategy)
         session.mount("http://", adapter)
@@ -187,72 +287,216 @@ class Chatbot:
         logger.trace("HTTP session configured successfully")
         return session
         
-    def chat(self, message: str) -> str:
+    def fast_answer(
+        self,
+        message: str,
+        grade: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> Optional[FastAnswer]:
+        """Return the pre-generated answer when the question clearly matches one knowledge point.
+
+        Retrieves exactly like :meth:`_build_request`, so on a miss the prompt
+        reuses the cached retrieval result instead of searching again.
+        """
+        if self.fast_answers is None:
+            return None
+        with span("fast_answer"):
+            docs_and_scores = self._retrieve(message, k=RETRIEVAL_K, grade=grade, subject=subject)
+            if not docs_and_scores:
+                return None
+            doc, distance = min(docs_and_scores, key=lambda item: item[1])
+            question = question_from_content(doc.page_content)
+            if question is None:
+                return None
+            # 题目索引命中时距离为0；向量检索比较的是题目加答案，这里只比较问题与知识点题目
+            similarity = 1.0 if distance == 0.0 else self._question_similarity(message, question)
+            if similarity < self.config.fast_answer_min_similarity:
+                return None
+            answer = self.fast_answers.get(doc.page_content)
+        if answer is not None:
+            logger.info(f"Serving pre-generated answer (similarity {similarity:.2f})")
+        return answer
+
+    def chat(self, message: str, grade: Optional[str] = None, subject: Optional[str] = None) -> str:
         try:
-            logger.debug(f"Received chat message: {message}")
-            # 先进行知识检索
-            logger.trace("Performing similarity search on vector store")
-            docs_and_scores = self.vector_store.similarity_search_with_score(message, k=3)
-            logger.debug(f"Found {len(docs_and_scores)} relevant documents")
-            
-            # 构建上下文
-            context_parts = []
-            for i, (doc, score) in enumerate(docs_and_scores):
-                context_parts.append(
-                    f"【知识片段 {i+1}】\n"
-                    f"相关性评分：{score:.2f}\n"
-                    f"内容：{doc.page_content}\n"
-                    f"来源：{doc.metadata.get('source', '未知')}\n"
-                )
-            context = "\n".join(context_parts)
-            
-            # 构建prompt
-            system_prompt = (
-                "# CONTEXT（上下文） #\n"
-                "你叫兜兜龙，是一个AI学习伙伴，专门为6-12岁儿童提供学习辅导和陪伴\n"
-                "# OBJECTIVE（目标） #\n"
-                "你的任务是辅助小朋友理解知识、培养学习兴趣，提供安全友好的互动体验。结合以下知识片段中最相关的一个题目，不要告诉小朋友答案，要一步步引导小朋友说出正确答案，并给予鼓励。\n"
-                f"{context}\n"
-                "# STYLE（风格） #\n"
-                "用简单易懂的语言，不要使用表情符号。\n"
-                "# TONE（语调） #\n"
-                "充满活力，保持友好和鼓励。 \n"
-                "# AUDIENCE（受众） #\n"
-                "主要受众是6到12岁的小朋友。他们喜欢有趣的知识，能够激发他们学习的乐趣\n"
-                "# RESPONSE（响应） #\n"
-                "以MarkDown格式回答。\n"
-            )
-            
-            url = f"{self.config.base_url}/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "model": self.config.model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ]
-            }
+            url, headers, payload = self._build_request(message, grade, subject)
+            cache_key = self._response_cache_key(payload)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                return cached
             
             logger.debug(f"Sending chat request to {url}")
-            response = self.session.post(url, json=payload, headers=headers)
-            response.raise_for_status()
+            with self.llm_limiter.slot(), span("llm"):
+                response = self.session.post(url, json=payload, headers=headers)
+                self._raise_for_status(response)
+            UPSTREAM_BYTES.inc(len(response.content), upstream="llm")
             
             data = response.json()
-            return data["choices"][0]["message"]["content"]
+            self.prompt_usage.record_usage(data.get("usage"))
+            content = data["choices"][0]["message"]["content"]
+            self._cache_response(cache_key, content)
+            return content
             
         except Exception as e:
             logger.error(f"Chatbot request failed: {str(e)}")
             raise
 
+    def chat_stream(
+        self,
+        message: str,
+        grade: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> Iterator[str]:
+        try:
+            url, headers, payload = self._build_request(message, grade, subject)
+            cache_key = self._response_cache_key(payload)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                yield cached
+                return
+            payload["stream"] = True
+            # 流式响应的最后一个数据块携带token用量
+            payload["stream_options"] = {"include_usage": True}
+            parts = []
+            
+            logger.debug(f"Sending streaming chat request to {url}")
+            started = time.perf_counter()
+            first_token = True
+            with self.llm_limiter.slot(), span("llm"), \
+                    self.session.post(url, json=payload, headers=headers, stream=True) as response:
+                self._raise_for_status(response)
+                # SSE响应通常不带charset，requests会默认按ISO-8859-1解码
+                response.encoding = "utf-8"
+                
+                for line in response.iter_lines(decode_unicode=True):
+                    UPSTREAM_BYTES.inc(len(line.encode("utf-8")) + 1, upstream="llm")
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    
+                    chunk = json.loads(data)
+                    self.prompt_usage.record_usage(chunk.get("usage"))
+                    choices = chunk.get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        if first_token:
+                            first_token = False
+                            observe_stage("llm_first_token", time.perf_counter() - started)
+                        logger.trace(f"Received chat delta: {delta}")
+                        parts.append(delta)
+                        yield delta
+            
+            # 只缓存完整接收的回答
+            self._cache_response(cache_key, "".join(parts))
+                        
+        except Exception as e:
+            logger.error(f"Chatbot streaming request failed: {str(e)}")
+            raise
+
+    @staticmethod
+    def _raise_for_status(response):
+        # 上游限流或过载时让客户端稍后重试，而不是当作请求错误
+        if response.status_code in (429, 503):
+            retry_after = response.headers.get("Retry-After", "")
+            raise Overloaded(
+                f"LLM API is overloaded (HTTP {response.status_code})",
+                "llm_throttled",
+                retry_after=float(retry_after) if retry_after.isdigit() else 5.0
+            )
+        response.raise_for_status()
+
+    def _response_cache_key(self, payload: dict) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        *system_messages, message = (item["content"] for item in payload["messages"])
+        return make_response_key(payload["model"], "\n".join(system_messages), message)
+
+    def _get_cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        if cache_key is None:
+            return None
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Chat response served from response cache")
+        return cached
+
+    def _cache_response(self, cache_key: Optional[str], content: str):
+        if cache_key is not None and content:
+            self.response_cache.put(cache_key, content)
+
+    def _build_request(
+        self,
+        message: str,
+        grade: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> Tuple[str, dict, dict]:
+        logger.debug(f"Received chat message: {message} (grade={grade}, subject={subject})")
+        # 先进行知识检索
+        logger.trace("Performing similarity search on vector store")
+        docs_and_scores = self._retrieve(message, k=RETRIEVAL_K, grade=grade, subject=subject)
+        logger.debug(f"Found {len(docs_and_scores)} relevant documents")
+        
+        with span("prompt"):
+            # 在token预算内构建精简的上下文：去掉低相关和重复片段，不带评分和来源路径
+            context, snippets = build_context(
+                docs_and_scores,
+                token_budget=self.config.context_token_budget,
+                score_ratio=self.config.context_score_ratio
+            )
+            messages = build_messages(message, context)
+            
+            estimated_tokens = sum(estimate_tokens(item["content"]) for item in messages)
+        self.prompt_usage.record_estimate(estimated_tokens)
+        logger.info(f"Prompt uses {snippets} knowledge snippets, ~{estimated_tokens} input tokens")
+        
+        url = f"{self.config.base_url}/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {self.config.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.config.model,
+            "messages": messages
+        }
+        return url, headers, payload
+
 class ChatbotFactory:
     @staticmethod
-    def create_chatbot(base_url: str, api_key: str, model: str) -> Chatbot:
+    def create_chatbot(
+        base_url: str,
+        api_key: str,
+        model: str,
+        embedding_batch_size: int = 32,
+        build_index_on_start: bool = True,
+        query_cache_size: int = 1024,
+        response_cache_backend: str = "none",
+        response_cache_path: str = "data/response_cache.sqlite3",
+        response_cache_size: int = 1024,
+        response_cache_ttl: float = 24 * 3600,
+        start_watcher: bool = True,
+        context_token_budget: int = 600,
+        max_concurrency: int = 16,
+        upstream_wait: float = 5.0,
+        fast_answers_path: Optional[str] = None,
+        fast_answer_min_similarity: float = 0.9
+    ) -> Chatbot:
         config = ChatbotConfig(
             base_url=base_url,
             api_key=api_key,
-            model=model
+            model=model,
+            embedding_batch_size=embedding_batch_size,
+            build_index_on_start=build_index_on_start,
+            query_cache_size=query_cache_size,
+            response_cache_backend=response_cache_backend,
+            response_cache_path=response_cache_path,
+            response_cache_size=response_cache_size,
+            response_cache_ttl=response_cache_ttl,
+            start_watcher=start_watcher,
+            context_token_budget=context_token_budget,
+            max_concurrency=max_concurrency,
+            upstream_wait=upstream_wait,
+            fast_answers_path=fast_answers_path,
+            fast_answer_min_similarity=fast_answer_min_similarity
         )
         return Chatbot(config)
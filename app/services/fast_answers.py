@@ -0,0 +1,104 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Iterable, Optional, Set
+from loguru import logger
+from pydantic import BaseModel
+from .sqlite_connection import ProcessLocalConnection
+
+class FastAnswer(BaseModel):
+    question: str
+    answer: str
+    audio: Optional[bytes] = None
+
+def content_key(content: str) -> str:
+    # 以知识点正文（题目和答案）为键，知识点改动后旧回答自然失效
+    return hashlib.sha256(content.strip().encode("utf-8")).hexdigest()
+
+class FastAnswerStore:
+    """Pre-generated answers and audio per knowledge point, in one SQLite file.
+
+    Written offline by ``data/knowledge_base/build_fast_answers.py`` and
+    read by the chatbot, so questions that match a knowledge point are
+    answered without calling the LLM or TTS APIs.
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        # readonly: the chatbot only looks answers up and never creates the file or schema
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not readonly:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        # Opened on first use in each worker, never in the pre-fork master
+        self._db = ProcessLocalConnection(path, setup=None if readonly else self._setup)
+        logger.debug(f"Using fast answer store at {path}")
+
+    @staticmethod
+    def _setup(conn):
+        # WAL lets running workers keep reading while the batch job writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, question TEXT NOT NULL, answer TEXT NOT NULL, "
+            "audio BLOB, model TEXT NOT NULL, created REAL NOT NULL)"
+        )
+
+    def get(self, content: str) -> Optional[FastAnswer]:
+        with self._lock:
+            row = self._db.get().execute(
+                "SELECT question, answer, audio FROM answers WHERE key = ?", (content_key(content),)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        question, answer, audio = row
+        return FastAnswer(question=question, answer=answer, audio=audio)
+
+    def keys(self, model: Optional[str] = None) -> Set[str]:
+        with self._lock:
+            if model is None:
+                rows = self._db.get().execute("SELECT key FROM answers").fetchall()
+            else:
+                rows = self._db.get().execute("SELECT key FROM answers WHERE model = ?", (model,)).fetchall()
+        return {key for key, in rows}
+
+    def put(self, content: str, question: str, answer: str, audio: Optional[bytes], model: str):
+        with self._lock:
+            self._db.get().execute(
+                "INSERT OR REPLACE INTO answers (key, question, answer, audio, model, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (content_key(content), question, answer, audio, model, time.time())
+            )
+
+    def prune(self, keep: Iterable[str]) -> int:
+        # 删除已不在知识库中的知识点的回答
+        keep = set(keep)
+        with self._lock:
+            conn = self._db.get()
+            stale = [key for key, in conn.execute("SELECT key FROM answers").fetchall() if key not in keep]
+            conn.executemany("DELETE FROM answers WHERE key = ?", [(key,) for key in stale])
+        return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._db.get().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "answers": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+def open_fast_answer_store(path: Optional[str]) -> Optional[FastAnswerStore]:
+    if not path:
+        return None
+    if not os.path.exists(path):
+        logger.warning(f"Fast answer store {path} not found, run data/knowledge_base/build_fast_answers.py first")
+        return None
+    return FastAnswerStore(path, readonly=True)
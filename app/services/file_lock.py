@@ -0,0 +1,52 @@
+import os
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock; a single process is always the leader
+    fcntl = None
+
+class FileLock:
+    """Advisory ``flock`` on a lock file, shared by all processes on the host.
+
+    The kernel drops the lock when the holding process exits, so a crashed
+    holder never leaves a stale lock behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        logger.trace(f"Acquired lock {self.path} in process {os.getpid()}")
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
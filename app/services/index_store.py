@@ -0,0 +1,108 @@
+import os
+import json
+import shutil
+from typing import Optional
+from loguru import logger
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.json"
+METADATA_FILE = "metadata.json"
+INDEX_FORMAT = "faiss"
+
+def load_metadata(cache_dir: str) -> Optional[dict]:
+    metadata_file = os.path.join(cache_dir, METADATA_FILE)
+    if not os.path.exists(metadata_file):
+        return None
+    with open(metadata_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _generation_dir(cache_dir: str, generation: int) -> str:
+    return os.path.join(cache_dir, f"v{generation}")
+
+def save_vector_store(vector_store, cache_dir: str, metadata: dict) -> int:
+    """Persist a LangChain FAISS store without pickle.
+
+    The index goes into FAISS's native binary format and the docstore into a
+    compact JSON file, both inside a new generation directory. Replacing
+    ``metadata.json``, which names the current generation, is the atomic
+    commit: readers see either the old store or the new one, never a mix.
+    Returns the new generation number.
+    """
+    import faiss
+
+    os.makedirs(cache_dir, exist_ok=True)
+    previous = load_metadata(cache_dir) or {}
+    generation = previous.get("generation", 0) + 1
+    generation_dir = _generation_dir(cache_dir, generation)
+    if os.path.exists(generation_dir):
+        shutil.rmtree(generation_dir)
+    os.makedirs(generation_dir)
+
+    faiss.write_index(vector_store.index, os.path.join(generation_dir, INDEX_FILE))
+
+    ids = [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+    documents = {}
+    for doc_id in ids:
+        doc = vector_store.docstore.search(doc_id)
+        documents[doc_id] = {"page_content": doc.page_content, "metadata": doc.metadata}
+
+    with open(os.path.join(generation_dir, DOCSTORE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents}, f, ensure_ascii=False, separators=(",", ":"))
+
+    metadata_file = os.path.join(cache_dir, METADATA_FILE)
+    with open(f"{metadata_file}.tmp", "w", encoding="utf-8") as f:
+        json.dump({**metadata, "index_format": INDEX_FORMAT, "generation": generation}, f, ensure_ascii=False)
+    os.replace(f"{metadata_file}.tmp", metadata_file)
+    logger.debug(f"Saved vector store generation {generation} with {len(ids)} vectors to {cache_dir}")
+
+    _prune_generations(cache_dir, keep={generation, generation - 1})
+    return generation
+
+def _prune_generations(cache_dir: str, keep: set):
+    # The previous generation is kept for readers that loaded it just before the swap
+    for name in os.listdir(cache_dir):
+        if not name.startswith("v") or not name[1:].isdigit() or int(name[1:]) in keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+def load_vector_store(cache_dir: str, embeddings, mmap: bool = True, metadata: Optional[dict] = None):
+    """Load the current generation written by :func:`save_vector_store`.
+
+    With ``mmap`` the index vectors are memory-mapped read-only, so several
+    worker processes on one host share the same page cache instead of each
+    holding a private copy. A memory-mapped index must not be modified;
+    load with ``mmap=False`` to get a writable copy.
+    """
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    metadata = metadata or load_metadata(cache_dir)
+    if not metadata or "generation" not in metadata:
+        raise FileNotFoundError(f"No vector store found in {cache_dir}")
+    generation_dir = _generation_dir(cache_dir, metadata["generation"])
+
+    index_file = os.path.join(generation_dir, INDEX_FILE)
+    if mmap:
+        # Older FAISS releases can only map IVF lists; flat codes need IO_FLAG_MMAP_IFC
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(index_file, flags)
+    else:
+        index = faiss.read_index(index_file)
+
+    with open(os.path.join(generation_dir, DOCSTORE_FILE), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=doc["page_content"], metadata=doc["metadata"])
+        for doc_id, doc in data["documents"].items()
+    })
+    index_to_docstore_id = dict(enumerate(data["ids"]))
+
+    logger.debug(f"Loaded vector store generation {metadata['generation']} with {index.ntotal} vectors (mmap={mmap})")
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
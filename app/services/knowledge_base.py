@@ -0,0 +1,283 @@
+import os
+import time
+import uuid
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Optional
+from loguru import logger
+from . import index_store
+from .knowledge_points import parse_knowledge_points
+
+# 切分方式或向量归一化方式变化时递增，使旧索引整体重建
+INDEX_VERSION = "5.1"
+
+def create_embeddings(model_path: str, batch_size: int = 32):
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    # 初始化HuggingFaceEmbeddings，使用本地模型；向量归一化后L2距离与余弦相似度一一对应
+    return HuggingFaceEmbeddings(
+        model_name=model_path,
+        cache_folder="models",
+        encode_kwargs={"batch_size": batch_size, "normalize_embeddings": True}
+    )
+
+class KnowledgeBaseIndexer:
+    """Builds and incrementally updates the knowledge-base vector index.
+
+    Used by the Chatbot at start-up and by ``data/knowledge_base/build_index.py``
+    for offline builds, so both produce the same on-disk index.
+    """
+
+    def __init__(
+        self,
+        knowledge_base_path: str,
+        embeddings,
+        embedding_model: str,
+        batch_size: int = 32,
+        workers: int = 1
+    ):
+        self.knowledge_base_path = knowledge_base_path
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size
+        self.workers = workers
+        self.cache_dir = os.path.join(knowledge_base_path, ".cache")
+
+    def generation(self) -> Optional[int]:
+        metadata = index_store.load_metadata(self.cache_dir)
+        return metadata.get("generation") if metadata else None
+
+    def get_files(self) -> Dict[str, str]:
+        # 返回知识库中每个markdown文件的相对路径及其内容哈希
+        file_hashes = {}
+        for root, dirs, files in os.walk(self.knowledge_base_path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for f in files:
+                if f.startswith(".") or not f.endswith(".md"):
+                    continue
+                path = os.path.join(root, f)
+                with open(path, "rb") as fp:
+                    digest = hashlib.sha256(fp.read()).hexdigest()
+                file_hashes[os.path.relpath(path, self.knowledge_base_path)] = digest
+        return file_hashes
+
+    def _load_valid_metadata(self) -> Optional[dict]:
+        # 检查缓存是否可用：索引格式和嵌入模型必须一致
+        metadata = index_store.load_metadata(self.cache_dir)
+        if metadata is not None and (
+            metadata.get("index_format") != index_store.INDEX_FORMAT
+            or metadata.get("version") != INDEX_VERSION
+            or metadata.get("embedding_model") != self.embedding_model
+            or "files" not in metadata
+        ):
+            logger.info("Cached vector store is incompatible with the current configuration")
+            return None
+        return metadata
+
+    def load(self):
+        # 只加载预先构建好的索引，不做任何嵌入计算
+        metadata = self._load_valid_metadata()
+        if metadata is None:
+            raise FileNotFoundError(
+                f"No prebuilt index in {self.cache_dir}, run data/knowledge_base/build_index.py first"
+            )
+        if metadata["files"].keys() != self.get_files().keys():
+            logger.warning("Knowledge base files differ from the prebuilt index, consider rebuilding it")
+        logger.info("Loading vector store from cache")
+        return index_store.load_vector_store(self.cache_dir, self.embeddings, mmap=True, metadata=metadata)
+
+    def sync(self, rebuild: bool = False):
+        # 按文件内容哈希增量更新索引，只重新切分和嵌入新增、修改的文件，删除已移除文件的向量
+        current_files = self.get_files()
+        metadata = None if rebuild else self._load_valid_metadata()
+        indexed_files = metadata["files"] if metadata else {}
+
+        added = [f for f in current_files if f not in indexed_files]
+        changed = [f for f in current_files if f in indexed_files and indexed_files[f]["hash"] != current_files[f]]
+        removed = [f for f in indexed_files if f not in current_files]
+
+        if metadata is not None and not (added or changed or removed):
+            logger.info("Loading vector store from cache")
+            return index_store.load_vector_store(self.cache_dir, self.embeddings, mmap=True, metadata=metadata)
+
+        logger.info(
+            f"Updating knowledge base index: {len(added)} added, "
+            f"{len(changed)} changed, {len(removed)} removed"
+        )
+
+        # 在可写副本上更新，正在服务的内存映射索引保持不变
+        vector_store = None
+        if metadata is not None:
+            vector_store = index_store.load_vector_store(self.cache_dir, self.embeddings, mmap=False, metadata=metadata)
+            stale_ids = [doc_id for f in changed + removed for doc_id in indexed_files[f]["ids"]]
+            if stale_ids:
+                vector_store.delete(stale_ids)
+                logger.debug(f"Deleted {len(stale_ids)} stale chunks from index")
+
+        files = {f: indexed_files[f] for f in current_files if f not in added and f not in changed}
+        ids, chunks = [], []
+        for f in added + changed:
+            path = os.path.join(self.knowledge_base_path, f)
+            file_chunks = self.split_documents(self.load_documents(path))
+            file_ids = [str(uuid.uuid4()) for _ in file_chunks]
+            files[f] = {"hash": current_files[f], "ids": file_ids}
+            ids.extend(file_ids)
+            chunks.extend(file_chunks)
+        logger.debug(f"Split changed documents into {len(chunks)} chunks")
+
+        # 创建向量存储
+        if chunks:
+            from langchain_community.vectorstores import FAISS
+
+            texts = [chunk.page_content for chunk in chunks]
+            text_embeddings = list(zip(texts, self.embed_texts(texts)))
+            metadatas = [chunk.metadata for chunk in chunks]
+            if vector_store is None:
+                logger.debug("Creating vector store...")
+                vector_store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+            else:
+                vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            logger.debug("Vector store updated successfully")
+
+        if vector_store is None:
+            raise ValueError(f"No knowledge base documents found in {self.knowledge_base_path}")
+
+        # 以FAISS原生格式保存索引，文档单独保存
+        index_store.save_vector_store(vector_store, self.cache_dir, {
+            "last_modified": datetime.now().isoformat(),
+            "version": INDEX_VERSION,
+            "file_format": "md",
+            "embedding_model": self.embedding_model,
+            "files": files
+        })
+
+        logger.info("Knowledge base initialized and cached successfully")
+        # 重新以内存映射方式加载，与其他worker共享同一份索引页
+        return index_store.load_vector_store(self.cache_dir, self.embeddings, mmap=True)
+
+    def load_documents(self, path: str) -> list:
+        # 加载知识库文档
+        logger.debug(f"Loading documents from: {path}")
+        try:
+            from langchain_community.document_loaders import TextLoader
+            documents = TextLoader(path, encoding="utf-8").load()
+            for doc in documents:
+                logger.trace(f"Document metadata: {doc.metadata}")
+            return documents
+        except Exception as e:
+            logger.error(f"Failed to load documents: {str(e)}")
+            raise
+
+    def split_documents(self, documents: list) -> list:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        # 按知识点切分：每个知识点恰好一个块，不跨块也不重叠
+        chunks = []
+        unstructured = []
+        for doc in documents:
+            points = parse_knowledge_points(doc.page_content, doc.metadata.get("source", ""))
+            if points:
+                chunks.extend(point.to_document() for point in points)
+            else:
+                unstructured.append(doc)
+
+        # 没有知识点结构的文档仍按字符长度切分
+        if unstructured:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=500,
+                chunk_overlap=50
+            )
+            chunks.extend(text_splitter.split_documents(unstructured))
+        return chunks
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        import faiss
+        import numpy as np
+
+        # 分批嵌入并报告吞吐量；workers > 1 时在多个进程间并行编码
+        pool = None
+        if self.workers > 1:
+            logger.info(f"Starting {self.workers} embedding worker processes")
+            pool = self.embeddings.client.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+        # 每批进度覆盖所有进程，避免进程池空转
+        step = self.batch_size * max(self.workers, 1)
+
+        vectors = []
+        start = time.perf_counter()
+        try:
+            for i in range(0, len(texts), step):
+                batch = texts[i:i + step]
+                if pool is None:
+                    vectors.extend(self.embeddings.embed_documents(batch))
+                else:
+                    batch = [text.replace("\n", " ") for text in batch]
+                    encoded = self.embeddings.client.encode_multi_process(batch, pool, batch_size=self.batch_size)
+                    # 多进程编码不经过encode_kwargs，需与单进程和查询向量一样归一化
+                    encoded = np.ascontiguousarray(encoded, dtype=np.float32)
+                    faiss.normalize_L2(encoded)
+                    vectors.extend(encoded.tolist())
+                elapsed = time.perf_counter() - start
+                logger.info(
+                    f"Embedded {len(vectors)}/{len(texts)} chunks "
+                    f"({len(vectors) / elapsed if elapsed else 0:.1f} chunks/s)"
+                )
+        finally:
+            if pool is not None:
+                self.embeddings.client.stop_multi_process_pool(pool)
+        return vectors
+
+class MetadataPartitions:
+    """Grade/subject partitions over a loaded vector store.
+
+    Partitions are FAISS ID selectors over the shared (memory-mapped) index
+    rather than copies of it, so filtered searches only compute distances
+    for vectors in the requested partition and no per-worker memory is added.
+    """
+
+    def __init__(self, vector_store):
+        import numpy as np
+
+        self.vector_store = vector_store
+        groups: Dict[tuple, List[int]] = {}
+        for position, doc_id in vector_store.index_to_docstore_id.items():
+            metadata = vector_store.docstore.search(doc_id).metadata
+            groups.setdefault((metadata.get("年级"), metadata.get("类型")), []).append(position)
+        self._partitions = {key: np.array(positions, dtype=np.int64) for key, positions in groups.items()}
+        self._selectors = {}
+        logger.debug(f"Built {len(self._partitions)} knowledge base partitions")
+
+    def positions(self, grade: Optional[str] = None, subject: Optional[str] = None):
+        import numpy as np
+
+        selected = [
+            positions for (partition_grade, partition_subject), positions in self._partitions.items()
+            if (grade is None or partition_grade == grade) and (subject is None or partition_subject == subject)
+        ]
+        return np.concatenate(selected) if selected else np.array([], dtype=np.int64)
+
+    def search(self, embedding: List[float], k: int, grade: Optional[str] = None, subject: Optional[str] = None):
+        import faiss
+        import numpy as np
+
+        if grade is None and subject is None:
+            return self.vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+
+        key = (grade, subject)
+        if key not in self._selectors:
+            positions = self.positions(grade, subject)
+            self._selectors[key] = (faiss.IDSelectorBatch(positions), len(positions))
+        selector, size = self._selectors[key]
+        if size == 0:
+            return []
+
+        query = np.array([embedding], dtype=np.float32)
+        scores, indices = self.vector_store.index.search(
+            query, min(k, size), params=faiss.SearchParameters(sel=selector)
+        )
+        results = []
+        for score, position in zip(scores[0], indices[0]):
+            if position == -1:
+                continue
+            doc_id = self.vector_store.index_to_docstore_id[int(position)]
+            results.append((self.vector_store.docstore.search(doc_id), float(score)))
+        return results
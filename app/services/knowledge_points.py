@@ -0,0 +1,191 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+from loguru import logger
+from pydantic import BaseModel
+
+KNOWLEDGE_POINT_HEADING = re.compile(r"^##\s*知识点\s*(\d+)\s*$")
+SECTION_HEADING = re.compile(r"^###\s*(问题|答案|元数据)\s*$")
+METADATA_LINE = re.compile(r"^-\s*([^：:]+)[：:]\s*(.*)$")
+CONTENT_QUESTION = re.compile(r"^问题：(.*?)\n答案：", re.S)
+DOCUMENT_METADATA_FIELDS = ("类型", "年级", "难度")
+PLACEHOLDER_VALUE = "待补充"
+
+class KnowledgePoint(BaseModel):
+    source: str
+    number: int
+    question: str
+    answer: str
+    metadata: Dict[str, str] = {}
+
+    @property
+    def key(self) -> str:
+        return f"{self.source}#{self.number}"
+
+    @property
+    def content(self) -> str:
+        return f"问题：{self.question}\n答案：{self.answer}"
+
+    def to_document(self):
+        from langchain_core.documents import Document
+
+        # 分类信息放入元数据而不是正文，只嵌入题目和答案
+        metadata = {"source": self.source, "knowledge_point": self.number}
+        for name in DOCUMENT_METADATA_FIELDS:
+            value = self.metadata.get(name)
+            if value and value != PLACEHOLDER_VALUE:
+                metadata[name] = value
+        return Document(page_content=self.content, metadata=metadata)
+
+def question_from_content(content: str) -> Optional[str]:
+    # KnowledgePoint.content 的逆操作：从检索到的知识点正文中取出题目
+    match = CONTENT_QUESTION.match(content)
+    return match.group(1) if match else None
+
+def parse_knowledge_points(text: str, source: str) -> List[KnowledgePoint]:
+    """Parse the ``## 知识点 N / ### 问题 / ### 答案 / ### 元数据`` layout"""
+    points = []
+    current = None
+    section = None
+
+    def finish():
+        if current is None:
+            return
+        question = "\n".join(current["问题"]).strip()
+        answer = "\n".join(current["答案"]).strip()
+        if question:
+            points.append(KnowledgePoint(
+                source=source,
+                number=current["number"],
+                question=question,
+                answer=answer,
+                metadata=current["元数据"]
+            ))
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        heading = KNOWLEDGE_POINT_HEADING.match(stripped)
+        if heading:
+            finish()
+            current = {"number": int(heading.group(1)), "问题": [], "答案": [], "元数据": {}}
+            section = None
+            continue
+        if current is None:
+            continue
+        heading = SECTION_HEADING.match(stripped)
+        if heading:
+            section = heading.group(1)
+            continue
+        if section == "元数据":
+            item = METADATA_LINE.match(stripped)
+            if item:
+                current["元数据"][item.group(1).strip()] = item.group(2).strip()
+        elif section is not None:
+            current[section].append(line.rstrip())
+    finish()
+    return points
+
+def load_knowledge_points(knowledge_base_path: str) -> List[KnowledgePoint]:
+    points = []
+    for root, dirs, files in os.walk(knowledge_base_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for f in sorted(files):
+            if f.startswith(".") or not f.endswith(".md"):
+                continue
+            path = os.path.join(root, f)
+            with open(path, "r", encoding="utf-8") as fp:
+                points.extend(parse_knowledge_points(fp.read(), path))
+    return points
+
+def normalize_question(text: str) -> str:
+    # 统一全角/半角，去掉空白和标点，只保留题目的实际内容
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        char for char in text
+        if not char.isspace() and not unicodedata.category(char).startswith("P")
+    )
+
+def _ngrams(text: str, n: int) -> Set[str]:
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class QuestionIndex:
+    """Hash index over normalized questions with a character n-gram fallback.
+
+    Exact matches are a single dict lookup; near-exact matches (extra
+    punctuation, a dropped character) are found through an inverted n-gram
+    index scored with the Dice coefficient.
+    """
+
+    def __init__(self, points: List[KnowledgePoint], ngram: int = 2, min_similarity: float = 0.9):
+        self.points = points
+        self.ngram = ngram
+        self.min_similarity = min_similarity
+        self._exact: Dict[str, List[int]] = {}
+        self._grams: List[Set[str]] = []
+        self._inverted: Dict[str, List[int]] = {}
+        for i, point in enumerate(points):
+            normalized = normalize_question(point.question)
+            self._exact.setdefault(normalized, []).append(i)
+            grams = _ngrams(normalized, ngram)
+            self._grams.append(grams)
+            for gram in grams:
+                self._inverted.setdefault(gram, []).append(i)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        logger.debug(f"Built question index over {len(points)} knowledge points")
+
+    def lookup(
+        self,
+        message: str,
+        grade: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> Optional[Tuple[KnowledgePoint, float]]:
+        normalized = normalize_question(message)
+        if not normalized:
+            return None
+
+        def matches(i: int) -> bool:
+            metadata = self.points[i].metadata
+            return (grade is None or metadata.get("年级") == grade) \
+                and (subject is None or metadata.get("类型") == subject)
+
+        for i in self._exact.get(normalized, ()):
+            if matches(i):
+                self._count("exact_hits")
+                return self.points[i], 1.0
+
+        grams = _ngrams(normalized, self.ngram)
+        overlaps = Counter(i for gram in grams for i in self._inverted.get(gram, ()))
+        best, best_similarity = None, 0.0
+        for i, overlap in overlaps.items():
+            if not matches(i):
+                continue
+            similarity = 2 * overlap / (len(grams) + len(self._grams[i]))
+            if similarity > best_similarity:
+                best, best_similarity = i, similarity
+        if best is not None and best_similarity >= self.min_similarity:
+            self._count("near_hits")
+            return self.points[best], best_similarity
+
+        self._count("misses")
+        return None
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "knowledge_points": len(self.points),
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses
+            }
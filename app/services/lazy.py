@@ -0,0 +1,117 @@
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+class ServiceNotReady(RuntimeError):
+    """Raised when a lazily initialized service is not ready in time"""
+
+class LazyService:
+    """Proxy that builds a heavy service on first use or on a warm-up thread.
+
+    ``loader`` receives a ``progress(stage)`` callback and returns the
+    service; the time spent in each reported stage (e.g. ``import`` and
+    ``init``) is kept for the readiness endpoint. Attribute access is
+    forwarded to the service once it is ready, waiting up to
+    ``ready_timeout`` seconds for a load that is still in progress.
+    """
+
+    def __init__(self, name: str, loader: Callable[[Callable[[str], None]], Any], ready_timeout: float = 30.0):
+        self._name = name
+        self._loader = loader
+        self._ready_timeout = ready_timeout
+        self._service = None
+        self._error: Optional[BaseException] = None
+        self._state = "pending"
+        self._stage: Optional[str] = None
+        self._stage_started = 0.0
+        self._stages: Dict[str, float] = {}
+        self._started_at: Optional[float] = None
+        self._ready_at: Optional[float] = None
+        self._callbacks: List[Callable[[Any], None]] = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self, background: bool = True):
+        with self._lock:
+            if self._state != "pending":
+                return
+            self._state = "loading"
+            self._started_at = time.perf_counter()
+        if background:
+            threading.Thread(target=self._load, name=f"{self._name}-warmup", daemon=True).start()
+        else:
+            self._load()
+
+    def _progress(self, stage: Optional[str]):
+        now = time.perf_counter()
+        with self._lock:
+            if self._stage is not None:
+                self._stages[self._stage] = now - self._stage_started
+            self._stage = stage
+            self._stage_started = now
+        logger.debug(f"{self._name} initialization stage: {stage}")
+
+    def _load(self):
+        try:
+            service = self._loader(self._progress)
+            self._progress(None)
+            with self._lock:
+                self._service = service
+                self._state = "ready"
+                self._ready_at = time.perf_counter()
+                callbacks, self._callbacks = self._callbacks, []
+            logger.info(f"{self._name} ready in {self._ready_at - self._started_at:.1f}s")
+        except BaseException as e:
+            with self._lock:
+                self._error = e
+                self._state = "failed"
+            logger.error(f"{self._name} initialization failed: {str(e)}")
+            return
+        finally:
+            self._done.set()
+
+        for callback in callbacks:
+            try:
+                callback(service)
+            except Exception as e:
+                logger.error(f"{self._name} ready callback failed: {str(e)}")
+
+    def on_ready(self, callback: Callable[[Any], None]):
+        # Runs the callback with the service once loaded, immediately if it already is
+        with self._lock:
+            if self._state != "ready":
+                self._callbacks.append(callback)
+                return
+        callback(self._service)
+
+    @property
+    def ready(self) -> bool:
+        return self._state == "ready"
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        if self._state == "pending":
+            # Lazy mode: the first caller starts loading
+            self.start()
+        if not self._done.wait(self._ready_timeout if timeout is None else timeout):
+            raise ServiceNotReady(f"{self._name} is still initializing")
+        if self._error is not None:
+            raise ServiceNotReady(f"{self._name} failed to initialize: {self._error}")
+        return self._service
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def status(self) -> dict:
+        with self._lock:
+            now = time.perf_counter()
+            stages = dict(self._stages)
+            if self._state == "loading" and self._stage is not None:
+                stages[self._stage] = now - self._stage_started
+            return {
+                "state": self._state,
+                "stage": self._stage,
+                "stages": stages,
+                "elapsed": (self._ready_at or now) - self._started_at if self._started_at else 0.0,
+                "error": str(self._error) if self._error else None
+            }
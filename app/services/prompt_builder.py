@@ -0,0 +1,129 @@
+import math
+import threading
+import unicodedata
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from loguru import logger
+from .knowledge_points import normalize_question
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# 固定的人设提示词，作为第一条消息原样发送，便于服务端前缀缓存
+PERSONA_PROMPT = (
+    "# CONTEXT（上下文） #\n"
+    "你叫兜兜龙，是一个AI学习伙伴，专门为6-12岁儿童提供学习辅导和陪伴\n"
+    "# OBJECTIVE（目标） #\n"
+    "你的任务是辅助小朋友理解知识、培养学习兴趣，提供安全友好的互动体验。结合参考资料中最相关的一个题目，不要告诉小朋友答案，要一步步引导小朋友说出正确答案，并给予鼓励。\n"
+    "# STYLE（风格） #\n"
+    "用简单易懂的语言，不要使用表情符号。\n"
+    "# TONE（语调） #\n"
+    "充满活力，保持友好和鼓励。 \n"
+    "# AUDIENCE（受众） #\n"
+    "主要受众是6到12岁的小朋友。他们喜欢有趣的知识，能够激发他们学习的乐趣\n"
+    "# RESPONSE（响应） #\n"
+    "以MarkDown格式回答。\n"
+)
+
+CONTEXT_HEADER = "# 参考资料 #\n"
+
+def estimate_tokens(text: str) -> int:
+    # DeepSeek的经验值：一个汉字约0.6个token，一个英文字符约0.3个token
+    wide = sum(1 for char in text if unicodedata.east_asian_width(char) in ("W", "F"))
+    return math.ceil(wide * 0.6 + (len(text) - wide) * 0.3)
+
+def _truncate_to_budget(text: str, budget: int) -> str:
+    while text and estimate_tokens(text) > budget:
+        text = text[:min(len(text) * budget // max(estimate_tokens(text), 1), len(text) - 1)]
+    return text
+
+def build_context(
+    docs_and_scores: List[Tuple["Document", float]],
+    token_budget: int,
+    score_ratio: Optional[float] = 1.5
+) -> Tuple[str, int]:
+    """Render retrieved snippets into a compact context within ``token_budget``.
+
+    Scores are FAISS L2 distances (lower is better). Snippets farther than
+    ``score_ratio`` times the best distance and duplicates are dropped; only
+    the snippet text is kept, without scores or source paths. Returns the
+    context and the number of snippets used.
+    """
+    if not docs_and_scores:
+        return "", 0
+
+    best = min(score for _, score in docs_and_scores)
+    seen = set()
+    parts = []
+    used_tokens = estimate_tokens(CONTEXT_HEADER)
+    for doc, score in sorted(docs_and_scores, key=lambda item: item[1]):
+        if score_ratio is not None and parts and score > best * score_ratio:
+            logger.trace(f"Dropping low relevance snippet (distance {score:.2f}, best {best:.2f})")
+            continue
+        key = normalize_question(doc.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        part = f"【{len(parts) + 1}】{doc.page_content.strip()}\n"
+        remaining = token_budget - used_tokens
+        if estimate_tokens(part) > remaining:
+            if parts:
+                break
+            # 最相关的片段本身超出预算时截断，而不是完全不带上下文
+            part = _truncate_to_budget(part, remaining)
+            if not part:
+                break
+        parts.append(part)
+        used_tokens += estimate_tokens(part)
+
+    if not parts:
+        return "", 0
+    return CONTEXT_HEADER + "".join(parts), len(parts)
+
+def build_messages(message: str, context: str) -> List[dict]:
+    # 固定人设在前、每次请求变化的参考资料在后，人设部分可以命中服务端的前缀缓存
+    messages = [{"role": "system", "content": PERSONA_PROMPT}]
+    if context:
+        messages.append({"role": "system", "content": context})
+    messages.append({"role": "user", "content": message})
+    return messages
+
+class PromptUsage:
+    """Running totals of prompt size, estimated locally and reported upstream"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.estimated_prompt_tokens = 0
+        self.prompt_tokens = 0
+        self.prompt_cache_hit_tokens = 0
+        self.completion_tokens = 0
+
+    def record_estimate(self, tokens: int):
+        with self._lock:
+            self.requests += 1
+            self.estimated_prompt_tokens += tokens
+
+    def record_usage(self, usage: Optional[dict]):
+        if not usage:
+            return
+        with self._lock:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.prompt_cache_hit_tokens += usage.get("prompt_cache_hit_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+        logger.info(
+            f"LLM usage: prompt_tokens={usage.get('prompt_tokens')}, "
+            f"prompt_cache_hit_tokens={usage.get('prompt_cache_hit_tokens')}, "
+            f"completion_tokens={usage.get('completion_tokens')}"
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "estimated_prompt_tokens": self.estimated_prompt_tokens,
+                "avg_estimated_prompt_tokens": self.estimated_prompt_tokens / self.requests if self.requests else 0.0,
+                "prompt_tokens": self.prompt_tokens,
+                "prompt_cache_hit_tokens": self.prompt_cache_hit_tokens,
+                "completion_tokens": self.completion_tokens
+            }
@@ -0,0 +1,123 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Optional
+from loguru import logger
+from .cache import LRUCache
+from .sqlite_connection import ProcessLocalConnection
+
+def make_response_key(model: str, system_prompt: str, message: str) -> str:
+    # The rendered system prompt already contains the retrieved knowledge, so
+    # a changed knowledge base or prompt never serves a stale answer
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{prompt_hash}\0{message}".encode("utf-8")).hexdigest()
+
+class MemoryResponseCache:
+    """Per-process LRU cache of LLM responses with a TTL"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 24 * 3600):
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._cache.get(key, valid=lambda entry: now <= entry[0])
+        return entry[1] if entry is not None else None
+
+    def put(self, key: str, response: str):
+        self._cache.put(key, (time.time() + self.ttl, response))
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "ttl": self.ttl, **self._cache.stats()}
+
+class SQLiteResponseCache:
+    """LLM response cache in a SQLite file shared by several worker processes.
+
+    Entries expire ``ttl`` seconds after they were written; beyond ``maxsize``
+    entries the least recently read ones are evicted.
+    """
+
+    def __init__(self, path: str, maxsize: int = 10000, ttl: float = 24 * 3600):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Opened on first use in each worker, never in the pre-fork master
+        self._db = ProcessLocalConnection(path, setup=self._setup)
+        logger.debug(f"Using response cache at {path}")
+
+    @staticmethod
+    def _setup(conn):
+        # WAL lets readers in other workers proceed while one worker writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._db.get()
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        if self.maxsize <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._db.get()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.maxsize,)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._db.get().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": size,
+                "maxsize": self.maxsize
+            }
+
+def create_response_cache(backend: str, maxsize: int, ttl: float, path: Optional[str] = None):
+    if backend == "memory":
+        return MemoryResponseCache(maxsize=maxsize, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteResponseCache(path, maxsize=maxsize, ttl=ttl)
+    if backend == "none":
+        return None
+    raise ValueError(f"Unsupported response cache backend: {backend}")
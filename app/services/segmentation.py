@@ -0,0 +1,101 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+# 句末标点：遇到这些字符即认为一句话结束，可以送去合成
+SENTENCE_TERMINATORS = "。！？!?；;\n"
+# 句子超长时在分句标点处断开
+CLAUSE_TERMINATORS = "，,、：:"
+
+# 按顺序应用的Markdown清理规则，只保留要朗读的文字
+MARKDOWN_PATTERNS = [
+    (re.compile(r"^[ \t]*(```|~~~).*$", re.MULTILINE), ""),
+    (re.compile(r"^[ \t]*([-*_][ \t]*){3,}$", re.MULTILINE), ""),
+    (re.compile(r"^[ \t]*\|?([ \t]*:?-+:?[ \t]*\|)+[ \t]*:?-*:?[ \t]*$", re.MULTILINE), ""),
+    (re.compile(r"^[ \t]{0,3}#{1,6}[ \t]*", re.MULTILINE), ""),
+    (re.compile(r"^[ \t]*>+[ \t]?", re.MULTILINE), ""),
+    (re.compile(r"^[ \t]*([-*+]|\d+[.)])[ \t]+", re.MULTILINE), ""),
+    (re.compile(r"!?\[([^\]]*)\]\([^)]*\)"), r"\1"),
+    (re.compile(r"\*\*|__|\*|~~|`+"), ""),
+    (re.compile(r"[ \t]*\|[ \t]*"), " "),
+]
+
+def strip_markdown(text: str) -> str:
+    for pattern, replacement in MARKDOWN_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+def is_speakable(text: str) -> bool:
+    # 只有标点、符号或空白的片段合成出来没有声音，不值得一次接口调用
+    return any(unicodedata.category(char)[0] in "LN" for char in text)
+
+def _split_at(text: str, terminators: str) -> List[str]:
+    pieces = []
+    start = 0
+    for i, char in enumerate(text):
+        if char in terminators:
+            pieces.append(text[start:i + 1])
+            start = i + 1
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+def _sentences(text: str, max_length: int) -> List[str]:
+    sentences = []
+    for sentence in _split_at(text, SENTENCE_TERMINATORS):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_length:
+            sentences.append(sentence)
+            continue
+        # 超长句子先按分句标点切开，仍然超长的分句才按长度硬切
+        for clause in _split_at(sentence, CLAUSE_TERMINATORS):
+            clause = clause.strip()
+            sentences.extend(clause[i:i + max_length] for i in range(0, len(clause), max_length))
+    return sentences
+
+def segment_text(text: str, max_length: int) -> List[str]:
+    """Split a reply into as few TTS segments of at most ``max_length`` as possible.
+
+    Markdown is stripped, and whole sentences (or clauses of over-long
+    sentences) are packed greedily so pauses fall on natural boundaries.
+    Segments with nothing to pronounce are dropped.
+    """
+    segments = []
+    current = ""
+    for sentence in _sentences(strip_markdown(text), max_length):
+        if not is_speakable(sentence):
+            continue
+        # 标题、列表项等按行结束、没有标点的句子拼接时补上句号，保留停顿
+        joiner = "。" if current and not unicodedata.category(current[-1]).startswith("P") else ""
+        if current and len(current) + len(joiner) + len(sentence) > max_length:
+            segments.append(current)
+            current = joiner = ""
+        current += joiner + sentence
+    if current:
+        segments.append(current)
+    return segments
+
+class SentenceBuffer:
+    def __init__(self, terminators: str = SENTENCE_TERMINATORS):
+        self.terminators = terminators
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self._buffer += delta
+        sentences = []
+        start = 0
+        for i, char in enumerate(self._buffer):
+            if char in self.terminators:
+                sentence = self._buffer[start:i + 1].strip()
+                if sentence:
+                    sentences.append(sentence)
+                start = i + 1
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        sentence = self._buffer.strip()
+        self._buffer = ""
+        return sentence or None
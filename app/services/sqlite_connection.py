@@ -0,0 +1,32 @@
+import os
+import sqlite3
+from typing import Callable, Optional
+from loguru import logger
+
+class ProcessLocalConnection:
+    """SQLite connection opened lazily, once per process.
+
+    SQLite connections must not be carried across ``fork``. Services built in
+    the pre-fork master (``preload_app``) therefore never open the database
+    there; each worker opens its own connection on first use. The inherited
+    handle of a parent is left alone rather than closed, since closing it
+    would release the parent's POSIX locks.
+
+    Callers serialize access with their own lock.
+    """
+
+    def __init__(self, path: str, setup: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.path = path
+        self.setup = setup
+        self._pid: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def get(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        if self._pid != pid:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            if self.setup is not None:
+                self.setup(conn)
+            self._conn, self._pid = conn, pid
+            logger.debug(f"Opened {self.path} in process {pid}")
+        return self._conn
@@ -1,12 +1,23 @@
 import os
+import time
 import hashlib
 import requests
 import uuid
 import base64
-from typing import Optional
+import threading
+import contextlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 from config import config
 from loguru import logger
 from pydantic import BaseModel, HttpUrl
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .admission import Overloaded, UpstreamLimiter
+from .audio_cache import AudioCache, GrowingFile, PendingAudio
+from .metrics import UPSTREAM_BYTES, observe_stage, span
+from .segmentation import segment_text
+from .single_flight import SingleFlight
 
 class TTSConfig(BaseModel):
     appid: str
@@ -17,6 +28,17 @@ class TTSConfig(BaseModel):
     api_url: HttpUrl
     max_text_length: int
     audio_folder: str
+    speed_ratio: float = 1.0
+    volume_ratio: float = 1.0
+    pitch_ratio: float = 1.0
+    max_workers: int = 4
+    upstream_wait: float = 5.0
+    chunk_timeout: float = 10.0
+    connect_timeout: float = 3.0
+    max_retries: int = 3
+    retry_backoff: float = 0.5
+    cache_max_bytes: int = 512 * 1024 * 1024
+    cache_max_age: float = 7 * 24 * 3600
 
 class TTSService:
     def __init__(self, config: TTSConfig):
@@ -25,87 +47,384 @@ class TTSService:
         logger.debug(f"TTS config: {self.config}")
         logger.debug(f"Creating audio folder at: {self.config.audio_folder}")
         os.makedirs(self.config.audio_folder, exist_ok=True)
+        self.audio_cache = AudioCache(
+            folder=self.config.audio_folder,
+            max_bytes=self.config.cache_max_bytes,
+            max_age=self.config.cache_max_age
+        )
+        self._api_calls = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._stats_lock = threading.Lock()
+        self.session = self._create_session()
+        # Replies this worker is still writing, by filename, for progressive playback.
+        # Other workers sharing the folder follow the same file through its well-known part path.
+        self._pending: Dict[str, PendingAudio] = {}
+        self._pending_lock = threading.Lock()
+        # Longest a healthy writer goes without appending: one chunk with all its retries
+        self._stall_timeout = (self.config.chunk_timeout + self.config.connect_timeout) * (self.config.max_retries + 1) \
+            + self.config.retry_backoff * 2 ** self.config.max_retries
+        # Concurrent requests for the same chunk share one upstream synthesis
+        self._single_flight = SingleFlight()
+        # Caps upstream calls across the threaded and the asyncio paths together
+        self.upstream_limiter = UpstreamLimiter("tts", self.config.max_workers, self.config.upstream_wait)
+        logger.debug(f"Creating TTS worker pool with {self.config.max_workers} workers")
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers,
+            thread_name_prefix="tts"
+        )
+        # Segments are orchestrated on their own pool so that waiting on chunk
+        # futures never starves the chunk workers
+        self._segment_executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers,
+            thread_name_prefix="tts-segment"
+        )
         logger.info("TTS service initialized successfully")
         
     def speak(self, text: str) -> str:
         try:
-            # Create audio file in configured audio folder
-            audio_filename = f"{uuid.uuid4()}.mp3"
-            audio_path = os.path.abspath(os.path.join(self.config.audio_folder, audio_filename))
-    
-            # Split the text into chunks that are within the allowed length
-            text_chunks = [text[i:i + self.config.max_text_length] for i in range(0, len(text), self.config.max_text_length)]
+            # Identical replies map to the same content-addressed audio file
+            reply_key = self._cache_key("reply", text)
+            cached_path = self.audio_cache.get(reply_key)
+            if cached_path:
+                logger.debug(f"TTS cache hit for reply: {cached_path}")
+                return cached_path
             
-            # Create a single MP3 file for all audio data
-            with open(audio_path, "wb") as f:
-                for i, chunk in enumerate(text_chunks):
-                    headers = {"Authorization": f"Bearer;{self.config.access_token}"}
-
-                    request_json = {
-                        "app": {
-                            "appid": self.config.appid,
-                            "token": self.config.access_token,
-                            "cluster": self.config.cluster
-                        },
-                        "user": {
-                            "uid": "388808087185088"
-                        },
-                        "audio": {
-                            "voice_type": self.config.voice_type,
-                            "language": self.config.language,
-                            "encoding": "mp3",
-                            "speed_ratio": 1.0,
-                            "volume_ratio": 1.0,
-                            "pitch_ratio": 1.0,
-                        },
-                        "request": {
-                            "reqid": str(uuid.uuid4()),
-                            "text": chunk,
-                            "text_type": "plain",
-                            "operation": "query",
-                            "with_frontend": 1,
-                            "frontend_type": "unitTson"
-                        }
-                    }
-                    
-                    logger.debug(f"Sending TTS request for {chunk} {i+1}/{len(text_chunks)}")
-                    logger.trace(f"Request payload: {request_json}")
-                    
-                    response = requests.post(
-                        self.config.api_url,
-                        json=request_json,
-                        headers=headers
-                    )
-                    response_data = response.json()
-                    
-                    logger.debug(f"Received response with status: {response.status_code}")
-                    logger.trace(f"Response headers: {response.headers}")
-                    
-                    if response.status_code != 200:
-                        error_msg = f"TTS API Error: {response_data.get('message', 'Unknown error')}"
-                        logger.error(error_msg)
-                        continue
-                        
-                    if "data" not in response_data:
-                        error_msg = "No audio data in response"
-                        logger.error(error_msg)
-                        continue
-                        
-                    audio_data = base64.b64decode(response_data["data"])
-                    if not audio_data:
-                        error_msg = "Empty audio data received"
-                        logger.error(error_msg)
-                        continue
-                        
-                    bytes_written = f.write(audio_data)
-                    logger.debug(f"Wrote {bytes_written} bytes to {audio_path}")
-
-            return audio_path
+            return self._synthesize_reply(reply_key, text)
             
         except Exception as e:
             logger.error(f"TTS request failed: {str(e)}")
             raise
 
+    def _split_text(self, text: str) -> List[str]:
+        return segment_text(text, self.config.max_text_length)
+
+    def start_speak(self, text: str, on_done: Optional[Callable[[], None]] = None) -> str:
+        """Start synthesizing ``text`` and return its audio path immediately.
+
+        The file may still be being written when this returns; the ``/audio``
+        route streams it progressively via :meth:`pending_audio`, in whichever
+        worker sharing the audio folder it lands, so playback can start with
+        the first chunk. ``on_done`` is called exactly once, when the
+        synthesis started here has finished (right away if none was needed).
+        """
+        started = False
+        try:
+            path, started = self._start_speak(text, on_done)
+            return path
+        finally:
+            if not started and on_done is not None:
+                on_done()
+
+    def _start_speak(self, text: str, on_done: Optional[Callable[[], None]]) -> Tuple[str, bool]:
+        reply_key = self._cache_key("reply", text)
+        cached_path = self.audio_cache.get(reply_key)
+        if cached_path:
+            logger.debug(f"TTS cache hit for reply: {cached_path}")
+            return cached_path, False
+
+        path = self.audio_cache.path_for(reply_key)
+        filename = os.path.basename(path)
+        with self._pending_lock:
+            if filename in self._pending:
+                return path, False
+            # Created up front so readers can open it before the first chunk lands
+            temp_path = self.audio_cache.claim_part(reply_key, stale_after=self._stall_timeout)
+            if temp_path is None:
+                logger.debug(f"Reply {filename} is already being synthesized by another worker")
+                return path, False
+            if self.audio_cache.get(reply_key):
+                # Committed by another worker since the lookup above
+                os.remove(temp_path)
+                return path, False
+            pending = PendingAudio(temp_path)
+            self._pending[filename] = pending
+        try:
+            self._segment_executor.submit(self._speak_progressively, text, reply_key, filename, pending, on_done)
+        except BaseException:
+            with self._pending_lock:
+                self._pending.pop(filename, None)
+            pending.finish(None)
+            os.remove(temp_path)
+            raise
+        return path, True
+
+    def store_reply_audio(self, text: str, audio: bytes) -> str:
+        """Cache pre-rendered audio for ``text`` and return its path, as :meth:`speak` would"""
+        reply_key = self._cache_key("reply", text)
+        return self.audio_cache.get(reply_key) or self.audio_cache.put(reply_key, audio)
+
+    def pending_audio(self, filename: str) -> Optional[Union[PendingAudio, GrowingFile]]:
+        with self._pending_lock:
+            pending = self._pending.get(filename)
+        if pending is not None:
+            return pending
+        return self.audio_cache.open_part(filename, idle_timeout=self._stall_timeout)
+
+    def resolve_audio(self, filename: str) -> str:
+        return self.audio_cache.resolve(filename)
+
+    def audio_failed(self, filename: str) -> bool:
+        """Whether the reply behind ``filename`` could not be synthesized at all"""
+        return self.audio_cache.failed(filename)
+
+    def _speak_progressively(
+        self,
+        text: str,
+        reply_key: str,
+        filename: str,
+        pending: PendingAudio,
+        on_done: Optional[Callable[[], None]] = None
+    ):
+        path = None
+        try:
+            path = self._synthesize_reply(reply_key, text, pending)
+        except Exception as e:
+            logger.error(f"Progressive TTS request failed: {str(e)}")
+            # Marked before the part file goes, so the audio URL never looks merely unknown
+            self.audio_cache.mark_failed(reply_key)
+            # Readers in other workers stop following a part file once it is gone
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(pending.temp_path)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(filename, None)
+            pending.finish(path)
+            if on_done is not None:
+                on_done()
+
+    def _synthesize_reply(self, reply_key: str, text: str, pending: Optional[PendingAudio] = None) -> str:
+        # Split the text into as few sentence-aligned chunks within the allowed length as possible
+        text_chunks = self._split_text(text)
+        
+        # Synthesize all chunks concurrently, bounded by the worker pool
+        futures = [
+            self._executor.submit(self._synthesize_chunk, chunk, i, len(text_chunks))
+            for i, chunk in enumerate(text_chunks)
+        ]
+        
+        # Chunks are written as soon as they and all earlier chunks are done
+        return self._write_reply(reply_key, (future.result for future in futures), len(text_chunks), pending)
+
+    def _write_reply(
+        self,
+        reply_key: str,
+        results: Iterable[Callable[[], Optional[bytes]]],
+        total: int,
+        pending: Optional[PendingAudio] = None
+    ) -> str:
+        # Create a single MP3 file in the audio folder for all audio data, written in the original chunk order
+        temp_path = pending.temp_path if pending else self.audio_cache.temp_path_for(reply_key)
+        total_written = 0
+        complete = True
+        overloaded = None
+        # Only time spent writing counts, not waiting for chunks to be synthesized
+        write_seconds = 0.0
+        with open(temp_path, "wb") as f:
+            for i, result in enumerate(results):
+                try:
+                    audio_data = result()
+                except Exception as e:
+                    logger.error(f"TTS chunk {i+1}/{total} failed: {str(e)}")
+                    if isinstance(e, Overloaded):
+                        overloaded = e
+                    complete = False
+                    continue
+                
+                if not audio_data:
+                    complete = False
+                    continue
+                    
+                started = time.perf_counter()
+                bytes_written = f.write(audio_data)
+                total_written += bytes_written
+                logger.debug(f"Wrote {bytes_written} bytes to {temp_path}")
+                if pending:
+                    # Make the chunk visible to readers streaming the file
+                    f.flush()
+                    pending.advance(bytes_written)
+                write_seconds += time.perf_counter() - started
+
+        if total and total_written == 0:
+            os.remove(temp_path)
+            # Nothing synthesized because the upstream was saturated: let the client retry
+            if overloaded is not None:
+                raise overloaded
+            raise RuntimeError("No audio data synthesized for any chunk")
+
+        if not complete:
+            # Never cache partial audio under the reply's content key
+            requested = os.path.basename(self.audio_cache.path_for(reply_key))
+            reply_key = AudioCache.make_key(reply_key, uuid.uuid4())
+            if pending:
+                # Clients already hold the URL of the full reply; set before the commit
+                # so there is no moment where neither the part file nor the alias exists
+                self.audio_cache.set_alias(requested, os.path.basename(self.audio_cache.path_for(reply_key)))
+        started = time.perf_counter()
+        path = self.audio_cache.commit(reply_key, temp_path)
+        observe_stage("audio_write", write_seconds + time.perf_counter() - started)
+        return path
+
+    def submit_segment(self, text: str) -> "Future[str]":
+        logger.debug(f"Submitting TTS segment: {text[:50]}")
+        return self._segment_executor.submit(self.speak, text)
+
+    def _create_session(self) -> requests.Session:
+        # One keep-alive pool sized to the worker count, so chunks reuse connections
+        # instead of paying a new TCP+TLS handshake each
+        session = requests.Session()
+        retry_strategy = Retry(
+            total=self.config.max_retries,
+            backoff_factor=self.config.retry_backoff,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.config.max_workers,
+            pool_block=True,
+            max_retries=retry_strategy
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        logger.debug(f"TTS HTTP session configured with pool size {self.config.max_workers}")
+        return session
+
+    def pool_stats(self) -> dict:
+        # urllib3 counts connections opened and requests sent per host pool
+        connections = 0
+        requests_sent = 0
+        pools = self.session.get_adapter(str(self.config.api_url)).poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+        with self._stats_lock:
+            return {
+                "size": self.config.max_workers,
+                "connections_opened": connections,
+                "requests": requests_sent,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight
+            }
+
+    def stats(self) -> dict:
+        return {
+            "api_calls": self._api_calls,
+            "cache": self.audio_cache.stats(),
+            "pool": self.pool_stats(),
+            "upstream": self.upstream_limiter.stats(),
+            "single_flight": self._single_flight.stats()
+        }
+
+    def _cache_key(self, kind: str, text: str) -> str:
+        return AudioCache.make_key(
+            kind,
+            text,
+            self.config.cluster,
+            self.config.voice_type,
+            self.config.language,
+            self.config.speed_ratio,
+            self.config.volume_ratio,
+            self.config.pitch_ratio
+        )
+
+    def _synthesize_chunk(self, chunk: str, index: int, total: int) -> Optional[bytes]:
+        chunk_key = self._cache_key("chunk", chunk)
+        audio_data = self.audio_cache.read(chunk_key)
+        if audio_data:
+            logger.debug(f"TTS cache hit for chunk {index+1}/{total}")
+            return audio_data
+        
+        def fetch():
+            audio_data = self._fetch_chunk(chunk, index, total)
+            if audio_data:
+                self.audio_cache.put(chunk_key, audio_data)
+            return audio_data
+
+        return self._single_flight.do(chunk_key, fetch)
+
+    def _fetch_chunk(self, chunk: str, index: int, total: int) -> Optional[bytes]:
+        headers, request_json = self._build_chunk_request(chunk)
+        
+        logger.debug(f"Sending TTS request for {chunk} {index+1}/{total}")
+        logger.trace(f"Request payload: {request_json}")
+        
+        with self._stats_lock:
+            self._api_calls += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            with self.upstream_limiter.slot(), span("tts_chunk"):
+                response = self.session.post(
+                    self.config.api_url,
+                    json=request_json,
+                    headers=headers,
+                    timeout=(self.config.connect_timeout, self.config.chunk_timeout)
+                )
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+        UPSTREAM_BYTES.inc(len(response.content), upstream="tts")
+        
+        logger.debug(f"Received response with status: {response.status_code}")
+        logger.trace(f"Response headers: {response.headers}")
+        
+        return self._decode_chunk_response(response.status_code, response.json())
+
+    def _build_chunk_request(self, chunk: str) -> Tuple[dict, dict]:
+        headers = {"Authorization": f"Bearer;{self.config.access_token}"}
+
+        request_json = {
+            "app": {
+                "appid": self.config.appid,
+                "token": self.config.access_token,
+                "cluster": self.config.cluster
+            },
+            "user": {
+                "uid": "388808087185088"
+            },
+            "audio": {
+                "voice_type": self.config.voice_type,
+                "language": self.config.language,
+                "encoding": "mp3",
+                "speed_ratio": self.config.speed_ratio,
+                "volume_ratio": self.config.volume_ratio,
+                "pitch_ratio": self.config.pitch_ratio,
+            },
+            "request": {
+                "reqid": str(uuid.uuid4()),
+                "text": chunk,
+                "text_type": "plain",
+                "operation": "query",
+                "with_frontend": 1,
+                "frontend_type": "unitTson"
+            }
+        }
+        return headers, request_json
+
+    def _decode_chunk_response(self, status_code: int, response_data: dict) -> Optional[bytes]:
+        if status_code != 200:
+            error_msg = f"TTS API Error: {response_data.get('message', 'Unknown error')}"
+            logger.error(error_msg)
+            return None
+            
+        if "data" not in response_data:
+            error_msg = "No audio data in response"
+            logger.error(error_msg)
+            return None
+            
+        audio_data = base64.b64decode(response_data["data"])
+        if not audio_data:
+            error_msg = "Empty audio data received"
+            logger.error(error_msg)
+            return None
+            
+        return audio_data
+
 class TTSServiceFactory:
     @staticmethod
     def create_tts_service(tts_type: str = "bytedance") -> TTSService:
@@ -117,6 +436,13 @@ class TTSServiceFactory:
             language=config.tts_language,
             api_url=config.tts_api_url,
             max_text_length=config.tts_max_text_length,
-            audio_folder=config.audio_folder
+            audio_folder=config.audio_folder,
+            max_workers=config.tts_max_workers,
+            upstream_wait=config.admission_max_wait,
+            chunk_timeout=config.tts_chunk_timeout,
+            connect_timeout=config.tts_connect_timeout,
+            max_retries=config.tts_max_retries,
+            cache_max_bytes=config.audio_cache_max_bytes,
+            cache_max_age=config.audio_cache_max_age
         )
         return TTSService(tts_config)
@@ -46,7 +46,7 @@ document.addEventListener('DOMContentLoaded', function() {
             inputText.value = '';
             
             try {
-                const response = await fetch('/chat', {
+                const response = await fetch('/chat/stream', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -54,18 +54,68 @@ document.addEventListener('DOMContentLoaded', function() {
                     body: JSON.stringify({ message })
                 });
                 
-                const data = await response.json();
-                addMessage('bot', data.response);
-                
-                if (data.audio_url) {
-                    playAudio(data.audio_url);
+                if (!response.ok || !response.body) {
+                    const data = await response.json();
+                    console.error('Error:', data.error);
+                    return;
                 }
+                
+                resetAudioQueue();
+                const textDiv = addMessage('bot', '');
+                let botText = '';
+                
+                await readEventStream(response, (event, data) => {
+                    if (event === 'text') {
+                        botText += data.delta;
+                        textDiv.innerHTML = marked.parse(botText);
+                    } else if (event === 'audio') {
+                        enqueueAudio(data.audio_url);
+                    } else if (event === 'done') {
+                        textDiv.innerHTML = marked.parse(data.response);
+                    } else if (event === 'error') {
+                        console.error('Error:', data.error);
+                    }
+                });
             } catch (error) {
                 console.error('Error:', error);
             }
         }
     }
 
+    // 逐条解析服务端推送的 SSE 事件
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let event = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                if (data) {
+                    onEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    }
+
     // 绑定回车键发送
     inputText.addEventListener('keydown', function(e) {
         if (e.key === 'Enter' && !e.shiftKey) {
@@ -118,11 +168,33 @@ document.addEventListener('DOMContentLoaded', function() {
             const oldestMessage = messageQueue.shift();
             oldestMessage.remove();
         }
+        
+        return textDiv;
+    }
+
+    // 语音片段播放队列：按顺序播放同一条回复的各个片段
+    let audioSegments = [];
+    let segmentIndex = -1;
+    let playingSegments = false;
+
+    function resetAudioQueue() {
+        audioPlayer.pause();
+        audioSegments = [];
+        segmentIndex = -1;
+        playingSegments = false;
+    }
+
+    function enqueueAudio(url) {
+        audioSegments.push(url);
+        if (!playingSegments) {
+            playSegment(segmentIndex + 1);
+        }
     }
 
-    // 播放音频
-    function playAudio(url) {
-        audioPlayer.src = url;
+    function playSegment(index) {
+        segmentIndex = index;
+        playingSegments = true;
+        audioPlayer.src = audioSegments[index];
         audioPlayer.style.display = 'block';
         audioPlayer.play();
     }
@@ -137,7 +209,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 处理播放按钮点击
     function handlePlayBtnClick() {
-        if (audioPlayer.paused || audioPlayer.ended) {
+        if (audioPlayer.ended && audioSegments.length > 1) {
+            // 整条回复播放完毕后从第一个片段重新播放
+            playSegment(0);
+        } else if (audioPlayer.paused || audioPlayer.ended) {
             audioPlayer.currentTime = 0;
             audioPlayer.play();
         } else {
@@ -157,6 +232,15 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
 
+        // 当前片段播放结束后继续播放下一个片段
+        audioPlayer.addEventListener('ended', () => {
+            if (segmentIndex + 1 < audioSegments.length) {
+                playSegment(segmentIndex + 1);
+            } else {
+                playingSegments = false;
+            }
+        });
+
         // 点击事件委托
         document.addEventListener('click', function(e) {
             if (e.target.classList.contains('play-audio-btn')) {
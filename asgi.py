@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import functools
+import contextlib
+from a2wsgi import WSGIMiddleware
+from loguru import logger
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from app import create_app
+from app.routes import ChatRequest, SpeakRequest
+from app.services import metrics
+from app.services.admission import Overloaded, retry_after_header
+from app.services.async_services import AsyncChatbot, AsyncTTSService, create_http_client
+from app.services.lazy import ServiceNotReady
+from config import config
+
+# The Flask app owns service initialization; the ASGI app serves the
+# I/O-bound routes asynchronously and hands everything else to Flask.
+flask_app = create_app()
+
+async def _parse(request: Request, model, field: str):
+    if request.method == "POST":
+        return model(**await request.json())
+    value = request.query_params.get(field)
+    if not value:
+        return None
+    return model(**{
+        name: request.query_params.get(name) or None
+        for name in model.model_fields
+    })
+
+def instrumented(endpoint: str):
+    # Same request metrics and Server-Timing header as the Flask routes
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: Request):
+            started = time.perf_counter()
+            timings = metrics.begin_request()
+            response = await handler(request)
+            elapsed = time.perf_counter() - started
+            metrics.observe_request(endpoint, request.method, response.status_code, elapsed)
+            if config.server_timing:
+                response.headers["Server-Timing"] = metrics.server_timing(timings, total=elapsed)
+            return response
+        return wrapper
+    return decorator
+
+def _client_key(request: Request) -> str:
+    if flask_app.config.get("RATE_LIMIT_TRUST_PROXY"):
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _overloaded(e: Overloaded) -> JSONResponse:
+    logger.warning(f"Request rejected ({e.reason}): {str(e)}")
+    status = 429 if e.reason == "rate_limited" else 503
+    return JSONResponse({"error": str(e)}, status_code=status, headers={"Retry-After": retry_after_header(e.retry_after)})
+
+def admitted(handler):
+    # Same rate limiter and admission slots as the Flask routes, shared within the process
+    @functools.wraps(handler)
+    async def wrapper(request: Request):
+        rate_limiter = getattr(flask_app, "rate_limiter", None)
+        admission = getattr(flask_app, "admission", None)
+        try:
+            if rate_limiter is not None:
+                allowed, retry_after = rate_limiter.allow(_client_key(request))
+                if not allowed:
+                    raise Overloaded("Too many requests, please slow down", "rate_limited", retry_after)
+            if admission is not None:
+                await admission.acquire_async()
+        except Overloaded as e:
+            return _overloaded(e)
+        try:
+            # Handlers await their TTS synthesis, so the slot covers it too
+            return await handler(request)
+        finally:
+            if admission is not None:
+                admission.release()
+    return wrapper
+
+@instrumented("/chat")
+@admitted
+async def chat(request: Request):
+    try:
+        logger.info(f"Incoming async {request.method} request to /chat from {request.client.host if request.client else None}")
+        with metrics.span("parse"):
+            request_data = await _parse(request, ChatRequest, "message")
+        if request_data is None:
+            return JSONResponse({"error": "message parameter is required"}, status_code=400)
+
+        chatbot = request.app.state.chatbot
+        fast_answer = await chatbot.fast_answer(request_data.message, request_data.grade, request_data.subject)
+        if fast_answer is None:
+            response = await chatbot.chat(request_data.message, request_data.grade, request_data.subject)
+            audio_path = await request.app.state.tts.speak(response)
+        elif fast_answer.audio:
+            # Known question: pre-generated answer and audio, no LLM or TTS call
+            response = fast_answer.answer
+            audio_path = await asyncio.to_thread(flask_app.tts.store_reply_audio, response, fast_answer.audio)
+        else:
+            response = fast_answer.answer
+            audio_path = await request.app.state.tts.speak(response)
+        logger.info(f"Chatbot response: {response[:50]}...")
+
+        if not os.path.exists(audio_path):
+            logger.error(f"Audio file not found: {audio_path}")
+            return JSONResponse({"error": "Failed to generate audio"}, status_code=500)
+
+        return JSONResponse({
+            "response": response,
+            "audio_url": f"/audio/{os.path.basename(audio_path)}"
+        })
+
+    except ServiceNotReady as e:
+        logger.warning(str(e))
+        return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "5"})
+    except Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        logger.error(f"Chat error: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+@instrumented("/speak")
+@admitted
+async def speak(request: Request):
+    try:
+        logger.info(f"Incoming async {request.method} request to /speak from {request.client.host if request.client else None}")
+        request_data = await _parse(request, SpeakRequest, "text")
+        if request_data is None:
+            return JSONResponse({"error": "text parameter is required"}, status_code=400)
+
+        audio_path = await request.app.state.tts.speak(request_data.text)
+        logger.info(f"TTS request processed: {request_data.text[:50]}...")
+        return JSONResponse({
+            "status": "success",
+            "audio_url": f"/audio/{os.path.basename(audio_path)}"
+        })
+
+    except ServiceNotReady as e:
+        logger.warning(str(e))
+        return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "5"})
+    except Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        logger.error(f"TTS error: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    # One pooled client per process, shared by every in-flight conversation
+    client = create_http_client(
+        pool_size=config.http_pool_size,
+        keepalive_connections=config.http_keepalive_connections,
+        keepalive_expiry=config.http_keepalive_expiry,
+        connect_timeout=config.http_connect_timeout,
+        read_timeout=config.http_read_timeout
+    )
+    app.state.chatbot = AsyncChatbot(flask_app.chatbot, client)
+    app.state.tts = AsyncTTSService(flask_app.tts, client)
+    logger.info("Async services initialized")
+    try:
+        yield
+    finally:
+        await client.aclose()
+        logger.info("Async HTTP client closed")
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["GET", "POST"]),
+        Route("/speak", speak, methods=["GET", "POST"]),
+        Mount("/", WSGIMiddleware(flask_app))
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    logger.info("Starting ASGI application")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
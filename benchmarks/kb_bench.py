@@ -0,0 +1,147 @@
+"""Microbenchmarks for knowledge base index builds and retrieval.
+
+    python -m benchmarks.kb_bench --model models/text2vec-base-chinese
+    python -m benchmarks.kb_bench --fake-embeddings   # no model needed, measures FAISS and indexing overhead only
+
+The knowledge base is copied to a temporary directory, so the index in
+``data/knowledge_base/.cache`` is never touched.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.report import format_table, summarize
+from app.services.knowledge_base import KnowledgeBaseIndexer, MetadataPartitions, create_embeddings
+from app.services.knowledge_points import QuestionIndex, load_knowledge_points
+
+def _time(func: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def copy_knowledge_base(knowledge_base_path: str) -> str:
+    work_dir = tempfile.mkdtemp(prefix="kb_bench_")
+    for name in os.listdir(knowledge_base_path):
+        if name.endswith(".md"):
+            shutil.copy(os.path.join(knowledge_base_path, name), work_dir)
+    return work_dir
+
+def bench_build(indexer: KnowledgeBaseIndexer) -> Tuple[dict, object]:
+    started = time.perf_counter()
+    vector_store = indexer.sync(rebuild=True)
+    full = time.perf_counter() - started
+    chunks = vector_store.index.ntotal
+
+    # 没有文件变化时只比较哈希并加载索引
+    started = time.perf_counter()
+    indexer.sync()
+    unchanged = time.perf_counter() - started
+
+    # 修改一个文件，只重新嵌入该文件
+    work_dir = indexer.knowledge_base_path
+    first = sorted(f for f in os.listdir(work_dir) if f.endswith(".md"))[0]
+    with open(os.path.join(work_dir, first), "a", encoding="utf-8") as f:
+        f.write("\n")
+    started = time.perf_counter()
+    indexer.sync()
+    incremental = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vector_store = indexer.load()
+    load = time.perf_counter() - started
+
+    return {
+        "chunks": chunks,
+        "full_build": full,
+        "chunks_per_second": chunks / full if full else 0.0,
+        "unchanged_sync": unchanged,
+        "one_file_changed_sync": incremental,
+        "mmap_load": load
+    }, vector_store
+
+def bench_retrieval(knowledge_base_path: str, embeddings, vector_store, repeat: int, k: int = 3) -> Dict[str, dict]:
+    points = load_knowledge_points(knowledge_base_path)
+    questions = [point.question for point in points] or ["口的第二笔是什么？"]
+    random.seed(0)
+    sample = [random.choice(questions) for _ in range(repeat)]
+    # 改写过的问题走n-gram近似匹配或未命中分支
+    paraphrased = [f"请问{question}呀" for question in sample]
+
+    started = time.perf_counter()
+    question_index = QuestionIndex(points)
+    index_build = time.perf_counter() - started
+
+    queries = iter(sample)
+    exact = _time(lambda: question_index.lookup(next(queries)), repeat)
+    queries = iter(paraphrased)
+    fuzzy = _time(lambda: question_index.lookup(next(queries)), repeat)
+
+    queries = iter(paraphrased)
+    vectors = []
+    embed = _time(lambda: vectors.append(embeddings.embed_query(next(queries))), repeat)
+
+    partitions = MetadataPartitions(vector_store)
+    vectors_iter = iter(vectors)
+    search = _time(lambda: partitions.search(next(vectors_iter), k), repeat)
+    grade = next((point.metadata.get("年级") for point in points if point.metadata.get("年级")), None)
+    vectors_iter = iter(vectors)
+    filtered = _time(lambda: partitions.search(next(vectors_iter), k, grade=grade), repeat)
+
+    return {
+        "question_index build": summarize([index_build]),
+        "question_index exact": summarize(exact),
+        "question_index fuzzy/miss": summarize(fuzzy),
+        "embed_query": summarize(embed),
+        f"faiss search k={k}": summarize(search),
+        f"faiss search k={k} {grade}": summarize(filtered)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark knowledge base indexing and retrieval")
+    parser.add_argument("--knowledge-base", default="data/knowledge_base", help="Knowledge base directory")
+    parser.add_argument("--model", default="models/text2vec-base-chinese", help="Local embedding model path")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use deterministic fake embeddings instead of the model")
+    parser.add_argument("--dimensions", type=int, default=768, help="Vector size of the fake embeddings")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks encoded per embedding batch")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding worker processes")
+    parser.add_argument("--repeat", type=int, default=200, help="Queries per retrieval benchmark")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.fake_embeddings:
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        embeddings = DeterministicFakeEmbedding(size=args.dimensions)
+        embedding_model = f"fake-{args.dimensions}"
+        workers = 1
+    else:
+        started = time.perf_counter()
+        embeddings = create_embeddings(args.model, args.batch_size)
+        print(f"Loaded embedding model {args.model} in {time.perf_counter() - started:.1f}s")
+        embedding_model = args.model
+        workers = args.workers
+
+    work_dir = copy_knowledge_base(args.knowledge_base)
+    try:
+        indexer = KnowledgeBaseIndexer(work_dir, embeddings, embedding_model, batch_size=args.batch_size, workers=workers)
+        build, vector_store = bench_build(indexer)
+        print(
+            f"Index build: {build['chunks']} chunks in {build['full_build']:.2f}s "
+            f"({build['chunks_per_second']:.0f} chunks/s), unchanged sync {build['unchanged_sync'] * 1000:.1f}ms, "
+            f"one file changed {build['one_file_changed_sync']:.2f}s, mmap load {build['mmap_load'] * 1000:.1f}ms"
+        )
+        retrieval = bench_retrieval(work_dir, embeddings, vector_store, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(format_table(retrieval))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"build": build, "retrieval": retrieval}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,236 @@
+"""Drive ``/chat`` and ``/speak`` at a fixed concurrency and report latency percentiles.
+
+Against a running server::
+
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --endpoint chat --concurrency 16 --requests 500 --pid <server pid>
+
+Fully offline, starting the mock APIs and the server with its upstreams pointed at them::
+
+    python -m benchmarks.load_test --spawn "python run.py" --endpoint both --concurrency 16 --duration 60
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from benchmarks.mock_servers import DEFAULT_REPLY, start_mock_llm, start_mock_tts
+from benchmarks.report import format_table, process_tree_rss, summarize
+
+FALLBACK_QUESTIONS = ["口的第二笔是什么？", "1+1等于几？", "看书时，从哪个方向读文字？"]
+
+def load_questions(knowledge_base_path: str, limit: int = 500) -> List[str]:
+    # 用知识库中的真实题目作为请求内容，检索和提示词规模更接近线上
+    try:
+        from app.services.knowledge_points import load_knowledge_points
+        questions = [point.question for point in load_knowledge_points(knowledge_base_path)]
+    except Exception as e:
+        print(f"Could not load questions from {knowledge_base_path}: {e}")
+        questions = []
+    return questions[:limit] or FALLBACK_QUESTIONS
+
+class LoadTest:
+    def __init__(
+        self,
+        base_url: str,
+        endpoints: List[str],
+        concurrency: int,
+        questions: List[str],
+        total_requests: Optional[int] = None,
+        duration: Optional[float] = None,
+        fetch_audio: bool = False,
+        timeout: float = 120.0,
+        pid: Optional[int] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = endpoints
+        self.concurrency = concurrency
+        self.questions = questions
+        self.total_requests = total_requests
+        self.duration = duration
+        self.fetch_audio = fetch_audio
+        self.timeout = timeout
+        self.pid = pid
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.peak_rss = 0
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._local = threading.local()
+        self._stop = threading.Event()
+
+    def _session(self) -> requests.Session:
+        # 每个线程一个长连接，避免把握手时间算进服务端延迟
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _record(self, name: str, seconds: Optional[float]):
+        with self._lock:
+            if seconds is None:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            else:
+                self.latencies.setdefault(name, []).append(seconds)
+
+    def _next(self) -> Optional[int]:
+        if self._stop.is_set():
+            return None
+        index = next(self._counter)
+        if self.total_requests is not None and index >= self.total_requests:
+            return None
+        return index
+
+    def _request_once(self, index: int):
+        endpoint = self.endpoints[index % len(self.endpoints)]
+        session = self._session()
+        if endpoint == "chat":
+            payload = {"message": self.questions[index % len(self.questions)]}
+        else:
+            sentences = [s for s in DEFAULT_REPLY.split("。") if s]
+            payload = {"text": random.choice(sentences) + "。"}
+
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{self.base_url}/{endpoint}", json=payload, timeout=self.timeout)
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                self._record(f"{endpoint} [{response.status_code}]", None)
+                return
+            self._record(endpoint, elapsed)
+
+            if self.fetch_audio:
+                # 读完整个音频，衡量用户听到完整回答前的总耗时
+                audio = session.get(f"{self.base_url}{response.json()['audio_url']}", timeout=self.timeout)
+                audio.raise_for_status()
+                self._record(f"{endpoint}+audio", time.perf_counter() - started)
+        except (requests.RequestException, KeyError, ValueError) as e:
+            self._record(f"{endpoint} [{type(e).__name__}]", None)
+
+    def _worker(self):
+        while (index := self._next()) is not None:
+            self._request_once(index)
+
+    def _sample_rss(self):
+        while not self._stop.wait(0.5):
+            rss = process_tree_rss(self.pid)
+            if rss:
+                self.peak_rss = max(self.peak_rss, rss)
+
+    def run(self) -> dict:
+        if self.pid:
+            threading.Thread(target=self._sample_rss, daemon=True).start()
+        if self.duration:
+            threading.Timer(self.duration, self._stop.set).start()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for _ in range(self.concurrency):
+                executor.submit(self._worker)
+        elapsed = time.perf_counter() - started
+        self._stop.set()
+
+        completed = sum(len(samples) for name, samples in self.latencies.items() if "+" not in name)
+        result = {
+            "concurrency": self.concurrency,
+            "elapsed": elapsed,
+            "completed": completed,
+            "errors": dict(self.errors),
+            "throughput": completed / elapsed if elapsed else 0.0,
+            "latency": {name: summarize(samples) for name, samples in self.latencies.items()}
+        }
+        if self.pid:
+            result["rss"] = process_tree_rss(self.pid)
+            result["peak_rss"] = max(self.peak_rss, result["rss"] or 0)
+        return result
+
+def wait_until_ready(base_url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{base_url} not ready after {timeout}s")
+
+def print_report(result: dict):
+    print(format_table(result["latency"]))
+    print(f"\nconcurrency {result['concurrency']}, {result['completed']} requests in {result['elapsed']:.1f}s "
+          f"-> {result['throughput']:.1f} req/s")
+    if result["errors"]:
+        print(f"errors: {result['errors']}")
+    if result.get("rss") is not None:
+        print(f"server RSS {result['rss'] / 2**20:.0f} MiB (peak {result['peak_rss'] / 2**20:.0f} MiB)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the chatbot HTTP API")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Base URL of the server under test")
+    parser.add_argument("--endpoint", choices=["chat", "speak", "both"], default="chat", help="Endpoints to drive")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=None, help="Total requests (default 20 per client)")
+    parser.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead")
+    parser.add_argument("--fetch-audio", action="store_true", help="Also download the audio of every reply")
+    parser.add_argument("--knowledge-base", default="data/knowledge_base", help="Source of chat questions")
+    parser.add_argument("--pid", type=int, default=None, help="Server process to sample RSS from")
+    parser.add_argument("--spawn", default=None, help="Start this server command against local mock APIs")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Mock LLM seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Mock LLM seconds between tokens")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="Mock TTS base seconds per request")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="Seconds to wait for /ready when spawning")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    total = args.requests if args.requests is not None or args.duration else 20 * args.concurrency
+    endpoints = ["chat", "speak"] if args.endpoint == "both" else [args.endpoint]
+
+    process = None
+    mocks = []
+    pid = args.pid
+    try:
+        if args.spawn:
+            llm = start_mock_llm(latency=args.llm_latency, token_delay=args.token_delay)
+            tts = start_mock_tts(latency=args.tts_latency)
+            mocks = [llm, tts]
+            env = dict(os.environ, CHATBOT_BASE_URL=llm.url, TTS_API_URL=f"{tts.url}/api/v1/tts")
+            print(f"Starting {args.spawn!r} against mock LLM {llm.url} and mock TTS {tts.url}")
+            process = subprocess.Popen(shlex.split(args.spawn), env=env)
+            pid = process.pid
+            wait_until_ready(args.url, args.ready_timeout, process)
+
+        load_test = LoadTest(
+            args.url,
+            endpoints,
+            args.concurrency,
+            load_questions(args.knowledge_base),
+            total_requests=total,
+            duration=args.duration,
+            fetch_audio=args.fetch_audio,
+            pid=pid
+        )
+        result = load_test.run()
+        print_report(result)
+        if mocks:
+            result["upstream_requests"] = {"llm": mocks[0].requests, "tts": mocks[1].requests}
+            print(f"upstream requests: {result['upstream_requests']}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        for mock in mocks:
+            mock.stop()
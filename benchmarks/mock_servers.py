@@ -0,0 +1,197 @@
+"""Local stand-ins for the LLM and TTS APIs, so benchmarks never leave the box.
+
+Run both servers and point the app at them::
+
+    python -m benchmarks.mock_servers --llm-port 8001 --tts-port 8002
+    CHATBOT_BASE_URL=http://127.0.0.1:8001 TTS_API_URL=http://127.0.0.1:8002/api/v1/tts python run.py
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "小朋友，我们一起来想一想吧！这道题问的是笔画的顺序。"
+    "你先数一数这个字一共有几笔，再想一想第一笔写在哪里。"
+    "你已经很棒了，再试一次，说出你的答案吧！"
+)
+
+# 一个MPEG-1 Layer III帧头，后面用静音数据填充
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 服务器参数由 ThreadingHTTPServer 实例上的 options 提供
+    server: "MockServer"
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+class _LLMHandler(_Handler):
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        request = self._read_json()
+        options = self.server.options
+        self.server.count()
+
+        reply = options["reply"]
+        prompt_tokens = sum(len(item.get("content", "")) for item in request.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "prompt_cache_hit_tokens": 0,
+            "completion_tokens": len(reply)
+        }
+        # 首个token之前的延迟，模拟排队和prefill
+        time.sleep(options["latency"])
+
+        if not request.get("stream"):
+            time.sleep(options["token_delay"] * len(reply) / options["chars_per_token"])
+            self._send_json(200, {
+                "id": str(uuid.uuid4()),
+                "object": "chat.completion",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = options["chars_per_token"]
+        for start in range(0, len(reply), step):
+            self._write_event({"choices": [{"index": 0, "delta": {"content": reply[start:start + step]}}]})
+            time.sleep(options["token_delay"])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._write_event({"choices": [], "usage": usage})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, data: dict):
+        self._write_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+class _TTSHandler(_Handler):
+    def do_POST(self):
+        request = self._read_json()
+        options = self.server.options
+        self.server.count()
+
+        text = request.get("request", {}).get("text", "")
+        if not text:
+            self._send_json(400, {"code": 3001, "message": "empty text"})
+            return
+        time.sleep(options["latency"] + options["char_delay"] * len(text))
+        # 音频长度与文本长度成正比，内容由文本决定，便于校验拼接顺序
+        size = options["bytes_per_char"] * len(text)
+        audio = (MP3_FRAME_HEADER + text.encode("utf-8"))[:size].ljust(size, b"\x00")
+        self._send_json(200, {
+            "reqid": request.get("request", {}).get("reqid"),
+            "code": 3000,
+            "message": "Success",
+            "sequence": -1,
+            "data": base64.b64encode(audio).decode("ascii")
+        })
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, **options):
+        super().__init__(address, handler)
+        self.options = options
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        threading.Thread(target=self.serve_forever, name=f"mock-{self.server_address[1]}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def start_mock_llm(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.3,
+    token_delay: float = 0.02,
+    chars_per_token: int = 2,
+    reply: str = DEFAULT_REPLY
+) -> MockServer:
+    """OpenAI-compatible ``/v1/chat/completions`` with time-to-first-token and per-token delays"""
+    return MockServer(
+        (host, port),
+        _LLMHandler,
+        latency=latency,
+        token_delay=token_delay,
+        chars_per_token=chars_per_token,
+        reply=reply
+    ).start()
+
+def start_mock_tts(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.15,
+    char_delay: float = 0.005,
+    bytes_per_char: int = 600
+) -> MockServer:
+    """ByteDance TTS HTTP protocol: JSON request, base64 MP3 in ``data``"""
+    return MockServer(
+        (host, port),
+        _TTSHandler,
+        latency=latency,
+        char_delay=char_delay,
+        bytes_per_char=bytes_per_char
+    ).start()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve mock LLM and TTS APIs for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+    parser.add_argument("--llm-port", type=int, default=8001, help="Port of the mock chat completions API")
+    parser.add_argument("--tts-port", type=int, default=8002, help="Port of the mock TTS API")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="Base seconds per TTS request")
+    parser.add_argument("--tts-char-delay", type=float, default=0.005, help="Extra TTS seconds per character")
+    args = parser.parse_args()
+
+    llm = start_mock_llm(args.host, args.llm_port, latency=args.llm_latency, token_delay=args.token_delay)
+    tts = start_mock_tts(args.host, args.tts_port, latency=args.tts_latency, char_delay=args.tts_char_delay)
+    print(f"Mock LLM API at {llm.url}/v1/chat/completions")
+    print(f"Mock TTS API at {tts.url}/api/v1/tts")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        llm.stop()
+        tts.stop()
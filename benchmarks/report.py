@@ -0,0 +1,64 @@
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    # 最近秩法，样本较少时不做插值
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples) if samples else 0.0,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples) if samples else 0.0
+    }
+
+def format_table(rows: Dict[str, Dict[str, float]], unit: str = "ms", scale: float = 1000.0) -> str:
+    header = f"{'name':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  ({unit})"
+    lines = [header, "-" * len(header)]
+    for name, stats in rows.items():
+        lines.append(
+            f"{name:<28}{stats['count']:>8}"
+            + "".join(f"{stats[key] * scale:>10.2f}" for key in ("mean", "p50", "p95", "p99", "max"))
+        )
+    return "\n".join(lines)
+
+def _children(pid: int) -> List[int]:
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Resident set size in bytes of ``pid`` and all its descendants (Linux only).
+
+    Pages shared copy-on-write between pre-forked workers are counted once per
+    process, so the total overstates the real footprint of a gunicorn fleet.
+    """
+    total = 0
+    pending = [pid]
+    found = False
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        found = True
+                        break
+        except OSError:
+            continue
+        pending.extend(_children(current))
+    return total if found else None
@@ -26,6 +26,73 @@ class Settings(BaseSettings):
         description="Enable Flask debug mode"
     )
 
+    service_warmup: Literal["eager", "background", "lazy"] = Field(
+        default="background",
+        env="SERVICE_WARMUP",
+        description="When to load the chatbot: at startup, on a background thread, or on first use"
+    )
+
+    service_ready_timeout: float = Field(
+        default=30.0,
+        env="SERVICE_READY_TIMEOUT",
+        gt=0,
+        description="Seconds a request waits for a service that is still initializing"
+    )
+
+    prefork: bool = Field(
+        default=False,
+        env="PREFORK",
+        description="Load services in the master before forking workers (set by gunicorn.conf.py)"
+    )
+
+    server_timing: bool = Field(
+        default=False,
+        env="SERVER_TIMING",
+        description="Add a Server-Timing header with per-stage durations to responses"
+    )
+
+    # Admission Control
+    admission_max_active: int = Field(
+        default=32,
+        env="ADMISSION_MAX_ACTIVE",
+        gt=0,
+        description="Chat and speak requests processed at once per worker"
+    )
+
+    admission_max_queue: int = Field(
+        default=64,
+        env="ADMISSION_MAX_QUEUE",
+        ge=0,
+        description="Requests allowed to wait for a processing slot before new ones get 503"
+    )
+
+    admission_max_wait: float = Field(
+        default=5.0,
+        env="ADMISSION_MAX_WAIT",
+        ge=0,
+        description="Seconds a request waits for a processing or upstream slot before 503"
+    )
+
+    rate_limit_per_minute: float = Field(
+        default=60,
+        env="RATE_LIMIT_PER_MINUTE",
+        ge=0,
+        description="Sustained requests per minute per client IP (0 disables rate limiting)"
+    )
+
+    rate_limit_burst: int = Field(
+        default=20,
+        env="RATE_LIMIT_BURST",
+        gt=0,
+        description="Requests a client IP may send at once before being rate limited"
+    )
+
+    rate_limit_trust_proxy: bool = Field(
+        default=False,
+        env="RATE_LIMIT_TRUST_PROXY",
+        description="Identify clients by X-Forwarded-For (only behind a trusted reverse proxy)"
+    )
+
     # Chatbot Configuration
     chatbot_base_url: HttpUrl = Field(
         ...,
@@ -46,6 +113,87 @@ class Settings(BaseSettings):
         description="Model name for chatbot service"
     )
 
+    chatbot_query_cache_size: int = Field(
+        default=1024,
+        env="CHATBOT_QUERY_CACHE_SIZE",
+        ge=0,
+        description="Number of query embeddings and retrieval results kept in memory"
+    )
+
+    chatbot_response_cache: Literal["none", "memory", "sqlite"] = Field(
+        default="none",
+        env="CHATBOT_RESPONSE_CACHE",
+        description="Backend for caching LLM responses to repeated questions"
+    )
+
+    chatbot_response_cache_path: str = Field(
+        default="data/response_cache.sqlite3",
+        env="CHATBOT_RESPONSE_CACHE_PATH",
+        description="SQLite file shared by workers when the sqlite response cache is used"
+    )
+
+    chatbot_response_cache_size: int = Field(
+        default=1024,
+        env="CHATBOT_RESPONSE_CACHE_SIZE",
+        ge=0,
+        description="Maximum number of cached LLM responses"
+    )
+
+    chatbot_response_cache_ttl: int = Field(
+        default=24 * 3600,
+        env="CHATBOT_RESPONSE_CACHE_TTL",
+        gt=0,
+        description="Seconds a cached LLM response stays valid"
+    )
+
+    chatbot_max_concurrency: int = Field(
+        default=16,
+        env="CHATBOT_MAX_CONCURRENCY",
+        gt=0,
+        description="Concurrent LLM API calls per worker"
+    )
+
+    chatbot_fast_answers: bool = Field(
+        default=False,
+        env="CHATBOT_FAST_ANSWERS",
+        description="Answer questions matching a knowledge point from the pre-generated answer store"
+    )
+
+    chatbot_fast_answers_path: str = Field(
+        default="data/fast_answers.sqlite3",
+        env="CHATBOT_FAST_ANSWERS_PATH",
+        description="SQLite file written by data/knowledge_base/build_fast_answers.py"
+    )
+
+    chatbot_fast_answer_min_similarity: float = Field(
+        default=0.9,
+        env="CHATBOT_FAST_ANSWER_MIN_SIMILARITY",
+        ge=0,
+        le=1,
+        description="Smallest cosine similarity between the question and a knowledge point question for which the pre-generated answer is served"
+    )
+
+    chatbot_context_token_budget: int = Field(
+        default=600,
+        env="CHATBOT_CONTEXT_TOKEN_BUDGET",
+        gt=0,
+        description="Maximum estimated tokens of retrieved knowledge sent to the LLM"
+    )
+
+    # Knowledge Base Configuration
+    embedding_batch_size: int = Field(
+        default=32,
+        env="EMBEDDING_BATCH_SIZE",
+        gt=0,
+        description="Number of chunks encoded per embedding batch"
+    )
+
+    knowledge_base_auto_build: bool = Field(
+        default=True,
+        env="KNOWLEDGE_BASE_AUTO_BUILD",
+        description="Build or update the vector index at startup; disable to only load a prebuilt index"
+    )
+
     # TTS Configuration
     tts_appid: str = Field(
         ...,
@@ -93,6 +241,36 @@ class Settings(BaseSettings):
         description="Maximum text length for TTS input"
     )
 
+    tts_max_workers: int = Field(
+        default=4,
+        env="TTS_MAX_WORKERS",
+        gt=0,
+        le=32,
+        description="Maximum number of TTS chunks synthesized concurrently"
+    )
+
+    tts_chunk_timeout: float = Field(
+        default=10.0,
+        env="TTS_CHUNK_TIMEOUT",
+        gt=0,
+        description="Timeout in seconds for synthesizing a single TTS chunk"
+    )
+
+    tts_connect_timeout: float = Field(
+        default=3.0,
+        env="TTS_CONNECT_TIMEOUT",
+        gt=0,
+        description="Timeout in seconds for connecting to the TTS service"
+    )
+
+    tts_max_retries: int = Field(
+        default=3,
+        env="TTS_MAX_RETRIES",
+        ge=0,
+        le=10,
+        description="Retries for TTS chunk requests on 429 and 5xx responses"
+    )
+
     # Audio Configuration
     audio_folder: str = Field(
         default=os.path.join(BASE_DIR, "app", "static", "audio"),
@@ -100,6 +278,63 @@ class Settings(BaseSettings):
         description="Folder to store generated audio files"
     )
 
+    audio_cache_max_bytes: int = Field(
+        default=512 * 1024 * 1024,
+        env="AUDIO_CACHE_MAX_BYTES",
+        gt=0,
+        description="Maximum total size in bytes of cached audio files"
+    )
+
+    audio_cache_max_age: int = Field(
+        default=7 * 24 * 3600,
+        env="AUDIO_CACHE_MAX_AGE",
+        gt=0,
+        description="Seconds after the last access before cached audio is evicted"
+    )
+
+    audio_janitor_interval: float = Field(
+        default=300.0,
+        env="AUDIO_JANITOR_INTERVAL",
+        gt=0,
+        description="Seconds between background cleanups of the audio folder"
+    )
+
+    # HTTP Client Configuration (async services)
+    http_pool_size: int = Field(
+        default=100,
+        env="HTTP_POOL_SIZE",
+        gt=0,
+        description="Maximum number of concurrent connections in the shared async HTTP client"
+    )
+
+    http_keepalive_connections: int = Field(
+        default=20,
+        env="HTTP_KEEPALIVE_CONNECTIONS",
+        ge=0,
+        description="Maximum number of idle keep-alive connections kept in the pool"
+    )
+
+    http_keepalive_expiry: float = Field(
+        default=30.0,
+        env="HTTP_KEEPALIVE_EXPIRY",
+        gt=0,
+        description="Seconds an idle keep-alive connection is kept open"
+    )
+
+    http_connect_timeout: float = Field(
+        default=5.0,
+        env="HTTP_CONNECT_TIMEOUT",
+        gt=0,
+        description="Timeout in seconds for establishing an upstream connection"
+    )
+
+    http_read_timeout: float = Field(
+        default=60.0,
+        env="HTTP_READ_TIMEOUT",
+        gt=0,
+        description="Timeout in seconds for reading an upstream response"
+    )
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
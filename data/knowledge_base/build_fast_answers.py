@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from config import config
+from app.services.fast_answers import FastAnswerStore, content_key
+from app.services.knowledge_points import load_knowledge_points
+from app.services.prompt_builder import build_context, build_messages
+
+def generate_answer(session, point, model, token_budget, timeout=60):
+    # 与线上请求相同的提示词：人设 + 该知识点作为唯一参考资料
+    context, _ = build_context([(point.to_document(), 0.0)], token_budget)
+    response = session.post(
+        f"{config.chatbot_base_url.unicode_string().rstrip('/')}/v1/chat/completions",
+        headers={"Authorization": f"Bearer {config.chatbot_api_key}", "Content-Type": "application/json"},
+        json={"model": model, "messages": build_messages(point.question, context)},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+def synthesize_audio(tts, answer):
+    with open(tts.speak(answer), "rb") as f:
+        return f.read()
+
+def build_fast_answers(knowledge_base_path, output, workers=4, audio=True, rebuild=False, limit=None):
+    start = time.perf_counter()
+    points = load_knowledge_points(knowledge_base_path)
+    store = FastAnswerStore(output)
+    model = config.chatbot_model
+
+    # 已为同一模型生成过的知识点直接跳过，知识点内容变化后键也随之变化
+    done = set() if rebuild else store.keys(model)
+    pending = [point for point in points if content_key(point.content) not in done]
+    if limit is not None:
+        pending = pending[:limit]
+    print(f"{len(points)} knowledge points, {len(pending)} to generate with {model}")
+
+    tts = None
+    if audio:
+        from app.services.tts_service import TTSServiceFactory
+        tts = TTSServiceFactory.create_tts_service()
+
+    session = requests.Session()
+
+    def build(point):
+        answer = generate_answer(session, point, model, config.chatbot_context_token_budget)
+        store.put(point.content, point.question, answer, synthesize_audio(tts, answer) if tts else None, model)
+        return answer
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(build, point): point for point in pending}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            point = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Failed {point.key}: {e}")
+            if done_count % 50 == 0:
+                print(f"{done_count}/{len(pending)} done")
+
+    removed = store.prune(content_key(point.content) for point in points)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Fast answers ready in {elapsed:.1f}s: {store.stats()['answers']} stored, "
+        f"{len(pending) - failed} generated, {failed} failed, {removed} stale removed"
+    )
+    return store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate answers and audio for every knowledge point")
+    parser.add_argument("--knowledge-base", default="data/knowledge_base", help="Knowledge base directory")
+    parser.add_argument("--output", default=config.chatbot_fast_answers_path, help="SQLite file read by the chatbot")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent LLM and TTS requests")
+    parser.add_argument("--no-audio", action="store_true", help="Store text only; audio is synthesized at request time")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate answers that already exist")
+    parser.add_argument("--limit", type=int, default=None, help="Generate at most this many answers")
+    args = parser.parse_args()
+
+    build_fast_answers(args.knowledge_base, args.output, args.workers, not args.no_audio, args.rebuild, args.limit)
@@ -0,0 +1,37 @@
+import argparse
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from app.services.knowledge_base import KnowledgeBaseIndexer, create_embeddings
+
+def build_index(knowledge_base_path, model_path, batch_size=32, workers=1, rebuild=False):
+    start = time.perf_counter()
+    embeddings = create_embeddings(model_path, batch_size)
+    model_loaded = time.perf_counter()
+    print(f"Loaded embedding model {model_path} in {model_loaded - start:.1f}s")
+
+    indexer = KnowledgeBaseIndexer(
+        knowledge_base_path=knowledge_base_path,
+        embeddings=embeddings,
+        embedding_model=model_path,
+        batch_size=batch_size,
+        workers=workers
+    )
+    vector_store = indexer.sync(rebuild=rebuild)
+    elapsed = time.perf_counter() - model_loaded
+    print(f"Index generation {indexer.generation()} ready with {vector_store.index.ntotal} chunks in {elapsed:.1f}s")
+    return vector_store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the knowledge base vector index offline")
+    parser.add_argument("--knowledge-base", default="data/knowledge_base", help="Knowledge base directory")
+    parser.add_argument("--model", default="models/text2vec-base-chinese", help="Local embedding model path")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks encoded per embedding batch")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding worker processes")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the existing index and rebuild from scratch")
+    args = parser.parse_args()
+
+    build_index(args.knowledge_base, args.model, args.batch_size, args.workers, args.rebuild)
@@ -1,41 +1,169 @@
+import argparse
 import csv
+import hashlib
+import json
 import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+# 输出格式变化时递增，使所有CSV重新转换
+CONVERTER_VERSION = "2"
+MANIFEST_NAME = ".csv_manifest.json"
+PLACEHOLDER_VALUE = "待补充"
+FILENAME_PATTERN = re.compile(r"^(?P<grade>.+?年级)?_?(?P<date>\d{8})?$")
+
+# 英文列名对应的知识点字段
+COLUMN_ALIASES = {
+    "question": "问题",
+    "answer": "答案",
+    "type": "类型",
+    "subject": "类型",
+    "grade": "年级",
+    "difficulty": "难度",
+    "tags": "标签"
+}
+METADATA_FIELDS = ("类型", "年级", "难度", "标签")
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _defaults_from_filename(stem):
+    # 文件名形如"一年级_20200923"时，从中得到年级和日期
+    match = FILENAME_PATTERN.match(stem)
+    grade = match.group("grade") if match else None
+    date = match.group("date") if match else None
+    if date:
+        date = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+    return grade, date
+
+def _write_knowledge_points(reader, columns, md_file, stem):
+    grade, date = _defaults_from_filename(stem)
+    date = date or time.strftime("%Y-%m-%d")
+    count = 0
+    for row in reader:
+        values = {}
+        for name, value in zip(columns, row):
+            if name and value.strip():
+                values[name] = value.strip()
+        if not values.get("问题"):
+            continue
+        count += 1
+        values.setdefault("年级", grade or PLACEHOLDER_VALUE)
+        md_file.write(f"## 知识点 {count}\n### 问题\n{values['问题']}\n\n### 答案\n{values.get('答案', '')}\n\n### 元数据\n")
+        for name in METADATA_FIELDS:
+            md_file.write(f"- {name}：{values.get(name, PLACEHOLDER_VALUE)}\n")
+        md_file.write(f"- 来源：[{grade or stem}] 知识点 {count}\n- 创建日期：{date}\n- 最后修改：{date}\n\n\n")
+    return count
+
+def _write_table(reader, headers, md_file, stem):
+    # 没有问题/答案列的数据仍以表格输出，索引时按字符长度切分
+    md_file.write(f"# {stem}\n\n")
+    md_file.write("| " + " | ".join(headers) + " |\n")
+    md_file.write("| " + " | ".join(["---"] * len(headers)) + " |\n")
+    count = 0
+    for row in reader:
+        md_file.write("| " + " | ".join(cell.replace("\n", " ") for cell in row) + " |\n")
+        count += 1
+    return count
+
 def csv_to_md(csv_path, md_path):
-    with open(csv_path, 'r', encoding='utf-8') as csv_file:
+    """Stream ``csv_path`` into ``md_path`` row by row; returns the number of rows written"""
+    stem = Path(csv_path).stem
+    temp_path = f"{md_path}.tmp"
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as csv_file, \
+            open(temp_path, 'w', encoding='utf-8') as md_file:
         reader = csv.reader(csv_file)
-        headers = next(reader)
-        
-        # Create RAG-compatible markdown content
-        md_content = f"# {Path(csv_path).stem}\n\n"
-        
-        # Check if this is a Q&A format (question, answer columns)
-        if "question" in headers and "answer" in headers:
-            q_index = headers.index("question")
-            a_index = headers.index("answer")
-            
-            # Format as Q&A pairs
-            for row in reader:
-                md_content += f"## {row[q_index]}\n"
-                md_content += f"{row[a_index]}\n\n"
+        headers = [header.strip() for header in next(reader, [])]
+        columns = [COLUMN_ALIASES.get(header.lower(), header) for header in headers]
+        if "问题" in columns and "答案" in columns:
+            count = _write_knowledge_points(reader, columns, md_file, stem)
         else:
-            # Format as table for other data
-            md_content += "| " + " | ".join(headers) + " |\n"
-            md_content += "| " + " | ".join(["---"] * len(headers)) + " |\n"
-            for row in reader:
-                md_content += "| " + " | ".join(row) + " |\n"
-            
-    # Write to markdown file
-    with open(md_path, 'w', encoding='utf-8') as md_file:
-        md_file.write(md_content)
-
-def convert_all_csv_to_md(directory):
+            count = _write_table(reader, headers, md_file, stem)
+    # 写完再替换，索引构建不会读到写了一半的文件
+    os.replace(temp_path, md_path)
+    return count
+
+def _convert(csv_path):
+    md_path = str(Path(csv_path).with_suffix('.md'))
+    return csv_to_md(csv_path, md_path)
+
+def _load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != CONVERTER_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+def _save_manifest(path, files):
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({"version": CONVERTER_VERSION, "files": files}, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def convert_all_csv_to_md(directory, workers=None, force=False):
+    """Convert every changed ``*.csv`` in ``directory``; returns the names of the files converted"""
     knowledge_base = Path(directory)
-    for csv_file in knowledge_base.glob("*.csv"):
-        md_file = csv_file.with_suffix('.md')
-        csv_to_md(csv_file, md_file)
-        print(f"Converted {csv_file.name} to {md_file.name}")
+    manifest_path = knowledge_base / MANIFEST_NAME
+    manifest = {} if force else _load_manifest(manifest_path)
+
+    # 按内容哈希跳过自上次转换后没有变化、且输出文件仍在的CSV
+    hashes = {}
+    pending = []
+    for csv_file in sorted(knowledge_base.glob("*.csv")):
+        hashes[csv_file.name] = file_hash(csv_file)
+        if manifest.get(csv_file.name) != hashes[csv_file.name] or not csv_file.with_suffix('.md').exists():
+            pending.append(csv_file)
+    print(f"{len(hashes)} CSV files, {len(pending)} changed")
+
+    converted = []
+    if pending:
+        paths = [str(csv_file) for csv_file in pending]
+        if workers == 1 or len(paths) == 1:
+            results = map(_convert, paths)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_convert, paths)
+        try:
+            for csv_file, count in zip(pending, results):
+                manifest[csv_file.name] = hashes[csv_file.name]
+                converted.append(csv_file.name)
+                print(f"Converted {csv_file.name} to {csv_file.with_suffix('.md').name} ({count} rows)")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            # 已完成的文件即使中途出错也记录下来，下次不再重复转换
+            _save_manifest(manifest_path, {name: manifest[name] for name in hashes if name in manifest})
+    return converted
 
 if __name__ == "__main__":
-    convert_all_csv_to_md("data/knowledge_base")
+    parser = argparse.ArgumentParser(description="Convert knowledge base CSV files to 知识点 markdown")
+    parser.add_argument("--knowledge-base", default="data/knowledge_base", help="Knowledge base directory")
+    parser.add_argument("--workers", type=int, default=None, help="Conversion processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Convert every CSV even if it has not changed")
+    parser.add_argument("--no-index", action="store_true", help="Do not update the vector index afterwards")
+    parser.add_argument("--model", default="models/text2vec-base-chinese", help="Local embedding model path")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks encoded per embedding batch")
+    parser.add_argument("--embedding-workers", type=int, default=1, help="Embedding worker processes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    converted = convert_all_csv_to_md(args.knowledge_base, args.workers, args.force)
+    print(f"Converted {len(converted)} files in {time.perf_counter() - start:.1f}s")
+
+    if converted and not args.no_index:
+        # 索引按markdown文件哈希增量更新，只重新嵌入刚转换的文件
+        from build_index import build_index
+        build_index(args.knowledge_base, args.model, args.batch_size, args.embedding_workers)
@@ -0,0 +1,35 @@
+"""Pre-fork gunicorn configuration: ``gunicorn -c gunicorn.conf.py``
+
+The app is created once in the master (``preload_app``), so the embedding
+model and the memory-mapped FAISS index are loaded a single time and shared
+copy-on-write by every worker. Threads do not survive ``fork``, so the
+knowledge base watcher and the audio janitor are started in each worker
+after the fork. Only the worker holding the watcher lock rebuilds the
+index; the others just follow the index version.
+"""
+import gc
+import multiprocessing
+import os
+
+# Read by config.Settings: load everything eagerly and defer background threads
+os.environ["PREFORK"] = "true"
+
+wsgi_app = "run:app"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = True
+
+def when_ready(server):
+    # Move the preloaded objects out of the GC's generations so collections in
+    # the workers do not write to (and un-share) their pages
+    gc.freeze()
+    server.log.info("Application preloaded, forking workers")
+
+def post_fork(server, worker):
+    from app import start_background_tasks
+
+    start_background_tasks(server.app.wsgi())
+    server.log.info(f"Worker {worker.pid} started background tasks")
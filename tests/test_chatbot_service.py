@@ -3,9 +3,9 @@ import sys
 import os
 from loguru import logger
 
-# 添加services目录到Python路径
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app', 'services'))
-from chatbot_service import ChatbotFactory
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from app.services.chatbot_service import ChatbotFactory
 
 @pytest.fixture
 def chatbot():
@@ -64,6 +64,861 @@ def test_chatbot_response_contains_expected_keywords(chatbot, question, expected
         logger.error(f"测试失败: {str(e)}")
         pytest.fail(f"问答测试失败: {str(e)}")
 
+def test_vector_store_native_persistence(tmp_path):
+    """测试向量索引以FAISS原生格式保存并以内存映射方式加载"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from langchain_community.vectorstores import FAISS
+    from app.services import index_store
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    texts = ["二的第一笔是横", "口的第二笔是横折", "日共4笔"]
+    vector_store = FAISS.from_texts(texts, embeddings, metadatas=[{"source": f"{i}.md"} for i in range(3)])
+    index_store.save_vector_store(vector_store, str(tmp_path), {"version": "2.0"})
+
+    # 不应再生成pickle文件
+    assert not list(tmp_path.glob("*.pkl"))
+    assert index_store.load_metadata(str(tmp_path))["index_format"] == index_store.INDEX_FORMAT
+
+    loaded = index_store.load_vector_store(str(tmp_path), embeddings, mmap=True)
+    doc, _ = loaded.similarity_search_with_score("口的第二笔是横折", k=1)[0]
+    assert doc.page_content == "口的第二笔是横折"
+    assert doc.metadata["source"] == "1.md"
+
+def test_incremental_knowledge_base_update(tmp_path):
+    """测试知识库增量更新只重新嵌入变化的文件"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from app.services.knowledge_base import KnowledgeBaseIndexer
+
+    class CountingEmbedding(DeterministicFakeEmbedding):
+        embedded: list = []
+
+        def embed_documents(self, texts):
+            self.embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    (tmp_path / "a.md").write_text("甲的问题", encoding="utf-8")
+    (tmp_path / "b.md").write_text("乙的问题", encoding="utf-8")
+
+    embeddings = CountingEmbedding(size=16)
+    indexer = KnowledgeBaseIndexer(str(tmp_path), embeddings, embedding_model="fake", batch_size=1)
+    with pytest.raises(FileNotFoundError):
+        indexer.load()
+
+    vector_store = indexer.sync()
+    assert vector_store.index.ntotal == 2
+    assert sorted(embeddings.embedded) == ["乙的问题", "甲的问题"]
+
+    # 修改一个文件、删除一个文件、新增一个文件
+    embeddings.embedded.clear()
+    (tmp_path / "a.md").write_text("甲的新问题", encoding="utf-8")
+    (tmp_path / "b.md").unlink()
+    (tmp_path / "c.md").write_text("丙的问题", encoding="utf-8")
+    vector_store = indexer.sync()
+    assert sorted(embeddings.embedded) == ["丙的问题", "甲的新问题"]
+    contents = sorted(doc.page_content for doc in vector_store.docstore._dict.values())
+    assert contents == ["丙的问题", "甲的新问题"]
+    assert vector_store.index.ntotal == 2
+
+    # 未变化时直接加载缓存，不再嵌入
+    embeddings.embedded.clear()
+    indexer.sync()
+    assert embeddings.embedded == []
+    assert indexer.load().index.ntotal == 2
+
+def test_multi_process_embeddings_are_normalized(tmp_path):
+    """测试单进程和多进程嵌入得到的都是单位向量，与归一化的查询向量一致"""
+    import numpy as np
+    from app.services.knowledge_base import KnowledgeBaseIndexer
+
+    class FakeSentenceTransformer:
+        # 与sentence-transformers一致：只有encode按normalize_embeddings归一化
+        def encode(self, texts, normalize_embeddings=False, **kwargs):
+            vectors = np.array([[len(text), 1.0, 2.0] for text in texts], dtype=np.float64)
+            if normalize_embeddings:
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            return vectors
+
+        def start_multi_process_pool(self, target_devices):
+            return object()
+
+        def encode_multi_process(self, texts, pool, batch_size=32):
+            return self.encode(texts)
+
+        def stop_multi_process_pool(self, pool):
+            pass
+
+    class FakeEmbeddings:
+        client = FakeSentenceTransformer()
+        encode_kwargs = {"normalize_embeddings": True}
+
+        def embed_documents(self, texts):
+            return self.client.encode(texts, **self.encode_kwargs).tolist()
+
+    texts = ["甲", "乙的问题", "丙的问题和答案"]
+    for workers in (1, 2):
+        indexer = KnowledgeBaseIndexer(str(tmp_path), FakeEmbeddings(), embedding_model="fake", batch_size=2, workers=workers)
+        vectors = np.array(indexer.embed_texts(texts))
+        assert vectors.shape == (3, 3)
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-6)
+
+def _offline_chatbot(knowledge_base_path, embeddings, session=None, **config):
+    """通过构造函数创建Chatbot，注入假的嵌入模型，不依赖网络和本地模型"""
+    from app.services.chatbot_service import Chatbot, ChatbotConfig
+
+    settings = {
+        "base_url": "https://api.deepseek.com",
+        "api_key": "test",
+        "knowledge_base_path": str(knowledge_base_path),
+        "start_watcher": False,
+        "max_concurrency": 4,
+        "upstream_wait": 1.0
+    }
+    settings.update(config)
+    return Chatbot(ChatbotConfig(**settings), embeddings=embeddings, session=session)
+
+def test_repeated_query_skips_embedding(tmp_path):
+    """测试重复问题命中检索缓存，不再计算查询向量"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+
+    class CountingEmbedding(DeterministicFakeEmbedding):
+        queries: list = []
+
+        def embed_query(self, text):
+            self.queries.append(text)
+            return super().embed_query(text)
+
+    (tmp_path / "a.md").write_text("口的第二笔是横折", encoding="utf-8")
+    chatbot = _offline_chatbot(tmp_path, CountingEmbedding(size=16))
+
+    first = chatbot._retrieve("口的第二笔是 什么？", k=1)
+    second = chatbot._retrieve(" 口的第二笔是  什么? ", k=1)
+    assert first == second
+    assert chatbot.embeddings.queries == ["口的第二笔是 什么?"]
+    assert chatbot.stats()["retrieval_cache"]["hits"] == 1
+
+def test_exact_question_match_skips_vector_search(tmp_path):
+    """测试与知识库题目一致的问题直接命中题目索引"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+
+    class FailingEmbedding(DeterministicFakeEmbedding):
+        def embed_query(self, text):
+            raise AssertionError("不应计算查询向量")
+
+    source = "data/knowledge_base/一年级_20200923.md"
+    with open(source, "r", encoding="utf-8") as f:
+        (tmp_path / "一年级.md").write_text(f.read(), encoding="utf-8")
+    chatbot = _offline_chatbot(tmp_path, FailingEmbedding(size=16))
+
+    # 完全一致、仅标点或空白不同都应命中
+    for message in ['"口"的第二笔是', "“口”的第二笔是？", " 口 的第二笔是 "]:
+        (doc, score), = chatbot._retrieve(message, k=3)
+        assert "横折" in doc.page_content
+        assert doc.metadata["knowledge_point"] == 2
+    assert chatbot.stats()["question_index"]["exact_hits"] == 3
+
+def test_retrieval_filtered_by_grade_and_subject(tmp_path):
+    """测试按年级和学科过滤时只在对应分区内检索"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+
+    for name in ["一年级_20200923.md", "二年级_20200923.md"]:
+        with open(os.path.join("data/knowledge_base", name), "r", encoding="utf-8") as f:
+            (tmp_path / name).write_text(f.read(), encoding="utf-8")
+    chatbot = _offline_chatbot(tmp_path, DeterministicFakeEmbedding(size=16))
+
+    results = chatbot._retrieve("这道题怎么做", k=5, grade="二年级", subject="数学")
+    assert results
+    for doc, _ in results:
+        assert doc.metadata["年级"] == "二年级"
+        assert doc.metadata["类型"] == "数学"
+    assert chatbot._retrieve("这道题怎么做", k=5, grade="六年级") == []
+
+    # 精确匹配同样遵守过滤条件
+    (doc, _), = chatbot._retrieve('"口"的第二笔是', k=3, grade="一年级")
+    assert doc.metadata["knowledge_point"] == 2
+    assert all(d.metadata["年级"] == "二年级" for d, _ in chatbot._retrieve('"口"的第二笔是', k=3, grade="二年级"))
+
+def test_repeated_question_served_from_response_cache(tmp_path):
+    """测试相同问题和上下文的回答直接复用缓存，不再请求大模型"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from app.services.response_cache import MemoryResponseCache
+
+    class FakeResponse:
+        status_code = 200
+        content = b"{}"
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"choices": [{"message": {"content": "我们一起来数一数吧！"}}]}
+
+    class FakeSession:
+        calls = 0
+
+        def post(self, url, json, headers):
+            self.calls += 1
+            return FakeResponse()
+
+    source = "data/knowledge_base/一年级_20200923.md"
+    with open(source, "r", encoding="utf-8") as f:
+        (tmp_path / "一年级.md").write_text(f.read(), encoding="utf-8")
+    chatbot = _offline_chatbot(
+        tmp_path,
+        DeterministicFakeEmbedding(size=16),
+        session=FakeSession(),
+        response_cache_backend="memory",
+        response_cache_size=16,
+        response_cache_ttl=60
+    )
+    assert isinstance(chatbot.response_cache, MemoryResponseCache)
+
+    assert chatbot.chat("1+1等于几") == chatbot.chat("1+1等于几") == "我们一起来数一数吧！"
+    assert list(chatbot.chat_stream("1+1等于几")) == ["我们一起来数一数吧！"]
+    assert chatbot.session.calls == 1
+
+    # 不同的问题或不同的检索上下文不会命中
+    chatbot.chat("2+2等于几")
+    assert chatbot.session.calls == 2
+
+def test_expired_memory_response_is_counted_as_miss(monkeypatch):
+    """测试内存回答缓存中过期的条目按未命中统计并被删除"""
+    import time
+    from app.services import response_cache as response_cache_module
+    from app.services.response_cache import MemoryResponseCache
+
+    cache = MemoryResponseCache(maxsize=16, ttl=60)
+    cache.put("key", "回答")
+    assert cache.get("key") == "回答"
+
+    now = time.time()
+    monkeypatch.setattr(response_cache_module.time, "time", lambda: now + 120)
+    assert cache.get("key") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 0)
+
+def test_sqlite_response_cache_shared_with_ttl_and_eviction(tmp_path, monkeypatch):
+    """测试SQLite回答缓存可在多个worker间共享，并按过期时间和容量淘汰"""
+    import time
+    from app.services import response_cache as response_cache_module
+    from app.services.response_cache import SQLiteResponseCache, make_response_key
+
+    path = str(tmp_path / "responses.sqlite3")
+    writer = SQLiteResponseCache(path, maxsize=2, ttl=60)
+    reader = SQLiteResponseCache(path, maxsize=2, ttl=60)
+    keys = [make_response_key("deepseek-chat", "system", f"问题{i}") for i in range(3)]
+
+    writer.put(keys[0], "回答0")
+    assert reader.get(keys[0]) == "回答0"
+
+    writer.put(keys[1], "回答1")
+    reader.get(keys[0])
+    writer.put(keys[2], "回答2")
+    # 容量为2时淘汰最久未读取的条目
+    assert reader.get(keys[1]) is None
+    assert reader.get(keys[2]) == "回答2"
+
+    now = time.time()
+    monkeypatch.setattr(response_cache_module.time, "time", lambda: now + 120)
+    assert reader.get(keys[2]) is None
+    assert reader.stats()["hits"] == 3
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要fork")
+def test_sqlite_response_cache_reopens_after_fork(tmp_path):
+    """测试预fork模式下worker不复用master的SQLite连接，而是各自重新打开"""
+    from app.services.response_cache import SQLiteResponseCache, make_response_key
+
+    cache = SQLiteResponseCache(str(tmp_path / "responses.sqlite3"), maxsize=16, ttl=60)
+    key = make_response_key("deepseek-chat", "system", "问题")
+    cache.put(key, "回答")
+    parent_conn = cache._db.get()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = cache._db.get() is not parent_conn and cache.get(key) == "回答"
+            cache.put(make_response_key("deepseek-chat", "system", "子进程"), "子进程回答")
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert cache._db.get() is parent_conn
+    assert cache.get(make_response_key("deepseek-chat", "system", "子进程")) == "子进程回答"
+
+def test_lazy_chatbot_reports_readiness_while_warming_up():
+    """测试后台预热期间健康检查立即可用，就绪检查报告初始化进度"""
+    import threading
+    import time
+    from flask import Flask
+    from app.routes import bp
+    from app.services.lazy import LazyService
+
+    release = threading.Event()
+    initializing = threading.Event()
+
+    class FakeChatbot:
+        def stats(self):
+            return {"question_index": {}}
+
+        def fast_answer(self, message, grade=None, subject=None):
+            return None
+
+        def chat(self, message, grade=None, subject=None):
+            return "你好"
+
+    def load(progress):
+        progress("import")
+        progress("init")
+        initializing.set()
+        assert release.wait(timeout=5)
+        return FakeChatbot()
+
+    app = Flask(__name__)
+    app.config["STARTED_AT"] = time.perf_counter()
+    app.chatbot = LazyService("chatbot", load, ready_timeout=0.05)
+    app.register_blueprint(bp)
+    client = app.test_client()
+    app.chatbot.start(background=True)
+    assert initializing.wait(timeout=5)
+
+    assert client.get("/health").status_code == 200
+    response = client.get("/ready")
+    assert response.status_code == 503
+    status = response.get_json()["services"]["chatbot"]
+    assert status["state"] == "loading"
+    assert status["stage"] == "init"
+    assert "import" in status["stages"]
+    assert client.post("/chat", json={"message": "你好"}).status_code == 503
+
+    release.set()
+    app.chatbot.get(timeout=5)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.get_json()["services"]["chatbot"]["state"] == "ready"
+    assert app.chatbot.chat("你好") == "你好"
+
+def test_single_leader_rebuilds_and_followers_follow_index_version(tmp_path):
+    """测试多个worker中只有leader重建索引，其他worker通过版本号加载新索引"""
+    import time
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from app.services.file_lock import FileLock
+
+    class FollowerEmbedding(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            raise AssertionError("follower不应重建索引")
+
+    (tmp_path / "a.md").write_text("甲的问题", encoding="utf-8")
+    leader = _offline_chatbot(tmp_path, DeterministicFakeEmbedding(size=16), watch_interval=0.05)
+    follower = _offline_chatbot(tmp_path, FollowerEmbedding(size=16), watch_interval=0.05)
+    assert leader._leader_lock.acquire(blocking=False)
+    leader.start_watcher()
+    follower.start_watcher()
+    assert not follower._leader_lock.held
+
+    (tmp_path / "b.md").write_text("乙的问题", encoding="utf-8")
+    deadline = time.time() + 5
+    while min(leader.vector_store.index.ntotal, follower.vector_store.index.ntotal) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    assert leader.vector_store.index.ntotal == 2
+    assert follower.vector_store.index.ntotal == 2
+
+    # leader退出后锁由内核释放，其他worker可以接管
+    leader._leader_lock.release()
+    assert FileLock(os.path.join(tmp_path, ".cache", "watcher.lock")).acquire(blocking=False)
+
+def test_prompt_context_is_compacted_within_budget(tmp_path):
+    """测试参考资料去重、丢弃低相关片段并控制在token预算内，人设提示词保持不变"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from langchain_core.documents import Document
+    from app.services.prompt_builder import PERSONA_PROMPT, build_context, estimate_tokens
+
+    docs_and_scores = [
+        (Document(page_content="口的第二笔是横折", metadata={"source": "a.md"}), 0.2),
+        (Document(page_content=" 口的第二笔是横折 ", metadata={"source": "b.md"}), 0.25),
+        (Document(page_content="日的第一笔是竖", metadata={"source": "c.md"}), 0.28),
+        (Document(page_content="无关的内容", metadata={"source": "d.md"}), 0.9)
+    ]
+    context, snippets = build_context(docs_and_scores, token_budget=600)
+    assert snippets == 2
+    assert context.count("口的第二笔是横折") == 1
+    assert "无关的内容" not in context
+    assert "a.md" not in context and "0.2" not in context
+
+    # 最相关的片段超出预算时被截断
+    long_doc = Document(page_content="很长的题目" * 200)
+    context, snippets = build_context([(long_doc, 0.1)], token_budget=50)
+    assert snippets == 1
+    assert estimate_tokens(context) <= 50
+
+    (tmp_path / "a.md").write_text("口的第二笔是横折", encoding="utf-8")
+    chatbot = _offline_chatbot(tmp_path, DeterministicFakeEmbedding(size=16))
+    _, _, payload = chatbot._build_request("口的第二笔是什么")
+    messages = payload["messages"]
+    assert messages[0] == {"role": "system", "content": PERSONA_PROMPT}
+    assert "口的第二笔是横折" in messages[1]["content"]
+    assert messages[-1] == {"role": "user", "content": "口的第二笔是什么"}
+    assert chatbot.stats()["prompt"]["requests"] == 1
+
+def test_metrics_endpoint_and_server_timing(tmp_path):
+    """测试各阶段耗时计入直方图，/metrics输出Prometheus格式，并可返回Server-Timing头"""
+    import time
+    from flask import Flask
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from app.routes import bp
+    from app.services import metrics
+    from app.services.lazy import LazyService
+
+    (tmp_path / "a.md").write_text("口的第二笔是横折", encoding="utf-8")
+    chatbot = _offline_chatbot(tmp_path, DeterministicFakeEmbedding(size=16))
+    searches = metrics.STAGE_SECONDS.count(stage="search")
+
+    def chat(message, grade=None, subject=None):
+        chatbot._build_request(message, grade, subject)
+        return "我们一起想一想"
+    chatbot.chat = chat
+
+    class FakeTTS:
+        class audio_cache:
+            @staticmethod
+            def stats():
+                return {"hits": 2, "misses": 1}
+
+        def start_speak(self, text, on_done=None):
+            if on_done is not None:
+                on_done()
+            return "/tmp/reply.mp3"
+
+    app = Flask(__name__)
+    app.config["STARTED_AT"] = time.perf_counter()
+    app.config["SERVER_TIMING"] = True
+    app.chatbot = LazyService("chatbot", lambda progress: chatbot)
+    app.chatbot.start(background=False)
+    app.tts = FakeTTS()
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    response = client.post("/chat", json={"message": "日的第一笔是什么"})
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    for stage in ("parse", "embed", "search", "prompt", "total"):
+        assert f"{stage};dur=" in timing
+    assert metrics.STAGE_SECONDS.count(stage="search") == searches + 1
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'chatbot_requests_total{endpoint="/chat",method="POST",status="200"}' in body
+    assert 'chatbot_stage_seconds_bucket{stage="embed",le="+Inf"}' in body
+    assert 'chatbot_cache_lookups_total{cache="audio",result="hit"} 2' in body
+    assert 'chatbot_cache_lookups_total{cache="retrieval",result="miss"} 1' in body
+
+def test_chat_against_mock_llm_server(tmp_path):
+    """测试基准测试用的本地大模型模拟服务支持普通和流式响应，并返回token用量"""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from benchmarks.mock_servers import start_mock_llm
+
+    server = start_mock_llm(latency=0.0, token_delay=0.0, reply="你好，小朋友！")
+    try:
+        (tmp_path / "a.md").write_text("口的第二笔是横折", encoding="utf-8")
+        chatbot = _offline_chatbot(tmp_path, DeterministicFakeEmbedding(size=16), base_url=server.url)
+
+        assert chatbot.chat("口的第二笔是什么") == "你好，小朋友！"
+        assert "".join(chatbot.chat_stream("口的第二笔是什么")) == "你好，小朋友！"
+        usage = chatbot.stats()["prompt"]
+        assert usage["completion_tokens"] == 2 * len("你好，小朋友！")
+        assert usage["prompt_tokens"] > 0
+        assert server.requests == 2
+    finally:
+        server.stop()
+
+def test_admission_rejects_bursts_fast_with_429_and_503():
+    """测试按客户端限流返回429，排队已满或等待超时返回503，并统计队列深度和拒绝次数"""
+    import threading
+    import time
+    from flask import Flask
+    from app.routes import bp
+    from app.services.admission import AdmissionController, Overloaded, RateLimiter, UpstreamLimiter
+    from app.services.lazy import LazyService
+
+    limiter = RateLimiter(rate=1.0, burst=2)
+    assert limiter.allow("a")[0] and limiter.allow("a")[0]
+    allowed, retry_after = limiter.allow("a")
+    assert not allowed and 0 < retry_after <= 1.0
+    assert limiter.allow("b")[0]
+
+    release = threading.Event()
+    entered = threading.Semaphore(0)
+
+    class SlowChatbot:
+        def fast_answer(self, message, grade=None, subject=None):
+            return None
+
+        def chat(self, message, grade=None, subject=None):
+            entered.release()
+            assert release.wait(timeout=5)
+            return "好的"
+
+    class FakeTTS:
+        def start_speak(self, text, on_done=None):
+            if on_done is not None:
+                on_done()
+            return "/tmp/reply.mp3"
+
+    app = Flask(__name__)
+    app.config["STARTED_AT"] = time.perf_counter()
+    app.chatbot = LazyService("chatbot", lambda progress: SlowChatbot())
+    app.chatbot.start(background=False)
+    app.tts = FakeTTS()
+    app.admission = AdmissionController(max_active=1, max_queue=1, max_wait=5.0)
+    app.rate_limiter = RateLimiter(rate=0.01, burst=3)
+    app.register_blueprint(bp)
+
+    statuses = []
+    def post():
+        statuses.append(app.test_client().post("/chat", json={"message": "你好"}).status_code)
+
+    first = threading.Thread(target=post)
+    first.start()
+    assert entered.acquire(timeout=5)
+    queued = threading.Thread(target=post)
+    queued.start()
+    deadline = time.time() + 5
+    while app.admission.stats()["queued"] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+
+    # 处理槽和等待队列都已占满，新请求立即得到503
+    started = time.perf_counter()
+    response = app.test_client().post("/chat", json={"message": "你好"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert time.perf_counter() - started < 1.0
+
+    # 同一客户端超过突发上限后得到429
+    response = app.test_client().post("/chat", json={"message": "你好"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 1
+
+    release.set()
+    first.join(timeout=5)
+    queued.join(timeout=5)
+    assert statuses == [200, 200]
+    stats = app.admission.stats()
+    assert stats["rejected_queue_full"] == 1
+    assert stats["peak_queued"] == 1
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+    # 等待超时的请求被拒绝，且不会阻塞排在后面的请求
+    controller = AdmissionController(max_active=1, max_queue=2, max_wait=0.05)
+    controller.acquire()
+    with pytest.raises(Overloaded):
+        controller.acquire()
+    controller.release()
+    with controller.slot():
+        assert controller.stats()["active"] == 1
+    assert controller.stats()["rejected_timeout"] == 1
+
+    upstream = UpstreamLimiter("llm", limit=1, timeout=0.05)
+    with upstream.slot():
+        with pytest.raises(Overloaded):
+            with upstream.slot():
+                pass
+    assert upstream.stats() == {"limit": 1, "active": 0, "peak_active": 1, "timeouts": 1}
+
+def test_background_tts_holds_admission_slot():
+    """测试/chat和/speak启动的后台语音合成完成前一直占用处理槽"""
+    import time
+    from flask import Flask
+    from app.routes import bp
+    from app.services.admission import AdmissionController
+    from app.services.lazy import LazyService
+
+    class FakeChatbot:
+        def fast_answer(self, message, grade=None, subject=None):
+            return None
+
+        def chat(self, message, grade=None, subject=None):
+            return "好的"
+
+    class FakeTTS:
+        def __init__(self):
+            self.jobs = []
+
+        def start_speak(self, text, on_done=None):
+            self.jobs.append(on_done)
+            return "/tmp/reply.mp3"
+
+    app = Flask(__name__)
+    app.config["STARTED_AT"] = time.perf_counter()
+    app.chatbot = LazyService("chatbot", lambda progress: FakeChatbot())
+    app.chatbot.start(background=False)
+    app.tts = FakeTTS()
+    app.admission = AdmissionController(max_active=1, max_queue=0, max_wait=0.05)
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    assert client.post("/chat", json={"message": "你好"}).status_code == 200
+    assert app.admission.stats()["active"] == 1
+    assert client.post("/speak", json={"text": "你好"}).status_code == 503
+
+    # 合成结束后处理槽才被释放
+    app.tts.jobs.pop()()
+    assert app.admission.stats()["active"] == 0
+    assert client.post("/speak", json={"text": "你好"}).status_code == 200
+    app.tts.jobs.pop()()
+    assert app.admission.stats()["active"] == 0
+
+def test_fast_answer_audio_releases_admission_slot():
+    """测试命中带预生成音频的快速回答时立即释放处理槽，写入音频失败时也会释放"""
+    import time
+    from flask import Flask
+    from app.routes import bp
+    from app.services.admission import AdmissionController
+    from app.services.fast_answers import FastAnswer
+    from app.services.lazy import LazyService
+
+    class FakeChatbot:
+        def fast_answer(self, message, grade=None, subject=None):
+            return FastAnswer(question=message, answer="横折", audio=b"mp3")
+
+    class FakeTTS:
+        fail = False
+
+        def store_reply_audio(self, text, audio):
+            if self.fail:
+                raise OSError("disk full")
+            return "/tmp/reply.mp3"
+
+    app = Flask(__name__)
+    app.config["STARTED_AT"] = time.perf_counter()
+    app.chatbot = LazyService("chatbot", lambda progress: FakeChatbot())
+    app.chatbot.start(background=False)
+    app.tts = FakeTTS()
+    app.admission = AdmissionController(max_active=2, max_queue=0, max_wait=0.05)
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    for _ in range(3):
+        assert client.post("/chat", json={"message": "口的第二笔是什么"}).status_code == 200
+        assert app.admission.stats()["active"] == 0
+    app.tts.fail = True
+    assert client.post("/chat", json={"message": "口的第二笔是什么"}).status_code == 400
+    assert app.admission.stats()["active"] == 0
+
+def test_async_paths_share_admission_and_llm_limits(tmp_path):
+    """测试异步接口与线程接口共用处理槽和大模型并发上限，大模型限流时返回Overloaded"""
+    import asyncio
+    import httpx
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from app.services.admission import AdmissionController, Overloaded
+    from app.services.async_services import AsyncChatbot
+
+    controller = AdmissionController(max_active=1, max_queue=1, max_wait=0.05)
+
+    async def admission():
+        controller.acquire()
+        with pytest.raises(Overloaded) as exc_info:
+            await controller.acquire_async()
+        assert exc_info.value.reason == "queue_timeout"
+        controller.release()
+        await controller.acquire_async()
+        controller.release()
+
+    asyncio.run(admission())
+    stats = controller.stats()
+    assert stats["rejected_timeout"] == 1 and stats["active"] == 0 and stats["queued"] == 0
+
+    (tmp_path / "a.md").write_text("口的第二笔是横折", encoding="utf-8")
+    chatbot = _offline_chatbot(tmp_path, DeterministicFakeEmbedding(size=16), max_concurrency=1, upstream_wait=0.05)
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(429, headers={"Retry-After": "7"})
+
+    async def chat(stream):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            async_chatbot = AsyncChatbot(chatbot, client)
+            if stream:
+                return [delta async for delta in async_chatbot.chat_stream("口的第二笔是什么")]
+            return await async_chatbot.chat("口的第二笔是什么")
+
+    for stream in (False, True):
+        with pytest.raises(Overloaded) as exc_info:
+            asyncio.run(chat(stream))
+        assert exc_info.value.reason == "llm_throttled" and exc_info.value.retry_after == 7.0
+
+    # 线程接口占着唯一的大模型名额时，异步请求等待超时而不是越过上限
+    with chatbot.llm_limiter.slot():
+        with pytest.raises(Overloaded) as exc_info:
+            asyncio.run(chat(False))
+        assert exc_info.value.reason == "llm_busy"
+    assert len(calls) == 2
+    assert chatbot.llm_limiter.stats()["active"] == 0
+
+def test_llm_throttling_is_not_retried(tmp_path):
+    """测试大模型接口限流时不重试，直接以503返回并带上Retry-After"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import threading
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from app.services.admission import Overloaded
+
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            calls.append(self.path)
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(429)
+            self.send_header("Retry-After", "7")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        (tmp_path / "a.md").write_text("口的第二笔是横折", encoding="utf-8")
+        chatbot = _offline_chatbot(
+            tmp_path, DeterministicFakeEmbedding(size=16), base_url=f"http://127.0.0.1:{server.server_address[1]}"
+        )
+        with pytest.raises(Overloaded) as excinfo:
+            chatbot.chat("口的第二笔是什么")
+        assert excinfo.value.retry_after == 7.0
+        assert len(calls) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_known_question_served_from_fast_answers(tmp_path):
+    """测试与知识点题目一致的问题直接返回预生成的回答和音频，不调用大模型"""
+    import time
+    from flask import Flask
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from app.routes import bp
+    from app.services.fast_answers import FastAnswerStore
+    from app.services.knowledge_points import load_knowledge_points
+    from app.services.tts_service import TTSConfig, TTSService
+
+    kb_path = tmp_path / "kb"
+    kb_path.mkdir()
+    with open("data/knowledge_base/一年级_20200923.md", "r", encoding="utf-8") as f:
+        (kb_path / "一年级.md").write_text(f.read(), encoding="utf-8")
+    point = next(p for p in load_knowledge_points(str(kb_path)) if p.number == 2)
+    store_path = str(tmp_path / "fast_answers.sqlite3")
+    FastAnswerStore(store_path).put(point.content, point.question, "第二笔是横折哦。", b"ID3fake", "test-model")
+    chatbot = _offline_chatbot(kb_path, DeterministicFakeEmbedding(size=16), fast_answers_path=store_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("不应调用大模型")
+    chatbot.chat = fail
+
+    # 题目索引命中且有预生成回答
+    answer = chatbot.fast_answer("“口”的第二笔是？")
+    assert answer.answer == "第二笔是横折哦。"
+    # 其他问题不走快速路径
+    assert chatbot.fast_answer("今天天气怎么样") is None
+
+    app = Flask(__name__)
+    app.config["STARTED_AT"] = time.perf_counter()
+    app.config["AUDIO_FOLDER"] = str(tmp_path / "audio")
+    app.chatbot = chatbot
+    app.tts = TTSService(TTSConfig(
+        appid="test",
+        access_token="test",
+        cluster="volcano_tts",
+        voice_type="BV700_V2_streaming",
+        api_url="http://127.0.0.1:9/api/v1/tts",
+        max_text_length=300,
+        audio_folder=str(tmp_path / "audio")
+    ))
+    app.register_blueprint(bp)
+
+    response = app.test_client().post("/chat", json={"message": '"口"的第二笔是'})
+    assert response.status_code == 200
+    assert response.json["response"] == "第二笔是横折哦。"
+    audio = app.test_client().get(response.json["audio_url"])
+    assert audio.data == b"ID3fake"
+    assert chatbot.stats()["fast_answers"]["hits"] == 2
+
+def test_near_duplicate_question_served_from_fast_answers(tmp_path):
+    """测试改写过的问题按与知识点题目的余弦相似度命中预生成回答，未命中时构建提示词不再重复检索"""
+    from langchain_core.embeddings import Embeddings
+    from app.services import metrics
+    from app.services.fast_answers import FastAnswerStore
+    from app.services.knowledge_points import load_knowledge_points
+
+    class CharEmbedding(Embeddings):
+        # 按字符计数的向量，字面相近的句子余弦相似度高
+        def _embed(self, text):
+            vector = [0.0] * 64
+            for char in text:
+                vector[ord(char) % 64] += 1.0
+            return vector
+
+        def embed_documents(self, texts):
+            return [self._embed(text) for text in texts]
+
+        def embed_query(self, text):
+            return self._embed(text)
+
+    kb_path = tmp_path / "kb"
+    kb_path.mkdir()
+    (kb_path / "a.md").write_text(
+        "## 知识点 1\n### 问题\n口的第二笔是什么\n### 答案\n横折\n\n"
+        "## 知识点 2\n### 问题\n一年有几个月\n### 答案\n十二个月\n",
+        encoding="utf-8"
+    )
+    store_path = str(tmp_path / "fast_answers.sqlite3")
+    store = FastAnswerStore(store_path)
+    for point in load_knowledge_points(str(kb_path)):
+        store.put(point.content, point.question, f"{point.answer}哦。", None, "test-model")
+    chatbot = _offline_chatbot(
+        kb_path, CharEmbedding(), fast_answers_path=store_path, fast_answer_min_similarity=0.85
+    )
+
+    # 题目索引未命中（n-gram相似度不足），但与知识点题目的余弦相似度足够高
+    answer = chatbot.fast_answer("请问口的第二笔是什么")
+    assert answer.answer == "横折哦。"
+    assert chatbot.stats()["question_index"]["near_hits"] == 0
+
+    # 最相近的知识点问的是另一件事，不能用它的回答
+    searches = metrics.STAGE_SECONDS.count(stage="search")
+    assert chatbot.fast_answer("一年有几个季节") is None
+    chatbot._build_request("一年有几个季节")
+    assert metrics.STAGE_SECONDS.count(stage="search") == searches + 1
+    assert chatbot.stats()["fast_answers"]["hits"] == 1
+
+def test_csv_conversion_is_incremental(tmp_path):
+    """测试CSV转换输出知识点结构，且未变化的CSV不会重复转换"""
+    import importlib.util
+    from app.services.knowledge_points import load_knowledge_points
+
+    spec = importlib.util.spec_from_file_location("convert_csv_to_md", "data/knowledge_base/convert_csv_to_md.py")
+    converter = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(converter)
+
+    csv_path = tmp_path / "二年级_20201001.csv"
+    csv_path.write_text('question,answer,difficulty\n"1+1等于几？",2,简单\n"写出三个,用逗号分隔的数",1，2，3\n,空题目,\n', encoding="utf-8")
+    (tmp_path / "词表.csv").write_text("词语,拼音\n山,shān\n", encoding="utf-8")
+
+    assert converter.convert_all_csv_to_md(str(tmp_path), workers=1) == ["二年级_20201001.csv", "词表.csv"]
+    points = load_knowledge_points(str(tmp_path))
+    assert [(p.number, p.question, p.answer) for p in points] == [
+        (1, "1+1等于几？", "2"),
+        (2, "写出三个,用逗号分隔的数", "1，2，3")
+    ]
+    assert points[0].metadata["年级"] == "二年级"
+    assert points[0].metadata["难度"] == "简单"
+    assert points[0].metadata["创建日期"] == "2020-10-01"
+    assert "| 山 | shān |" in (tmp_path / "词表.md").read_text(encoding="utf-8")
+
+    # 内容未变化时跳过，修改后只转换该文件
+    assert converter.convert_all_csv_to_md(str(tmp_path), workers=1) == []
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("2+2等于几？,4,简单\n")
+    assert converter.convert_all_csv_to_md(str(tmp_path), workers=1) == ["二年级_20201001.csv"]
+    assert len(load_knowledge_points(str(tmp_path))) == 3
+
 if __name__ == "__main__":
     logger.add(
         f"{os.path.dirname(__file__)}/logs/{os.path.basename(__file__)}.log",
@@ -3,10 +3,10 @@ from loguru import logger
 import os
 import sys
 
-# 添加项目根目录和services目录到Python路径
+# 添加项目根目录到Python路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app', 'services'))
-from tts_service import TTSService, TTSConfig
+from app.services import tts_service as tts_module
+from app.services.tts_service import TTSService, TTSConfig
 
 @pytest.fixture
 def tts_service():
@@ -45,6 +45,442 @@ def test_text_to_speech_conversion(tts_service, text, expected_format):
         logger.error(f"语音合成失败: {str(e)}")
         pytest.fail(f"语音合成测试失败: {str(e)}")
 
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def content(self):
+        import json
+        return json.dumps(self.json()).encode("utf-8")
+
+    def json(self):
+        import base64
+        return {"data": base64.b64encode(self._text.encode("utf-8")).decode("ascii")}
+
+def test_concurrent_chunks_keep_original_order(tts_service, monkeypatch):
+    """测试并发合成时音频片段按原始顺序写入"""
+    import time
+
+    def fake_post(url, json, headers, timeout):
+        text = json["request"]["text"]
+        # 让靠前的片段更晚返回，验证写入顺序不受完成顺序影响
+        time.sleep(0.05 if text.startswith("a") else 0.0)
+        return FakeResponse(text)
+
+    monkeypatch.setattr(tts_service.session, "post", fake_post)
+    text = "a" * 30 + "b" * 30 + "c" * 10
+    audio_file = tts_service.speak(text)
+    with open(audio_file, "rb") as f:
+        assert f.read().decode("utf-8") == text
+
+def test_repeated_text_is_served_from_cache(tts_service, monkeypatch, tmp_path):
+    """测试相同文本命中音频缓存，不再调用TTS接口"""
+    calls = []
+
+    def fake_post(url, json, headers, timeout):
+        calls.append(json["request"]["text"])
+        return FakeResponse(json["request"]["text"])
+
+    service = TTSService(tts_service.config.model_copy(update={"audio_folder": str(tmp_path)}))
+    monkeypatch.setattr(service.session, "post", fake_post)
+
+    first = service.speak("你" * 30)
+    second = service.speak("你" * 30)
+    assert first == second
+    assert calls == ["你" * 30]
+
+    # 新回复中重复出现的片段同样复用缓存
+    service.speak("你" * 30 + "真棒")
+    assert calls == ["你" * 30, "真棒"]
+
+def test_async_tts_matches_sync_output(tts_service, tmp_path):
+    """测试异步TTS服务复用共享连接池并按原始顺序写入音频"""
+    import asyncio
+    import base64
+    import httpx
+    from app.services.async_services import AsyncTTSService
+
+    tts_service = TTSService(tts_service.config.model_copy(update={"audio_folder": str(tmp_path)}))
+
+    async def handler(request):
+        import json
+        text = json.loads(request.content)["request"]["text"]
+        # 让靠前的片段更晚返回，验证写入顺序不受完成顺序影响
+        await asyncio.sleep(0.05 if text.startswith("a") else 0.0)
+        return httpx.Response(200, json={"data": base64.b64encode(text.encode("utf-8")).decode("ascii")})
+
+    async def run(text):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await AsyncTTSService(tts_service, client).speak(text)
+
+    text = "a" * 30 + "b" * 30 + "c" * 10
+    audio_file = asyncio.run(run(text))
+    with open(audio_file, "rb") as f:
+        assert f.read().decode("utf-8") == text
+    assert tts_service.speak(text) == audio_file
+
+def test_async_and_threaded_tts_share_upstream_limit(tts_service, tmp_path):
+    """测试异步和线程TTS共用同一个上游并发上限，名额被占满时返回Overloaded"""
+    import asyncio
+    import base64
+    import httpx
+    from app.services.admission import Overloaded
+    from app.services.async_services import AsyncTTSService
+
+    service = TTSService(tts_service.config.model_copy(update={
+        "audio_folder": str(tmp_path),
+        "max_workers": 1,
+        "upstream_wait": 0.05
+    }))
+
+    def handler(request):
+        import json
+        text = json.loads(request.content)["request"]["text"]
+        return httpx.Response(200, json={"data": base64.b64encode(text.encode("utf-8")).decode("ascii")})
+
+    async def run(text):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await AsyncTTSService(service, client).speak(text)
+
+    # 线程路径占着唯一的名额时，异步路径不能越过上限
+    with service.upstream_limiter.slot():
+        with pytest.raises(Overloaded):
+            asyncio.run(run("你好"))
+    with open(asyncio.run(run("你好")), "rb") as f:
+        assert f.read().decode("utf-8") == "你好"
+    assert service.stats()["upstream"] == {"limit": 1, "active": 0, "peak_active": 1, "timeouts": 1}
+
+def test_chunks_reuse_pooled_connections_and_retry(tts_service, tmp_path):
+    """测试TTS片段复用长连接，并在限流响应后自动重试"""
+    import base64
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    attempts = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            text = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["request"]["text"]
+            attempts.append(text)
+            if attempts.count(text) == 1 and text.startswith("b"):
+                # 第一次请求被限流，Retry-After为0让重试立即进行
+                status, body, extra = 429, {"message": "throttled"}, {"Retry-After": "0"}
+            else:
+                status, body, extra = 200, {"data": base64.b64encode(text.encode("utf-8")).decode("ascii")}, {}
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in extra.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        service = TTSService(tts_service.config.model_copy(update={
+            "audio_folder": str(tmp_path),
+            "api_url": f"http://127.0.0.1:{server.server_address[1]}/api/v1/tts",
+            "max_workers": 2
+        }))
+        text = "a" * 30 + "b" * 30 + "c" * 30 + "d" * 30
+        with open(service.speak(text), "rb") as f:
+            assert f.read().decode("utf-8") == text
+
+        pool = service.stats()["pool"]
+        assert attempts.count("b" * 30) == 2
+        assert pool["requests"] == 5
+        assert pool["connections_opened"] <= 2
+        assert pool["in_flight"] == 0
+        assert 1 <= pool["peak_in_flight"] <= 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_segment_text_packs_sentences_and_strips_markdown():
+    """测试按句子打包分段、去除Markdown符号并丢弃纯标点片段"""
+    from app.services.segmentation import segment_text
+
+    reply = (
+        "### 小朋友你好！\n"
+        "**我是兜兜龙**，今天我们来学习加法。\n"
+        "- 第一步：数一数苹果有几个？\n"
+        "- 第二步：再加上2个\n"
+        "**！**\n"
+        "这是一个很长的句子，里面有好几个分句，需要在逗号的地方断开，不能把词语切成两半。"
+    )
+    segments = segment_text(reply, 30)
+    assert segments == [
+        "小朋友你好！我是兜兜龙，今天我们来学习加法。",
+        "第一步：数一数苹果有几个？第二步：再加上2个",
+        "这是一个很长的句子，里面有好几个分句，需要在逗号的地方断开，",
+        "不能把词语切成两半。"
+    ]
+    assert all(len(segment) <= 30 for segment in segments)
+    assert segment_text("**！**", 30) == []
+
+def test_speak_sends_one_request_per_packed_segment(tts_service, monkeypatch, tmp_path):
+    """测试短句合并后减少TTS接口调用次数"""
+    calls = []
+
+    def fake_post(url, json, headers, timeout):
+        calls.append(json["request"]["text"])
+        return FakeResponse(json["request"]["text"])
+
+    service = TTSService(tts_service.config.model_copy(update={"audio_folder": str(tmp_path)}))
+    monkeypatch.setattr(service.session, "post", fake_post)
+    service.speak("你好！**真棒**！我们再来一题吧。")
+    assert calls == ["你好！真棒！我们再来一题吧。"]
+
+def test_concurrent_identical_chunks_are_coalesced(tts_service, monkeypatch, tmp_path):
+    """测试多个请求同时合成相同片段时只调用一次TTS接口"""
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    calls = []
+    barrier = threading.Barrier(4)
+
+    def fake_post(url, json, headers, timeout):
+        calls.append(json["request"]["text"])
+        time.sleep(0.2)
+        return FakeResponse(json["request"]["text"])
+
+    def speak(_):
+        barrier.wait()
+        return service.speak("你真棒！")
+
+    service = TTSService(tts_service.config.model_copy(update={"audio_folder": str(tmp_path)}))
+    monkeypatch.setattr(service.session, "post", fake_post)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        paths = list(pool.map(speak, range(4)))
+
+    assert calls == ["你真棒！"]
+    assert len(set(paths)) == 1
+    assert service.stats()["single_flight"]["coalesced"] == 3
+
+def test_audio_is_streamed_while_synthesizing_and_cached_after(tts_service, monkeypatch, tmp_path):
+    """测试合成中的音频边写边播放，完成后支持Range、ETag和长期缓存"""
+    import threading
+    from flask import Flask
+    from app.routes import bp
+
+    release = threading.Event()
+
+    def fake_post(url, json, headers, timeout):
+        text = json["request"]["text"]
+        # 第二个片段在第一个片段被读到之后才返回
+        if text.startswith("b"):
+            assert release.wait(timeout=5)
+        return FakeResponse(text)
+
+    service = TTSService(tts_service.config.model_copy(update={"audio_folder": str(tmp_path)}))
+    monkeypatch.setattr(service.session, "post", fake_post)
+    app = Flask(__name__)
+    app.config["AUDIO_FOLDER"] = str(tmp_path)
+    app.tts = service
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    text = "a" * 30 + "b" * 30
+    done = threading.Event()
+    audio_url = f"/audio/{os.path.basename(service.start_speak(text, on_done=done.set))}"
+    response = client.get(audio_url, buffered=False)
+    assert response.headers["Cache-Control"] == "no-store"
+    stream = response.response
+    first = next(iter(stream))
+    assert first == b"a" * 30
+    assert not done.is_set()
+    release.set()
+    assert first + b"".join(stream) == text.encode("utf-8")
+    response.close()
+    assert done.wait(timeout=5)
+
+    # 已缓存的回复不再合成，回调立即执行
+    cached = threading.Event()
+    service.start_speak(text, on_done=cached.set)
+    assert cached.is_set()
+
+    response = client.get(audio_url, headers={"Range": "bytes=30-"})
+    assert response.status_code == 206
+    assert response.data == b"b" * 30
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert client.get(audio_url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+def test_audio_in_progress_is_served_by_other_workers(tts_service, monkeypatch, tmp_path):
+    """测试共享音频目录的其他worker也能边写边播放合成中的音频，部分合成失败时通过别名找到文件"""
+    import threading
+    import time
+    import requests
+    from flask import Flask
+    from app.routes import bp
+
+    release = threading.Event()
+
+    def fake_post(url, json, headers, timeout):
+        text = json["request"]["text"]
+        if text.startswith("b"):
+            assert release.wait(timeout=5)
+        if text.startswith("c"):
+            raise requests.ConnectionError("upstream down")
+        return FakeResponse(text)
+
+    config = tts_service.config.model_copy(update={"audio_folder": str(tmp_path), "max_retries": 0})
+    writer = TTSService(config)
+    reader = TTSService(config)
+    monkeypatch.setattr(writer.session, "post", fake_post)
+    monkeypatch.setattr(reader.session, "post", lambda *args, **kwargs: pytest.fail("只有一个worker合成"))
+    app = Flask(__name__)
+    app.config["AUDIO_FOLDER"] = str(tmp_path)
+    app.tts = reader
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    # 另一个worker请求同一段文本时不重复合成
+    text = "a" * 30 + "b" * 30
+    audio_url = f"/audio/{os.path.basename(writer.start_speak(text))}"
+    assert reader.start_speak(text) == writer.audio_cache.path_for(writer._cache_key("reply", text))
+    response = client.get(audio_url, buffered=False)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    stream = response.response
+    first = next(iter(stream))
+    assert first == b"a" * 30
+    release.set()
+    assert first + b"".join(stream) == text.encode("utf-8")
+    response.close()
+    assert client.get(audio_url).data == text.encode("utf-8")
+
+    # 部分片段失败时音频以另一个文件名提交，其他worker通过别名文件找到它
+    text = "a" * 30 + "c" * 30
+    audio_url = f"/audio/{os.path.basename(writer.start_speak(text))}"
+    deadline = time.time() + 5
+    while writer.pending_audio(os.path.basename(audio_url)) is not None and time.time() < deadline:
+        time.sleep(0.01)
+    response = client.get(audio_url)
+    assert response.status_code == 200
+    assert response.data == b"a" * 30
+
+def test_audio_of_failed_synthesis_is_reported_as_error(tts_service, monkeypatch, tmp_path):
+    """测试所有片段都合成失败时，各worker的/audio都返回500而不是404或空音频，重新合成成功后恢复"""
+    import threading
+    import requests
+    from flask import Flask
+    from app.routes import bp
+
+    upstream_down = True
+
+    def fake_post(url, json, headers, timeout):
+        if upstream_down:
+            raise requests.ConnectionError("upstream down")
+        return FakeResponse(json["request"]["text"])
+
+    config = tts_service.config.model_copy(update={"audio_folder": str(tmp_path), "max_retries": 0})
+    writer = TTSService(config)
+    reader = TTSService(config)
+    monkeypatch.setattr(writer.session, "post", fake_post)
+
+    def client_for(service):
+        app = Flask(__name__)
+        app.config["AUDIO_FOLDER"] = str(tmp_path)
+        app.tts = service
+        app.register_blueprint(bp)
+        return app.test_client()
+
+    text = "a" * 30 + "b" * 30
+    done = threading.Event()
+    audio_url = f"/audio/{os.path.basename(writer.start_speak(text, on_done=done.set))}"
+    assert done.wait(timeout=5)
+    for service in (writer, reader):
+        response = client_for(service).get(audio_url)
+        assert response.status_code == 500
+        assert response.get_json() == {"error": "Failed to generate audio"}
+
+    # 未知的音频仍然是404
+    assert client_for(reader).get(f"/audio/{'0' * 64}.mp3").status_code == 404
+
+    upstream_down = False
+    done.clear()
+    assert f"/audio/{os.path.basename(writer.start_speak(text, on_done=done.set))}" == audio_url
+    assert done.wait(timeout=5)
+    response = client_for(reader).get(audio_url)
+    assert response.status_code == 200
+    assert response.data == text.encode("utf-8")
+
+def test_audio_janitor_enforces_quota_and_ttl(tmp_path):
+    """测试后台清理按容量和过期时间淘汰旧文件，但不删除正在使用的文件"""
+    import time
+    from app.services.audio_cache import AudioCache
+    from app.services.audio_janitor import AudioJanitor
+
+    cache = AudioCache(folder=str(tmp_path), max_bytes=250, max_age=3600)
+    now = time.time()
+
+    def write(name, size, age):
+        path = tmp_path / name
+        path.write_bytes(b"x" * size)
+        os.utime(path, (now - age, now - age))
+
+    # 其他worker写入的文件，以及遗留的临时文件
+    write("expired.mp3", 10, 7200)
+    write("leased.mp3", 100, 5000)
+    write("old.mp3", 100, 600)
+    write("recent.mp3", 100, 60)
+    write("newest.mp3", 100, 0)
+    write(".orphan.tmp", 50, 7200)
+    write(".writing.tmp", 50, 0)
+
+    cache.leases.acquire("leased.mp3")
+    janitor = AudioJanitor(cache, interval=3600, temp_max_age=3600)
+    janitor.run_once()
+
+    assert sorted(os.listdir(tmp_path)) == [".writing.tmp", "leased.mp3", "newest.mp3"]
+    stats = janitor.stats()
+    assert stats["reclaimed_files"] == 4
+    assert stats["reclaimed_bytes"] == 10 + 100 + 100 + 50
+    assert stats["temp_files_removed"] == 1
+    assert stats["leased_files"] == 1
+
+    # 释放后，过期的文件在下一轮被回收
+    cache.leases.release("leased.mp3")
+    janitor.run_once()
+    assert sorted(os.listdir(tmp_path)) == [".writing.tmp", "newest.mp3"]
+
+    # 容量限制总会保留最后一个文件，但过期时间不会
+    os.utime(tmp_path / "newest.mp3", (now - 7200, now - 7200))
+    assert AudioCache(folder=str(tmp_path), max_bytes=250, max_age=3600).evict() == (1, 100)
+    assert sorted(os.listdir(tmp_path)) == [".writing.tmp"]
+
+def test_speak_against_mock_tts_server(tts_service, tmp_path):
+    """测试基准测试用的本地TTS模拟服务与真实协议兼容"""
+    from benchmarks.mock_servers import MP3_FRAME_HEADER, start_mock_tts
+
+    server = start_mock_tts(latency=0.0, char_delay=0.0, bytes_per_char=10)
+    try:
+        service = TTSService(tts_service.config.model_copy(update={
+            "audio_folder": str(tmp_path),
+            "api_url": f"{server.url}/api/v1/tts"
+        }))
+        text = "小朋友，我们一起来想一想吧！这道题问的是笔画的顺序。"
+        with open(service.speak(text), "rb") as f:
+            audio = f.read()
+        assert audio.startswith(MP3_FRAME_HEADER)
+        assert server.requests == len(service._split_text(text))
+        assert len(audio) == 10 * sum(len(chunk) for chunk in service._split_text(text))
+    finally:
+        server.stop()
+
 if __name__ == "__main__":
     logger.add(
         f"{os.path.dirname(__file__)}/logs/{os.path.basename(__file__)}.log",